@@ -0,0 +1,78 @@
+"""Benchmark de concurrencia: N clientes simultáneos golpeando endpoints de lectura.
+
+Uso (con el servidor corriendo):
+    python benchmarks/concurrencia.py --url http://127.0.0.1:8000 --clientes 200 --solicitudes 10
+
+Cada cliente hace sus solicitudes en secuencia, rotando entre las rutas; se reporta
+la latencia (p50, p95, p99, máx) y el throughput total.
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+RUTAS = (
+    "/canciones/",
+    "/artistas/",
+    "/benchmarks/",
+    "/eliminados/api/canciones",
+    "/dashboard/api",
+    "/analisis-v2/api/tendencias",
+    "/recomendaciones/descubrimiento",
+)
+
+
+def percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+async def cliente(http: httpx.AsyncClient, indice: int, solicitudes: int, rutas: list, latencias: list, errores: list):
+    for n in range(solicitudes):
+        ruta = rutas[(indice + n) % len(rutas)]
+        inicio = time.perf_counter()
+        try:
+            respuesta = await http.get(ruta)
+            if respuesta.status_code >= 400:
+                errores.append(f"{ruta}: {respuesta.status_code}")
+        except httpx.HTTPError as e:
+            errores.append(f"{ruta}: {type(e).__name__}")
+        latencias.append(time.perf_counter() - inicio)
+
+
+async def correr(url: str, clientes: int, solicitudes: int, rutas: list) -> dict:
+    latencias, errores = [], []
+    limites = httpx.Limits(max_connections=clientes, max_keepalive_connections=clientes)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=60) as http:
+        inicio = time.perf_counter()
+        await asyncio.gather(*[
+            cliente(http, i, solicitudes, rutas, latencias, errores) for i in range(clientes)
+        ])
+        total = time.perf_counter() - inicio
+
+    return {
+        "solicitudes": len(latencias),
+        "errores": len(errores),
+        "segundos": round(total, 2),
+        "por_segundo": round(len(latencias) / total, 1),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 1),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 1),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 1),
+        "max_ms": round(max(latencias) * 1000, 1),
+        "tipos_error": sorted(Counter(errores).items(), key=lambda e: -e[1])[:5],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latencia con clientes concurrentes")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clientes", type=int, default=200)
+    parser.add_argument("--solicitudes", type=int, default=10, help="solicitudes por cliente")
+    parser.add_argument("--ruta", action="append", help="ruta a medir (se puede repetir)")
+    args = parser.parse_args()
+
+    resultado = asyncio.run(correr(args.url, args.clientes, args.solicitudes, args.ruta or list(RUTAS)))
+    for clave, valor in resultado.items():
+        print(f"{clave:>12}: {valor}")
@@ -0,0 +1,131 @@
+"""Contención lectura/escritura en SQLite: configuración por defecto frente al perfil de producción.
+
+Uso:
+    python benchmarks/contencion_sqlite.py --lectores 8 --escritores 2 --segundos 10
+
+Para cada perfil crea una base nueva, la llena y durante N segundos corre hilos
+escritores (tandas de resultados de análisis, una transacción por tanda) junto a
+hilos lectores (tendencias de 7 días y listado de canciones). Reporta filas
+escritas por segundo, lecturas por segundo, latencia de lectura y errores
+("database is locked").
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert
+from sqlmodel import SQLModel, Session, select
+
+from database import aplicar_perfil_sqlite, pragmas_sqlite
+from models import Cancion, Benchmark, AnalisisResultado
+from services.tendencias_service import tendencias_desde
+
+PERFILES = {
+    "por defecto": [],
+    "produccion": pragmas_sqlite(),
+}
+
+
+def preparar(engine, canciones: int, resultados: int, benchmarks: int = 20) -> list:
+    SQLModel.metadata.create_all(engine)
+    ahora = datetime.utcnow()
+    ids = [f"c{i:09d}" for i in range(canciones)]
+    with engine.begin() as conn:
+        conn.execute(insert(Benchmark), [
+            {"pais": "CO", "genero": f"g{i}", "tempo_promedio": 120, "energy_promedio": 0.5} for i in range(benchmarks)
+        ])
+        conn.execute(insert(Cancion), [
+            {"id": cid, "nombre": cid, "artista": "a", "tempo": 120, "energy": 0.5} for cid in ids
+        ])
+        conn.execute(insert(AnalisisResultado), [
+            {"cancion_id": random.choice(ids), "benchmark_id": random.randint(1, benchmarks),
+             "afinidad": random.uniform(0, 100), "hallazgo": "x",
+             "creado_en": ahora - timedelta(minutes=random.randint(0, 60 * 24 * 30))}
+            for _ in range(resultados)
+        ])
+    return ids
+
+
+def escritor(engine, ids: list, por_tanda: int, hasta: float, filas: list, errores: list):
+    while time.monotonic() < hasta:
+        try:
+            with Session(engine) as session:
+                session.execute(insert(AnalisisResultado), [
+                    {"cancion_id": random.choice(ids), "benchmark_id": random.randint(1, 20),
+                     "afinidad": random.uniform(0, 100), "hallazgo": "x"}
+                    for _ in range(por_tanda)
+                ])
+                session.commit()
+            filas.append(por_tanda)
+        except Exception as e:
+            errores.append(f"escritura: {type(e).__name__}")
+
+
+def lector(engine, hasta: float, latencias: list, errores: list):
+    n = 0
+    while time.monotonic() < hasta:
+        inicio = time.perf_counter()
+        try:
+            with Session(engine) as session:
+                if n % 2:
+                    tendencias_desde(session, datetime.utcnow() - timedelta(days=7))
+                else:
+                    session.exec(select(Cancion).where(Cancion.deleted_at == None).limit(100)).all()
+            latencias.append(time.perf_counter() - inicio)
+        except Exception as e:
+            errores.append(f"lectura: {type(e).__name__}")
+        n += 1
+
+
+def correr(perfil: str, carpeta: str, args) -> dict:
+    engine = create_engine(
+        f"sqlite:///{carpeta}/{perfil.replace(' ', '_')}.db",
+        pool_size=args.lectores + args.escritores, max_overflow=0
+    )
+    aplicar_perfil_sqlite(engine, PERFILES[perfil])
+    ids = preparar(engine, args.canciones, args.resultados)
+
+    filas, latencias, errores = [], [], []
+    hasta = time.monotonic() + args.segundos
+    hilos = [threading.Thread(target=escritor, args=(engine, ids, args.por_tanda, hasta, filas, errores))
+             for _ in range(args.escritores)]
+    hilos += [threading.Thread(target=lector, args=(engine, hasta, latencias, errores))
+              for _ in range(args.lectores)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    engine.dispose()
+
+    latencias.sort()
+    return {
+        "filas_escritas_por_s": round(sum(filas) / args.segundos),
+        "lecturas_por_s": round(len(latencias) / args.segundos, 1),
+        "lectura_p50_ms": round(statistics.median(latencias) * 1000, 1) if latencias else None,
+        "lectura_p99_ms": round(latencias[int(0.99 * (len(latencias) - 1))] * 1000, 1) if latencias else None,
+        "errores": len(errores),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Contención lectura/escritura en SQLite")
+    parser.add_argument("--lectores", type=int, default=8)
+    parser.add_argument("--escritores", type=int, default=2)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--por-tanda", type=int, default=200, help="filas por transacción de escritura")
+    parser.add_argument("--canciones", type=int, default=5_000)
+    parser.add_argument("--resultados", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        for perfil in PERFILES:
+            random.seed(11)
+            print(f"{perfil:>12}: {correr(perfil, carpeta, args)}")
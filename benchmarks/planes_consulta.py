@@ -0,0 +1,157 @@
+"""Planes de consulta con y sin los índices de borrado lógico, ventanas de tiempo y claves foráneas.
+
+Uso:
+    python benchmarks/planes_consulta.py                       # SQLite temporal
+    python benchmarks/planes_consulta.py --url postgresql://...  # base vacía de prueba
+
+Crea las tablas, carga datos sintéticos y, para cada consulta de la app, muestra el
+plan (EXPLAIN QUERY PLAN en SQLite, EXPLAIN en Postgres) y la mediana de tiempo
+primero sin los índices y después con ellos.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, String, cast
+from sqlmodel import SQLModel, select, func
+
+from models import Cancion, Artista, Benchmark, AnalisisResultado
+from services.paginacion_service import paginar, codificar_cursor
+
+# Índices que se comparan (el resto del esquema queda igual en ambas corridas)
+INDICES = {
+    "cancion": ("ix_cancion_activos_creado_en", "ix_cancion_eliminados"),
+    "analisisresultado": (
+        "ix_analisisresultado_creado_en",
+        "ix_analisisresultado_benchmark_creado_en",
+        "ix_analisisresultado_cancion_creado_en",
+    ),
+}
+
+
+def cargar_datos(engine, canciones: int, resultados: int, benchmarks: int = 20):
+    random.seed(7)
+    ahora = datetime.utcnow()
+    ids = [f"c{i:09d}" for i in range(canciones)]
+    with engine.begin() as conn:
+        conn.execute(insert(Benchmark), [
+            {"pais": "CO", "genero": f"g{i}", "tempo_promedio": 120, "energy_promedio": 0.5,
+             "creado_en": ahora} for i in range(benchmarks)
+        ])
+        conn.execute(insert(Cancion), [
+            {"id": cid, "nombre": cid, "artista": "a", "tempo": 120, "energy": 0.5,
+             "creado_en": ahora - timedelta(minutes=i),
+             "deleted_at": ahora if random.random() < 0.05 else None}
+            for i, cid in enumerate(ids)
+        ])
+        for inicio in range(0, resultados, 50_000):
+            conn.execute(insert(AnalisisResultado), [
+                {"cancion_id": random.choice(ids), "benchmark_id": random.randint(1, benchmarks),
+                 "afinidad": random.uniform(0, 100), "hallazgo": "x",
+                 "creado_en": ahora - timedelta(minutes=random.randint(0, 60 * 24 * 90))}
+                for _ in range(min(50_000, resultados - inicio))
+            ])
+    return ids
+
+
+def consultas(ids: list) -> dict:
+    ahora = datetime.utcnow()
+    inicio_dia = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
+    conteo = func.count(AnalisisResultado.id)
+    return {
+        "canciones activas, página por creado_en": select(Cancion)
+            .where(Cancion.deleted_at == None)
+            .order_by(Cancion.creado_en.desc(), Cancion.id.desc())
+            .limit(50),
+        "canciones activas, página a mitad del catálogo": paginar(
+            select(Cancion).where(Cancion.deleted_at == None), Cancion, 50,
+            codificar_cursor(SimpleNamespace(creado_en=ahora - timedelta(minutes=len(ids) // 2), id=ids[len(ids) // 2]))
+        ),
+        "canciones eliminadas, primera página": paginar(select(Cancion).where(Cancion.deleted_at != None), Cancion, 50),
+        "tendencias: día parcial": select(AnalisisResultado.benchmark_id, AnalisisResultado.afinidad)
+            .where(AnalisisResultado.creado_en >= inicio_dia - timedelta(hours=6))
+            .where(AnalisisResultado.creado_en < inicio_dia),
+        "resultados de un benchmark en 7 días": select(func.count(), func.avg(AnalisisResultado.afinidad))
+            .where(AnalisisResultado.benchmark_id == 3)
+            .where(AnalisisResultado.creado_en >= ahora - timedelta(days=7)),
+        "historial de una canción": select(AnalisisResultado)
+            .where(AnalisisResultado.cancion_id == ids[len(ids) // 2])
+            .order_by(AnalisisResultado.creado_en.desc()),
+        "dashboard: canciones más analizadas": select(AnalisisResultado.cancion_id, conteo)
+            .group_by(AnalisisResultado.cancion_id).order_by(conteo.desc()).limit(5),
+        "dashboard: benchmarks más usados": select(cast(AnalisisResultado.benchmark_id, String), conteo)
+            .group_by(AnalisisResultado.benchmark_id).order_by(conteo.desc()).limit(5),
+    }
+
+
+def plan(conn, consulta) -> list:
+    compilada = consulta.compile(bind=conn)
+    if conn.dialect.name == "sqlite":
+        parametros = tuple(compilada.params[n] for n in compilada.positiontup)
+        return [fila[-1] for fila in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compilada}", parametros)]
+    return [fila[0] for fila in conn.exec_driver_sql(f"EXPLAIN {compilada}", compilada.params)]
+
+
+def medir(conn, consulta, repeticiones: int = 5) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        conn.execute(consulta).all()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos) * 1000
+
+
+def indices(engine, crear: bool):
+    for tabla, nombres in INDICES.items():
+        for indice in SQLModel.metadata.tables[tabla].indexes:
+            if indice.name in nombres:
+                if crear:
+                    indice.create(engine, checkfirst=True)
+                else:
+                    indice.drop(engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+def correr(url: str, canciones: int, resultados: int):
+    engine = create_engine(url)
+    SQLModel.metadata.create_all(engine)
+    ids = cargar_datos(engine, canciones, resultados)
+    por_consulta = consultas(ids)
+
+    medidas = {}
+    for etapa, crear in (("sin índices", False), ("con índices", True)):
+        indices(engine, crear)
+        print(f"\n===== {etapa} =====")
+        with engine.connect() as conn:
+            for nombre, consulta in por_consulta.items():
+                medidas.setdefault(nombre, []).append(medir(conn, consulta))
+                print(f"\n-- {nombre}: {medidas[nombre][-1]:.2f} ms")
+                for linea in plan(conn, consulta):
+                    print(f"   {linea}")
+
+    print("\n===== resumen (ms, mediana) =====")
+    for nombre, (sin, con) in medidas.items():
+        print(f"{nombre:>40}: {sin:9.2f} -> {con:9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Planes de consulta con y sin índices")
+    parser.add_argument("--url", help="base de prueba vacía (por defecto, SQLite temporal)")
+    parser.add_argument("--canciones", type=int, default=20_000)
+    parser.add_argument("--resultados", type=int, default=300_000)
+    args = parser.parse_args()
+
+    if args.url:
+        correr(args.url, args.canciones, args.resultados)
+    else:
+        with tempfile.TemporaryDirectory() as carpeta:
+            correr(f"sqlite:///{carpeta}/planes.db", args.canciones, args.resultados)
@@ -0,0 +1,118 @@
+"""Spotify simulado: los endpoints de la Web API que usa la app, con latencia configurable.
+
+Uso:
+    python benchmarks/spotify_simulado.py --puerto 9000 --latencia-ms 80
+
+    SPOTIFY_CLIENT_ID=x SPOTIFY_CLIENT_SECRET=y \\
+    SPOTIFY_API_URL=http://127.0.0.1:9000/v1 SPOTIFY_ACCOUNTS_URL=http://127.0.0.1:9000 \\
+    uvicorn main:app
+
+Con --certificado/--llave sirve por https (el cliente debe confiar en ese certificado,
+p. ej. con SSL_CERT_FILE y REQUESTS_CA_BUNDLE). GET /estadisticas devuelve cuántas
+solicitudes llegaron y desde cuántas conexiones distintas (puerto de origen), para ver
+si el cliente reutiliza conexiones.
+"""
+import argparse
+import asyncio
+import hashlib
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+
+app = FastAPI()
+app.state.latencia = 0.0
+app.state.lotes = True
+app.state.solicitudes = 0
+app.state.conexiones = set()
+
+
+@app.middleware("http")
+async def contar(request: Request, call_next):
+    if request.url.path != "/estadisticas":
+        app.state.solicitudes += 1
+        app.state.conexiones.add(request.scope.get("client"))
+        await asyncio.sleep(app.state.latencia)
+    return await call_next(request)
+
+
+def _numero(texto: str, modulo: int) -> int:
+    return int(hashlib.md5(texto.encode()).hexdigest(), 16) % modulo
+
+
+def _track(id: str) -> dict:
+    return {
+        "id": id, "name": f"Track {id}", "duration_ms": 180000 + _numero(id, 60000),
+        "popularity": _numero(id, 100), "preview_url": None,
+        "artists": [{"id": f"a{_numero(id, 500)}", "name": f"Artista {_numero(id, 500)}"}],
+        "album": {"name": f"Album {id}", "images": [{"url": f"https://img.test/{id}.jpg"}]},
+    }
+
+
+def _artista(id: str) -> dict:
+    return {
+        "id": id, "name": f"Artista {id}", "genres": ["pop", "latin"], "popularity": _numero(id, 100),
+        "followers": {"total": _numero(id, 10 ** 6)}, "images": [{"url": f"https://img.test/{id}.jpg"}],
+    }
+
+
+def _features(id: str) -> dict:
+    return {
+        "id": id, "tempo": 60 + _numero(id, 120), "energy": _numero(id + "e", 100) / 100,
+        "danceability": _numero(id + "d", 100) / 100, "valence": _numero(id + "v", 100) / 100,
+        "acousticness": _numero(id + "a", 100) / 100,
+    }
+
+
+@app.post("/api/token")
+async def token():
+    return {"access_token": "token-simulado", "token_type": "Bearer", "expires_in": 3600}
+
+
+@app.get("/v1/search")
+async def search(q: str, type: str, limit: int = 10):
+    ids = [f"{_numero(q, 10 ** 6)}x{i}" for i in range(limit)]
+    if type == "artist":
+        return {"artists": {"items": [_artista(i) for i in ids]}}
+    return {"tracks": {"items": [_track(i) for i in ids]}}
+
+
+@app.get("/v1/tracks/{id}")
+async def track(id: str):
+    return _track(id)
+
+
+@app.get("/v1/artists/{id}")
+async def artista(id: str):
+    return _artista(id)
+
+
+@app.get("/v1/audio-features")
+async def audio_features_lote(ids: str):
+    if not app.state.lotes:
+        raise HTTPException(403, "Endpoint por lotes no disponible")
+    return {"audio_features": [_features(id_) for id_ in ids.split(",")]}
+
+
+@app.get("/v1/audio-features/{id}")
+async def audio_features(id: str):
+    return _features(id)
+
+
+@app.get("/estadisticas")
+async def estadisticas():
+    return {"solicitudes": app.state.solicitudes, "conexiones": len(app.state.conexiones)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spotify simulado para pruebas locales")
+    parser.add_argument("--puerto", type=int, default=9000)
+    parser.add_argument("--latencia-ms", type=float, default=80)
+    parser.add_argument("--sin-lotes", action="store_true", help="/audio-features?ids= responde 403")
+    parser.add_argument("--certificado", help="certificado TLS (con --llave sirve por https)")
+    parser.add_argument("--llave")
+    args = parser.parse_args()
+
+    app.state.latencia = args.latencia_ms / 1000
+    app.state.lotes = not args.sin_lotes
+    uvicorn.run(app, host="127.0.0.1", port=args.puerto, log_level="warning",
+                ssl_certfile=args.certificado, ssl_keyfile=args.llave)
@@ -1,7 +1,12 @@
 import os
+import asyncio
 from dotenv import load_dotenv
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine
 
 load_dotenv()
 
@@ -10,11 +15,149 @@ if not DATABASE_URL:
     print("⚠  Usando SQLite temporal")
     DATABASE_URL = "sqlite:///./spotrend.db"
 
-engine = create_engine(DATABASE_URL, echo=False)
+# Pool de conexiones (mismos valores para el engine síncrono y el asíncrono)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "si", "sí")
+
+# Perfil de SQLite: "produccion" aplica los PRAGMA de abajo en cada conexión nueva; "ninguno" los omite
+SQLITE_PERFIL = os.getenv("SQLITE_PERFIL", "produccion")
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Segundos entre PRAGMA optimize + checkpoint del WAL
+SQLITE_MANTENIMIENTO_CADA = float(os.getenv("SQLITE_MANTENIMIENTO_CADA", "3600"))
+
+# Driver asíncrono por dialecto
+DRIVERS_ASYNC = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg"}
+
+
+def opciones_pool(url) -> dict:
+    """Opciones de pool para create_engine; SQLite en memoria usa un pool propio sin tamaño."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+
+
+def url_async(url):
+    """(url, connect_args) equivalentes con el driver asíncrono del mismo dialecto."""
+    url = make_url(url)
+    url = url.set(drivername=DRIVERS_ASYNC.get(url.get_backend_name(), url.drivername))
+    connect_args = {}
+    if url.drivername == "postgresql+asyncpg" and "sslmode" in url.query:
+        # asyncpg no entiende sslmode en la URL; lo recibe como argumento ssl
+        connect_args["ssl"] = url.query["sslmode"]
+        url = url.difference_update_query(["sslmode"])
+    return url, connect_args
+
+
+def pragmas_sqlite() -> list:
+    """PRAGMA del perfil de producción.
+
+    WAL deja leer mientras otra conexión escribe; con WAL, synchronous=NORMAL sigue
+    siendo seguro ante caídas del proceso y solo sincroniza al hacer checkpoint.
+    """
+    return [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}",
+        "PRAGMA temp_store=MEMORY",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}"
+    ]
+
+
+def aplicar_perfil_sqlite(engine_sync, pragmas: list = None) -> None:
+    """Ejecuta los PRAGMA en cada conexión nueva del engine (para el asíncrono, su sync_engine)."""
+    pragmas = pragmas_sqlite() if pragmas is None else pragmas
+
+    @event.listens_for(engine_sync, "connect")
+    def _configurar(conexion, registro):
+        cursor = conexion.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+ES_SQLITE = make_url(DATABASE_URL).get_backend_name() == "sqlite"
+
+engine = create_engine(DATABASE_URL, echo=False, **opciones_pool(DATABASE_URL))
+
+_url_async, _connect_args_async = url_async(DATABASE_URL)
+async_engine = create_async_engine(
+    _url_async, echo=False, connect_args=_connect_args_async, **opciones_pool(_url_async)
+)
+
+if ES_SQLITE and SQLITE_PERFIL == "produccion":
+    aplicar_perfil_sqlite(engine)
+    aplicar_perfil_sqlite(async_engine.sync_engine)
+
+
+def mantenimiento_sqlite() -> None:
+    """Actualiza estadísticas del planificador y vacía el WAL en la base."""
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA optimize")
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+async def mantener_sqlite():
+    """Tarea de fondo: mantenimiento de SQLite cada SQLITE_MANTENIMIENTO_CADA segundos."""
+    while True:
+        await asyncio.sleep(SQLITE_MANTENIMIENTO_CADA)
+        try:
+            await asyncio.to_thread(mantenimiento_sqlite)
+        except Exception as e:
+            print(f"⚠  Error en mantenimiento SQLite: {e}")
+
+# Hilos del pool donde FastAPI corre los handlers `def` (consultas a la base, APIs externas)
+HILOS_BLOQUEANTES = int(os.getenv("HILOS_BLOQUEANTES", "40"))
+
+def configurar_hilos():
+    """Fija el tamaño del pool de hilos de AnyIO. Se llama al arrancar, dentro del loop."""
+    from anyio import to_thread
+    to_thread.current_default_thread_limiter().total_tokens = HILOS_BLOQUEANTES
+
+def actualizar_esquema():
+    """Agrega a tablas ya existentes las columnas opcionales e índices nuevos de los modelos.
+
+    create_all solo crea tablas que no existen; esto cubre los cambios aditivos.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for tabla in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(tabla.name):
+                continue
+            existentes = {c["name"] for c in inspector.get_columns(tabla.name)}
+            for columna in tabla.columns:
+                if columna.name not in existentes and columna.nullable:
+                    tipo = columna.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {tipo}"))
+                    print(f"🔧 Columna agregada: {tabla.name}.{columna.name}")
+
+    for tabla in SQLModel.metadata.sorted_tables:
+        if tabla.info.get("derivada") and inspector.has_table(tabla.name):
+            # Filas viejas pueden violar un índice único nuevo; la tabla se recalcula sola
+            existentes = {i["name"] for i in inspector.get_indexes(tabla.name)}
+            if any(i.unique and i.name not in existentes for i in tabla.indexes):
+                with engine.begin() as conn:
+                    conn.execute(tabla.delete())
+                print(f"🔧 Tabla derivada vaciada para crear índices únicos: {tabla.name}")
+        for indice in tabla.indexes:
+            indice.create(engine, checkfirst=True)
 
 def create_db_and_tables():
     try:
         SQLModel.metadata.create_all(engine)
+        actualizar_esquema()
         print("✅ Base de datos lista :)")
     except Exception as e:
         print(f"⚠  Error creando tablas: {e}")
@@ -23,6 +166,19 @@ def get_session():
     try:
         with Session(engine) as session:
             yield session
+    except SQLAlchemyError as e:
+        print(f"❌ Error DB: {e}")
+        raise
+
+async def get_async_session():
+    """Sesión asíncrona: las esperas de la base no ocupan el loop ni un hilo del pool.
+
+    expire_on_commit=False porque fuera de run_sync no se pueden recargar atributos
+    expirados (no hay carga perezosa en modo asíncrono).
+    """
+    try:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
     except SQLAlchemyError as e:
         print(f"❌ Error DB: {e}")
         raise
\ No newline at end of file
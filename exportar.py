@@ -0,0 +1,42 @@
+"""Volcado offline de una tabla a NDJSON, Parquet o Arrow IPC, sin pasar por el servidor.
+
+Uso:
+    python exportar.py canciones parquet
+    python exportar.py analisis arrow --salida /data/analisis.arrow
+
+Usa la misma DATABASE_URL y el mismo código de escritura por lotes que /export.
+"""
+import argparse
+import asyncio
+
+from database import async_engine
+from services.exportacion_service import (
+    pa, TABLAS_EXPORTABLES, FORMATOS_COLUMNARES, consulta_exportacion, exportar_ndjson, exportar_columnar
+)
+
+
+async def volcar(tabla: str, formato: str, salida: str) -> int:
+    consulta = consulta_exportacion(*TABLAS_EXPORTABLES[tabla])
+    fragmentos = exportar_ndjson(consulta) if formato == "ndjson" else exportar_columnar(consulta, formato)
+    escritos = 0
+    try:
+        with open(salida, "wb") as archivo:
+            async for fragmento in fragmentos:
+                escritos += archivo.write(fragmento)
+    finally:
+        await async_engine.dispose()
+    return escritos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exportar una tabla a un archivo")
+    parser.add_argument("tabla", choices=list(TABLAS_EXPORTABLES))
+    parser.add_argument("formato", choices=["ndjson", *FORMATOS_COLUMNARES])
+    parser.add_argument("--salida", help="archivo destino (por defecto, <tabla>.<formato>)")
+    args = parser.parse_args()
+
+    if args.formato in FORMATOS_COLUMNARES and pa is None:
+        parser.error("pyarrow no está instalado")
+    salida = args.salida or f"{args.tabla}.{args.formato}"
+    escritos = asyncio.run(volcar(args.tabla, args.formato, salida))
+    print(f"✅ {salida}: {escritos:,} bytes")
@@ -2,13 +2,19 @@ from fastapi import FastAPI, Request
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
-from database import create_db_and_tables
+from sqlmodel import Session
+from database import create_db_and_tables, configurar_hilos, engine, async_engine, ES_SQLITE, mantener_sqlite
+from services.tendencias_service import preparar_tendencias
+from services.contadores_service import reconciliar_contadores, reconciliar_periodicamente
+from services.dashboard_service import difundir_dashboard
+from services.spotify_service import abrir_cliente_spotify, cerrar_cliente_spotify
 from routers import (
     cancion, artista, benchmark, analisis,
     analisis, eliminados, comparar_spotify,
-    spotify_info, recomendaciones, dashboard, comparacion_local
+    spotify_info, spotify_data, recomendaciones, dashboard, comparacion_local, exportacion
 )
 import logging
+import asyncio
 
 logger = logging.getLogger(__name__)
 
@@ -24,13 +30,61 @@ app = FastAPI(
 templates = Jinja2Templates(directory="templates")
 
 
+# Tareas de fondo lanzadas al arrancar; la referencia evita que el recolector las
+# descarte y permite cancelarlas al apagar
+tareas_fondo: set = set()
+
+
+def _paso_arranque(nombre: str, paso, *args) -> bool:
+    """Corre un paso del arranque; si falla lo registra y los demás pasos siguen."""
+    try:
+        paso(*args)
+        return True
+    except Exception as e:
+        logger.error(f"⚠  Error al arrancar ({nombre}): {e}")
+        return False
+
+
+def _con_sesion(funcion):
+    with Session(engine) as session:
+        funcion(session)
+
+
+def _tarea_terminada(tarea: asyncio.Task):
+    tareas_fondo.discard(tarea)
+    if not tarea.cancelled() and tarea.exception() is not None:
+        logger.error(f"Tarea de fondo {tarea.get_name()} terminó con error: {tarea.exception()}")
+
+
+def _lanzar_tarea(nombre: str, corrutina):
+    tarea = asyncio.create_task(corrutina, name=nombre)
+    tareas_fondo.add(tarea)
+    tarea.add_done_callback(_tarea_terminada)
+
+
 @app.on_event("startup")
 async def startup():
-    try:
-        create_db_and_tables()
+    _paso_arranque("hilos", configurar_hilos)
+    _paso_arranque("cliente Spotify", abrir_cliente_spotify)
+    if _paso_arranque("tablas", create_db_and_tables):
         logger.info("✅ Base de datos y tablas creadas")
-    except Exception as e:
-        logger.error(f"⚠  Error creando tablas: {e}")
+    _paso_arranque("tendencias", _con_sesion, preparar_tendencias)
+    _paso_arranque("contadores", _con_sesion, reconciliar_contadores)
+
+    _lanzar_tarea("reconciliar_contadores", reconciliar_periodicamente())
+    _lanzar_tarea("difundir_dashboard", difundir_dashboard())
+    if ES_SQLITE:
+        _lanzar_tarea("mantener_sqlite", mantener_sqlite())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    for tarea in list(tareas_fondo):
+        tarea.cancel()
+    await asyncio.gather(*tareas_fondo, return_exceptions=True)
+    await cerrar_cliente_spotify()
+    await async_engine.dispose()
+
 
 # Incluir todos los routers (ESTOS YA MANEJAN SUS HTML)
 app.include_router(cancion.router)
@@ -41,9 +95,11 @@ app.include_router(analisis.router)
 app.include_router(eliminados.router)
 app.include_router(comparar_spotify.router)
 app.include_router(spotify_info.router)
+app.include_router(spotify_data.router)
 app.include_router(recomendaciones.router)
 app.include_router(dashboard.router)
 app.include_router(comparacion_local.router)
+app.include_router(exportacion.router)
 
 # SOLO LA PÁGINA PRINCIPAL
 @app.get("/", response_class=HTMLResponse)
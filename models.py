@@ -1,12 +1,28 @@
-from sqlmodel import SQLModel, Field, Relationship
+from sqlmodel import SQLModel, Field, Relationship, Index
+from sqlalchemy import text
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, date
 import shortuuid
 
 
+def indices_borrado_logico(tabla: str) -> tuple:
+    """Índices parciales de una tabla con borrado lógico (SQLite y Postgres; otros motores
+    ignoran el WHERE y crean el índice completo).
+
+    Los listados (activos y eliminados) se paginan por (creado_en, id); cada uno recorre
+    solo el índice parcial de su lado, igual que la reconciliación de contadores.
+    """
+    activos = text("deleted_at IS NULL")
+    eliminados = text("deleted_at IS NOT NULL")
+    return (
+        Index(f"ix_{tabla}_activos_creado_en", "creado_en", "id", sqlite_where=activos, postgresql_where=activos),
+        Index(f"ix_{tabla}_eliminados", "creado_en", "id", sqlite_where=eliminados, postgresql_where=eliminados),
+    )
 
 
 class Cancion(SQLModel, table=True):
+    __table_args__ = indices_borrado_logico("cancion")
+
     id: str = Field(default_factory=lambda: shortuuid.uuid()[:10], primary_key=True)
     nombre: str
     artista: str
@@ -23,6 +39,8 @@ class Cancion(SQLModel, table=True):
 
 
 class Artista(SQLModel, table=True):
+    __table_args__ = indices_borrado_logico("artista")
+
     id: Optional[int] = Field(default=None, primary_key=True)
     nombre: str
     pais: Optional[str] = None
@@ -35,6 +53,8 @@ class Artista(SQLModel, table=True):
 
 
 class Benchmark(SQLModel, table=True):
+    __table_args__ = indices_borrado_logico("benchmark")
+
     id: Optional[int] = Field(default=None, primary_key=True)
     pais: str
     genero: str
@@ -49,17 +69,83 @@ class Benchmark(SQLModel, table=True):
 
 
 class AnalisisResultado(SQLModel, table=True):
+    __table_args__ = (
+        # Una fila por versión de las entradas: repetir un análisis sin cambios no escribe
+        Index("ux_analisisresultado_version", "cancion_id", "benchmark_id", "hash_entradas", unique=True),
+        # Ventanas de tiempo por benchmark (tendencias) y por canción, y los conteos por
+        # cada uno del dashboard sin leer la tabla
+        Index("ix_analisisresultado_benchmark_creado_en", "benchmark_id", "creado_en"),
+        Index("ix_analisisresultado_cancion_creado_en", "cancion_id", "creado_en"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     cancion_id: str = Field(foreign_key="cancion.id")
     benchmark_id: int = Field(foreign_key="benchmark.id")
     afinidad: float
     hallazgo: str
-    creado_en: datetime = Field(default_factory=datetime.utcnow)
+    hash_entradas: Optional[str] = None
+    creado_en: datetime = Field(default_factory=datetime.utcnow, index=True)
 
     cancion: Cancion = Relationship(back_populates="analisis")
     benchmark: Benchmark = Relationship(back_populates="analisis")
 
 
+class SolicitudAnalisis(SQLModel, table=True):
+    """Registro de solo inserción de cada análisis pedido (página, API o masivo)."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    cancion_id: Optional[str] = Field(default=None, foreign_key="cancion.id", index=True)
+    origen: str
+    benchmarks: int = 0
+    nuevos: int = 0
+    creado_en: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class TendenciaDiaria(SQLModel, table=True):
+    """Resumen de los resultados de análisis por benchmark y día (UTC), mantenido al escribirlos."""
+    __table_args__ = (
+        Index("ux_tendenciadiaria_dia_benchmark", "dia", "benchmark_id", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    benchmark_id: int = Field(foreign_key="benchmark.id")
+    dia: date
+    total: int = 0
+    suma_afinidad: float = 0.0
+    excelente: int = 0
+    bueno: int = 0
+    regular: int = 0
+    bajo: int = 0
+
+
+class VecinoCancion(SQLModel, table=True):
+    __table_args__ = (
+        # Cortes (último puesto) de las listas candidatas y el corte mínimo sin tocar el resto de filas
+        Index("ix_vecinocancion_posicion_cancion", "posicion", "cancion_id", "similitud"),
+        # Un puesto por lista; guardar_lista hace upsert sobre este índice
+        Index("ux_vecinocancion_cancion_posicion", "cancion_id", "posicion", unique=True),
+        # Datos derivados: si falta un índice único se vacía antes de crearlo (ver actualizar_esquema)
+        {"info": {"derivada": True}},
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    cancion_id: str = Field(foreign_key="cancion.id", index=True)
+    vecino_id: str = Field(foreign_key="cancion.id", index=True)
+    posicion: int
+    similitud: float
+    # Versión del catálogo con la que se calculó; None en listas anteriores a la columna
+    version: Optional[int] = None
+
+
+class Contador(SQLModel, table=True):
+    """Activos y eliminados por tabla, mantenidos en la misma transacción que cada escritura."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tabla: str = Field(unique=True)
+    activos: int = 0
+    eliminados: int = 0
+    # Solo en la fila de cancion: sube una vez por transacción que escribe canciones
+    version: Optional[int] = 0
+
+
 class Configuracion(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     clave: str = Field(unique=True)
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from sqlmodel import Session, select, func
 from database import get_session
 from models import Cancion, Benchmark, AnalisisResultado
+from services.resultados_service import guardar_analisis
+from services.tendencias_service import tendencias_desde
+from services.exportacion_service import consulta_exportacion, exportar_ndjson
+from services.analisis_masivo_service import (
+    MAX_DISTANCIA, CELDAS_POR_TANDA, nivel_afinidad, crear_trabajo, ejecutar_trabajo, estado_trabajo
+)
 import math
 import logging
 from datetime import datetime, timedelta
-import asyncio
 
 router = APIRouter(prefix="/analisis-v2", tags=["Análisis Mejorado"])
 logger = logging.getLogger(__name__)
@@ -28,21 +33,8 @@ def calcular_afinidad_completa(cancion: Cancion, benchmark: Benchmark) -> dict:
         valence_diff ** 2
     )
 
-    max_distancia = math.sqrt(200 ** 2 + 1 ** 2 + 1 ** 2 + 1 ** 2)
-    afinidad_porcentaje = max(0, 100 - (distancia / max_distancia * 100))
-
-    if afinidad_porcentaje > 80:
-        nivel = "🎵 EXCELENTE"
-        recomendacion = "Perfecto para este mercado"
-    elif afinidad_porcentaje > 60:
-        nivel = "✅ BUENO"
-        recomendacion = "Funcionaría bien"
-    elif afinidad_porcentaje > 40:
-        nivel = "⚠️ REGULAR"
-        recomendacion = "Podría mejorar"
-    else:
-        nivel = "❌ BAJO"
-        recomendacion = "No es el mercado objetivo"
+    afinidad_porcentaje = max(0, 100 - (distancia / MAX_DISTANCIA * 100))
+    nivel, recomendacion = nivel_afinidad(afinidad_porcentaje)
 
     return {
         "benchmark": f"{benchmark.genero} ({benchmark.pais})",
@@ -58,17 +50,30 @@ def calcular_afinidad_completa(cancion: Cancion, benchmark: Benchmark) -> dict:
         }
     }
 
+def _armar_tendencias(resumen: list) -> list:
+    """Tendencias listas para mostrar, de mayor a menor afinidad promedio."""
+    tendencias = [
+        {
+            "benchmark": f"{t['genero']} ({t['pais']})" if t["genero"] is not None else f"ID {t['benchmark_id']}",
+            "total_analisis": t["total"],
+            "afinidad_promedio": round(t["afinidad_promedio"], 1),
+            "niveles": t["niveles"]
+        }
+        for t in resumen
+    ]
+    tendencias.sort(key=lambda x: x["afinidad_promedio"], reverse=True)
+    return tendencias
+
 # ========== ENDPOINTS HTML ==========
 
 @router.get("/cancion/{cancion_id}", response_class=HTMLResponse)
-async def analizar_cancion_completo_html(
+def analizar_cancion_completo_html(
     request: Request,
     cancion_id: str,
     session: Session = Depends(get_session)
 ):
     """Analizar canción (HTML)"""
     try:
-        await asyncio.sleep(0.01)
         cancion = session.get(Cancion, cancion_id)
         if not cancion or cancion.deleted_at:
             return templates.TemplateResponse("error.html", {
@@ -76,7 +81,6 @@ async def analizar_cancion_completo_html(
                 "error": "Canción no encontrada"
             })
 
-        await asyncio.sleep(0.01)
         benchmarks = session.exec(
             select(Benchmark).where(Benchmark.deleted_at == None)
         ).all()
@@ -87,22 +91,10 @@ async def analizar_cancion_completo_html(
                 "cancion": cancion
             })
 
-        resultados = []
-        for benchmark in benchmarks:
-            analisis = calcular_afinidad_completa(cancion, benchmark)
-            resultados.append(analisis)
+        resultados = [calcular_afinidad_completa(cancion, benchmark) for benchmark in benchmarks]
 
-            # Guardar en base de datos
-            registro = AnalisisResultado(
-                cancion_id=cancion_id,
-                benchmark_id=benchmark.id,
-                afinidad=analisis["afinidad"],
-                hallazgo=analisis["nivel"]
-            )
-            session.add(registro)
-
-        await asyncio.sleep(0.01)
-        session.commit()
+        # Solo se escriben los resultados cuyas entradas cambiaron desde el último análisis
+        guardar_analisis(session, cancion, benchmarks, resultados, "html")
 
         resultados_ordenados = sorted(resultados, key=lambda x: x["afinidad"], reverse=True)
 
@@ -129,7 +121,7 @@ async def analizar_cancion_completo_html(
         })
 
 @router.get("/tendencias", response_class=HTMLResponse)
-async def analizar_tendencias_html(
+def analizar_tendencias_html(
     request: Request,
     dias: int = 7,
     session: Session = Depends(get_session)
@@ -138,13 +130,11 @@ async def analizar_tendencias_html(
     try:
         fecha_limite = datetime.utcnow() - timedelta(days=dias)
 
-        await asyncio.sleep(0.01)
-        analisis_recientes = session.exec(
-            select(AnalisisResultado)
-            .where(AnalisisResultado.creado_en >= fecha_limite)
-        ).all()
+        # Una sola consulta: días completos desde los resúmenes, el día parcial fila a fila
+        resumen = tendencias_desde(session, fecha_limite)
+        total_analisis = sum(t["total"] for t in resumen)
 
-        if not analisis_recientes:
+        if not total_analisis:
             return templates.TemplateResponse("analisis/tendencias.html", {
                 "request": request,
                 "datos": {
@@ -154,47 +144,13 @@ async def analizar_tendencias_html(
                 }
             })
 
-        tendencias = {}
-        for a in analisis_recientes:
-            benchmark_id = a.benchmark_id
-            if benchmark_id not in tendencias:
-                benchmark = session.get(Benchmark, benchmark_id)
-                tendencias[benchmark_id] = {
-                    "benchmark": f"{benchmark.genero} ({benchmark.pais})" if benchmark else f"ID {benchmark_id}",
-                    "total_analisis": 0,
-                    "afinidad_promedio": 0,
-                    "niveles": {"EXCELENTE": 0, "BUENO": 0, "REGULAR": 0, "BAJO": 0}
-                }
-
-            tendencias[benchmark_id]["total_analisis"] += 1
-            tendencias[benchmark_id]["afinidad_promedio"] += a.afinidad
-
-            if a.afinidad > 80:
-                nivel = "EXCELENTE"
-            elif a.afinidad > 60:
-                nivel = "BUENO"
-            elif a.afinidad > 40:
-                nivel = "REGULAR"
-            else:
-                nivel = "BAJO"
-
-            tendencias[benchmark_id]["niveles"][nivel] += 1
-
-        for key in tendencias:
-            if tendencias[key]["total_analisis"] > 0:
-                tendencias[key]["afinidad_promedio"] = round(
-                    tendencias[key]["afinidad_promedio"] / tendencias[key]["total_analisis"],
-                    1
-                )
-
-        lista_tendencias = list(tendencias.values())
-        lista_tendencias.sort(key=lambda x: x["afinidad_promedio"], reverse=True)
+        lista_tendencias = _armar_tendencias(resumen)
 
         return templates.TemplateResponse("analisis/tendencias.html", {
             "request": request,
             "datos": {
                 "periodo": f"Últimos {dias} días",
-                "total_analisis": len(analisis_recientes),
+                "total_analisis": total_analisis,
                 "tendencias": lista_tendencias[:10]
             }
         })
@@ -209,18 +165,16 @@ async def analizar_tendencias_html(
 # ========== ENDPOINTS ORIGINALES (JSON) ==========
 
 @router.get("/api/cancion/{cancion_id}")
-async def analizar_cancion_completo_v2(
+def analizar_cancion_completo_v2(
     cancion_id: str,
     session: Session = Depends(get_session)
 ):
     """API: Analizar canción (JSON) - ORIGINAL"""
     try:
-        await asyncio.sleep(0.01)
         cancion = session.get(Cancion, cancion_id)
         if not cancion:
             raise HTTPException(404, "Canción no encontrada")
 
-        await asyncio.sleep(0.01)
         benchmarks = session.exec(
             select(Benchmark).where(Benchmark.deleted_at == None)
         ).all()
@@ -232,21 +186,9 @@ async def analizar_cancion_completo_v2(
                 "analisis": []
             }
 
-        resultados = []
-        for benchmark in benchmarks:
-            analisis = calcular_afinidad_completa(cancion, benchmark)
+        resultados = [calcular_afinidad_completa(cancion, benchmark) for benchmark in benchmarks]
 
-            registro = AnalisisResultado(
-                cancion_id=cancion_id,
-                benchmark_id=benchmark.id,
-                afinidad=analisis["afinidad"],
-                hallazgo=analisis["nivel"]
-            )
-            session.add(registro)
-            resultados.append(analisis)
-
-        await asyncio.sleep(0.01)
-        session.commit()
+        guardar_analisis(session, cancion, benchmarks, resultados, "api")
 
         resultados_ordenados = sorted(resultados, key=lambda x: x["afinidad"], reverse=True)
 
@@ -275,65 +217,71 @@ async def analizar_cancion_completo_v2(
         raise HTTPException(500, f"Error en análisis: {str(e)[:100]}")
 
 @router.get("/api/tendencias")
-async def analizar_tendencias_v2(
+def analizar_tendencias_v2(
     session: Session = Depends(get_session)
 ):
     """API: Tendencias (JSON) - ORIGINAL"""
     try:
         fecha_limite = datetime.utcnow() - timedelta(days=7)
 
-        await asyncio.sleep(0.01)
-        analisis_recientes = session.exec(
-            select(AnalisisResultado)
-            .where(AnalisisResultado.creado_en >= fecha_limite)
-        ).all()
+        resumen = tendencias_desde(session, fecha_limite)
+        total_analisis = sum(t["total"] for t in resumen)
 
-        if not analisis_recientes:
+        if not total_analisis:
             return {"message": "No hay análisis recientes", "tendencias": []}
 
-        tendencias = {}
-        for a in analisis_recientes:
-            benchmark_id = a.benchmark_id
-            if benchmark_id not in tendencias:
-                await asyncio.sleep(0.01)
-                benchmark = session.get(Benchmark, benchmark_id)
-                tendencias[benchmark_id] = {
-                    "benchmark": f"{benchmark.genero} ({benchmark.pais})" if benchmark else f"ID {benchmark_id}",
-                    "total_analisis": 0,
-                    "afinidad_promedio": 0,
-                    "niveles": {"EXCELENTE": 0, "BUENO": 0, "REGULAR": 0, "BAJO": 0}
-                }
-
-            tendencias[benchmark_id]["total_analisis"] += 1
-            tendencias[benchmark_id]["afinidad_promedio"] += a.afinidad
-
-            if a.afinidad > 80:
-                nivel = "EXCELENTE"
-            elif a.afinidad > 60:
-                nivel = "BUENO"
-            elif a.afinidad > 40:
-                nivel = "REGULAR"
-            else:
-                nivel = "BAJO"
-
-            tendencias[benchmark_id]["niveles"][nivel] += 1
-
-        for key in tendencias:
-            if tendencias[key]["total_analisis"] > 0:
-                tendencias[key]["afinidad_promedio"] = round(
-                    tendencias[key]["afinidad_promedio"] / tendencias[key]["total_analisis"],
-                    1
-                )
-
-        lista_tendencias = list(tendencias.values())
-        lista_tendencias.sort(key=lambda x: x["afinidad_promedio"], reverse=True)
+        lista_tendencias = _armar_tendencias(resumen)
 
         return {
             "periodo": "Últimos 7 días",
-            "total_analisis": len(analisis_recientes),
+            "total_analisis": total_analisis,
             "tendencias": lista_tendencias[:5]
         }
 
     except Exception as e:
         logger.error(f"Error analizando tendencias: {e}")
-        return {"error": str(e), "tendencias": []}
\ No newline at end of file
+        return {"error": str(e), "tendencias": []}
+
+@router.get("/export.ndjson")
+async def exportar_resultados():
+    """Exporta todos los resultados de análisis como NDJSON, en streaming"""
+    return StreamingResponse(
+        exportar_ndjson(consulta_exportacion(AnalisisResultado)),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="analisis.ndjson"'}
+    )
+
+@router.post("/api/bulk")
+async def analizar_catalogo_completo(
+    background_tasks: BackgroundTasks,
+    celdas_por_tanda: int = CELDAS_POR_TANDA
+):
+    """API: Recalcular la afinidad de todo el catálogo contra todos los benchmarks.
+
+    Corre en segundo plano por tandas; el avance se consulta en /api/bulk/{trabajo_id}.
+    Si ya hay un análisis masivo pendiente o en curso responde 409 con su id.
+    """
+    if celdas_por_tanda < 1:
+        raise HTTPException(400, "celdas_por_tanda debe ser mayor a 0")
+
+    trabajo_id, creado = crear_trabajo()
+    if not creado:
+        raise HTTPException(409, {
+            "mensaje": "Ya hay un análisis masivo pendiente o en curso",
+            "trabajo_id": trabajo_id,
+            "progreso": f"/analisis-v2/api/bulk/{trabajo_id}"
+        })
+    background_tasks.add_task(ejecutar_trabajo, trabajo_id, celdas_por_tanda)
+    return {
+        "trabajo_id": trabajo_id,
+        "estado": "pendiente",
+        "progreso": f"/analisis-v2/api/bulk/{trabajo_id}"
+    }
+
+@router.get("/api/bulk/{trabajo_id}")
+async def estado_analisis_catalogo(trabajo_id: str):
+    """API: Avance de un análisis masivo"""
+    trabajo = estado_trabajo(trabajo_id)
+    if not trabajo:
+        raise HTTPException(404, "Trabajo no encontrado")
+    return trabajo
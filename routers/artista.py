@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, UploadFile, Form, HTTPException, File, Request
+from fastapi import APIRouter, Depends, Query, UploadFile, Form, HTTPException, File, Request
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime
-from database import get_session
+from typing import Optional
+from database import get_session, get_async_session
 from models import Artista
+from services.contadores_service import leer_contadores
+from services.exportacion_service import consulta_exportacion, exportar_ndjson
+from services.paginacion_service import LIMITE_PAGINA, LIMITE_MAXIMO, paginar, cortar_pagina
 from supabase_service import upload_to_bucket
+from services.indice_artistas_service import actualizar_indice_artistas
 import logging
-import asyncio
 
 router = APIRouter(prefix="/artistas", tags=["Artistas"])
 logger = logging.getLogger(__name__)
@@ -21,19 +26,23 @@ templates = Jinja2Templates(directory="templates")
 @router.get("/", response_class=HTMLResponse)
 async def listar_artistas_html(
         request: Request,
-        session: Session = Depends(get_session)
+        limit: int = Query(LIMITE_PAGINA, ge=1, le=LIMITE_MAXIMO),
+        cursor: Optional[str] = None,
+        session: AsyncSession = Depends(get_async_session)
 ):
-    """Lista artistas (HTML)"""
+    """Lista artistas (HTML), una página a la vez"""
     try:
-        await asyncio.sleep(0.01)
-        artistas = session.exec(
-            select(Artista).where(Artista.deleted_at == None)
-        ).all()
+        artistas, siguiente = cortar_pagina((await session.exec(
+            paginar(select(Artista).where(Artista.deleted_at == None), Artista, limit, cursor)
+        )).all(), limit)
+        contadores = await session.run_sync(leer_contadores)
 
         return templates.TemplateResponse("artistas/list.html", {
             "request": request,
             "artistas": artistas,
-            "total": len(artistas)
+            "total": contadores["artista"][0],
+            "siguiente_cursor": siguiente,
+            "limit": limit
         })
 
     except Exception as e:
@@ -44,6 +53,41 @@ async def listar_artistas_html(
         })
 
 
+# /api y /export.ndjson van antes de /{id}; si no, se tomarían como un id
+@router.get("/api")
+async def listar_artistas_api(
+        limit: int = Query(LIMITE_PAGINA, ge=1, le=LIMITE_MAXIMO),
+        cursor: Optional[str] = None,
+        session: AsyncSession = Depends(get_async_session)
+):
+    """API: Listar artistas (JSON) por páginas; el total sale de los contadores"""
+    try:
+        artistas, siguiente = cortar_pagina((await session.exec(
+            paginar(select(Artista).where(Artista.deleted_at == None), Artista, limit, cursor)
+        )).all(), limit)
+        contadores = await session.run_sync(leer_contadores)
+        return {
+            "total": contadores["artista"][0],
+            "artistas": artistas,
+            "siguiente_cursor": siguiente
+        }
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        logger.error(f"Error listando artistas: {e}")
+        return {"total": 0, "artistas": [], "siguiente_cursor": None}
+
+
+@router.get("/export.ndjson")
+async def exportar_artistas():
+    """Exporta todas las artistas activas como NDJSON, en streaming"""
+    return StreamingResponse(
+        exportar_ndjson(consulta_exportacion(Artista, Artista.deleted_at == None)),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="artistas.ndjson"'}
+    )
+
+
 @router.get("/crear", response_class=HTMLResponse)
 async def crear_artista_form(request: Request):
     """Formulario crear artista (HTML)"""
@@ -53,7 +97,7 @@ async def crear_artista_form(request: Request):
 
 
 @router.post("/crear", response_class=RedirectResponse)
-async def crear_artista_web(
+def crear_artista_web(
         request: Request,
         nombre: str = Form(...),
         pais: str = Form(None),
@@ -75,11 +119,11 @@ async def crear_artista_web(
                         logger.warning(f"Archivo no es imagen: {imagen.content_type}")
                         url = None
                     else:
-                        url = await upload_to_bucket(imagen)
+                        url = upload_to_bucket(imagen)
                         if not url:
                             logger.warning("upload_to_bucket devolvió None")
                 else:
-                    url = await upload_to_bucket(imagen)
+                    url = upload_to_bucket(imagen)
             except Exception as img_error:
                 logger.warning(f"Error procesando imagen: {img_error}")
                 url = None
@@ -92,9 +136,9 @@ async def crear_artista_web(
             imagen_url=url
         )
 
-        await asyncio.sleep(0.01)
         session.add(artista)
         session.commit()
+        actualizar_indice_artistas(artista)
 
         return RedirectResponse("/artistas?success=Artista creado exitosamente", status_code=303)
 
@@ -107,14 +151,13 @@ async def crear_artista_web(
 
 
 @router.get("/{id}", response_class=HTMLResponse)
-async def detalle_artista_html(
+def detalle_artista_html(
         request: Request,
         id: int,
         session: Session = Depends(get_session)
 ):
     """Detalle artista (HTML)"""
     try:
-        await asyncio.sleep(0.01)
         artista = session.get(Artista, id)
         if not artista or artista.deleted_at:
             return templates.TemplateResponse("error.html", {
@@ -136,14 +179,13 @@ async def detalle_artista_html(
 
 
 @router.get("/{id}/editar", response_class=HTMLResponse)
-async def editar_artista_form(
+def editar_artista_form(
         request: Request,
         id: int,
         session: Session = Depends(get_session)
 ):
     """Formulario editar artista (HTML)"""
     try:
-        await asyncio.sleep(0.01)
         artista = session.get(Artista, id)
         if not artista or artista.deleted_at:
             return templates.TemplateResponse("error.html", {
@@ -165,7 +207,7 @@ async def editar_artista_form(
 
 
 @router.post("/{id}/editar", response_class=RedirectResponse)
-async def procesar_editar_artista(
+def procesar_editar_artista(
         id: int,
         nombre: str = Form(None),
         pais: str = Form(None),
@@ -176,7 +218,6 @@ async def procesar_editar_artista(
 ):
     """Procesar edición de artista"""
     try:
-        await asyncio.sleep(0.01)
         artista = session.get(Artista, id)
         if not artista or artista.deleted_at:
             raise HTTPException(404, "Artista no encontrado")
@@ -195,15 +236,15 @@ async def procesar_editar_artista(
 
         if imagen:
             try:
-                url = await upload_to_bucket(imagen)
+                url = upload_to_bucket(imagen)
                 if url:
                     artista.imagen_url = url
             except Exception as img_error:
                 logger.warning(f"Error actualizando imagen: {img_error}")
 
-        await asyncio.sleep(0.01)
         session.add(artista)
         session.commit()
+        actualizar_indice_artistas(artista)
 
         return RedirectResponse(f"/artistas/{id}?success=Artista actualizado exitosamente", status_code=303)
 
@@ -216,7 +257,7 @@ async def procesar_editar_artista(
 
 
 @router.get("/{id}/eliminar", response_class=HTMLResponse)
-async def confirmar_eliminar_artista(
+def confirmar_eliminar_artista(
         request: Request,
         id: int,
         session: Session = Depends(get_session)
@@ -244,7 +285,7 @@ async def confirmar_eliminar_artista(
 
 
 @router.post("/{id}", response_class=RedirectResponse)
-async def eliminar_artista_web(
+def eliminar_artista_web(
         id: int,
         session: Session = Depends(get_session)
 ):
@@ -260,6 +301,7 @@ async def eliminar_artista_web(
         artista.deleted_at = datetime.utcnow()
         session.add(artista)
         session.commit()
+        actualizar_indice_artistas(artista)
 
         return RedirectResponse("/artistas?success=Artista eliminado exitosamente", status_code=303)
 
@@ -270,7 +312,7 @@ async def eliminar_artista_web(
 
 
 @router.get("/{id}/comparar", response_class=HTMLResponse)
-async def comparar_artista_spotify_html(
+def comparar_artista_spotify_html(
         request: Request,
         id: int,
         session: Session = Depends(get_session)
@@ -300,7 +342,7 @@ async def comparar_artista_spotify_html(
 # ========== MANTENER ENDPOINTS ORIGINALES (JSON) ==========
 
 @router.post("/", response_model=Artista)
-async def crear_artista(
+def crear_artista(
         nombre: str = Form(...),
         pais: str = Form(None),
         genero_principal: str = Form(None),
@@ -321,11 +363,11 @@ async def crear_artista(
                         logger.warning(f"Archivo no es imagen: {imagen.content_type}")
                         url = None
                     else:
-                        url = await upload_to_bucket(imagen)
+                        url = upload_to_bucket(imagen)
                         if not url:
                             logger.warning("upload_to_bucket devolvió None")
                 else:
-                    url = await upload_to_bucket(imagen)
+                    url = upload_to_bucket(imagen)
             except Exception as img_error:
                 logger.warning(f"Error procesando imagen: {img_error}")
                 url = None
@@ -338,10 +380,10 @@ async def crear_artista(
             imagen_url=url
         )
 
-        await asyncio.sleep(0.01)
         session.add(artista)
         session.commit()
         session.refresh(artista)
+        actualizar_indice_artistas(artista)
         return artista
 
     except HTTPException:
@@ -352,24 +394,10 @@ async def crear_artista(
         raise HTTPException(500, "Error interno del servidor")
 
 
-@router.get("/api", response_model=list[Artista])
-async def listar_artistas_api(session: Session = Depends(get_session)):
-    """API: Listar artistas (JSON) - ORIGINAL"""
-    try:
-        await asyncio.sleep(0.01)
-        return session.exec(
-            select(Artista).where(Artista.deleted_at == None)
-        ).all()
-    except Exception as e:
-        logger.error(f"Error listando artistas: {e}")
-        return []
-
-
 @router.get("/api/{id}", response_model=Artista)
-async def obtener_artista_api(id: int, session: Session = Depends(get_session)):
+def obtener_artista_api(id: int, session: Session = Depends(get_session)):
     """API: Obtener artista (JSON) - ORIGINAL"""
     try:
-        await asyncio.sleep(0.01)
         artista = session.get(Artista, id)
         if not artista or artista.deleted_at:
             raise HTTPException(404, "Artista no encontrado")
@@ -382,7 +410,7 @@ async def obtener_artista_api(id: int, session: Session = Depends(get_session)):
 
 
 @router.put("/{id}", response_model=Artista)
-async def actualizar_artista(
+def actualizar_artista(
         id: int,
         nombre: str = Form(None),
         pais: str = Form(None),
@@ -393,7 +421,6 @@ async def actualizar_artista(
 ):
     """API: Actualizar artista (JSON) - ORIGINAL"""
     try:
-        await asyncio.sleep(0.01)
         artista = session.get(Artista, id)
         if not artista or artista.deleted_at:
             raise HTTPException(404, "Artista no encontrado")
@@ -416,20 +443,20 @@ async def actualizar_artista(
                     if not imagen.content_type.startswith('image/'):
                         logger.warning(f"Archivo no es imagen: {imagen.content_type}")
                     else:
-                        url = await upload_to_bucket(imagen)
+                        url = upload_to_bucket(imagen)
                         if url:
                             artista.imagen_url = url
                 else:
-                    url = await upload_to_bucket(imagen)
+                    url = upload_to_bucket(imagen)
                     if url:
                         artista.imagen_url = url
             except Exception as img_error:
                 logger.warning(f"Error actualizando imagen: {img_error}")
 
-        await asyncio.sleep(0.01)
         session.add(artista)
         session.commit()
         session.refresh(artista)
+        actualizar_indice_artistas(artista)
         return artista
 
     except HTTPException:
@@ -441,10 +468,9 @@ async def actualizar_artista(
 
 
 @router.delete("/{id}")
-async def eliminar_artista_api(id: int, session: Session = Depends(get_session)):
+def eliminar_artista_api(id: int, session: Session = Depends(get_session)):
     """API: Eliminar artista (JSON) - ORIGINAL"""
     try:
-        await asyncio.sleep(0.01)
         artista = session.get(Artista, id)
         if not artista:
             raise HTTPException(404, "Artista no encontrado")
@@ -453,9 +479,9 @@ async def eliminar_artista_api(id: int, session: Session = Depends(get_session))
             return {"message": "Artista ya estaba eliminado", "ok": True}
 
         artista.deleted_at = datetime.utcnow()
-        await asyncio.sleep(0.01)
         session.add(artista)
         session.commit()
+        actualizar_indice_artistas(artista)
         return {"message": "Artista eliminado exitosamente", "ok": True}
 
     except HTTPException:
@@ -467,10 +493,9 @@ async def eliminar_artista_api(id: int, session: Session = Depends(get_session))
 
 
 @router.get("/{id}/restaurar")
-async def restaurar_artista_api(id: int, session: Session = Depends(get_session)):
+def restaurar_artista_api(id: int, session: Session = Depends(get_session)):
     """API: Restaurar artista con redirección a /eliminados/cantantes"""
     try:
-        await asyncio.sleep(0.01)
         artista = session.get(Artista, id)
 
         if not artista:
@@ -483,6 +508,7 @@ async def restaurar_artista_api(id: int, session: Session = Depends(get_session)
         artista.deleted_at = None
         session.add(artista)
         session.commit()
+        actualizar_indice_artistas(artista)
 
         # ✔ Redirige al listado de eliminados
         return RedirectResponse("/artistas", status_code=303)
@@ -496,7 +522,7 @@ async def restaurar_artista_api(id: int, session: Session = Depends(get_session)
 
 
 @router.patch("/{id}")
-async def actualizar_parcial_artista(
+def actualizar_parcial_artista(
         id: int,
         nombre: str = Form(None),
         pais: str = Form(None),
@@ -507,7 +533,6 @@ async def actualizar_parcial_artista(
 ):
     """API: Actualización parcial (JSON) - ORIGINAL"""
     try:
-        await asyncio.sleep(0.01)
         artista = session.get(Artista, id)
         if not artista or artista.deleted_at:
             raise HTTPException(404, "Artista no encontrado")
@@ -534,7 +559,7 @@ async def actualizar_parcial_artista(
                     if not imagen.content_type.startswith('image/'):
                         raise HTTPException(400, "Archivo debe ser una imagen")
 
-                url = await upload_to_bucket(imagen)
+                url = upload_to_bucket(imagen)
                 if url:
                     artista.imagen_url = url
                     updates["imagen_url"] = url
@@ -544,10 +569,10 @@ async def actualizar_parcial_artista(
         if not updates:
             return {"message": "No se proporcionaron campos para actualizar", "artista": artista}
 
-        await asyncio.sleep(0.01)
         session.add(artista)
         session.commit()
         session.refresh(artista)
+        actualizar_indice_artistas(artista)
 
         return {
             "message": "Artista actualizado parcialmente",
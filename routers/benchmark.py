@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Form, File, UploadFile
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Form, File, UploadFile
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime
-from database import get_session
+from typing import Optional
+from database import get_session, get_async_session
 from models import Benchmark
+from services.contadores_service import leer_contadores
+from services.exportacion_service import consulta_exportacion, exportar_ndjson
+from services.paginacion_service import LIMITE_PAGINA, LIMITE_MAXIMO, paginar, cortar_pagina
 import logging
-import asyncio
 
 router = APIRouter(prefix="/benchmarks", tags=["Benchmarks"])
 logger = logging.getLogger(__name__)
@@ -19,19 +23,23 @@ templates = Jinja2Templates(directory="templates")
 @router.get("/", response_class=HTMLResponse)
 async def listar_benchmarks_html(
     request: Request,
-    session: Session = Depends(get_session)
+    limit: int = Query(LIMITE_PAGINA, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session)
 ):
-    """Lista benchmarks (HTML)"""
+    """Lista benchmarks (HTML), una página a la vez"""
     try:
-        await asyncio.sleep(0.01)
-        benchmarks = session.exec(
-            select(Benchmark).where(Benchmark.deleted_at == None)
-        ).all()
+        benchmarks, siguiente = cortar_pagina((await session.exec(
+            paginar(select(Benchmark).where(Benchmark.deleted_at == None), Benchmark, limit, cursor)
+        )).all(), limit)
+        contadores = await session.run_sync(leer_contadores)
 
         return templates.TemplateResponse("benchmarks/list.html", {
             "request": request,
             "benchmarks": benchmarks,
-            "total": len(benchmarks)
+            "total": contadores["benchmark"][0],
+            "siguiente_cursor": siguiente,
+            "limit": limit
         })
 
     except Exception as e:
@@ -42,6 +50,41 @@ async def listar_benchmarks_html(
         })
 
 
+# /api y /export.ndjson van antes de /{id}; si no, se tomarían como un id
+@router.get("/api")
+async def listar_benchmarks(
+    limit: int = Query(LIMITE_PAGINA, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """API: Listar benchmarks (JSON) por páginas; el total sale de los contadores"""
+    try:
+        benchmarks, siguiente = cortar_pagina((await session.exec(
+            paginar(select(Benchmark).where(Benchmark.deleted_at == None), Benchmark, limit, cursor)
+        )).all(), limit)
+        contadores = await session.run_sync(leer_contadores)
+        return {
+            "total": contadores["benchmark"][0],
+            "benchmarks": benchmarks,
+            "siguiente_cursor": siguiente
+        }
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        logger.error(f"Error listando benchmarks: {e}")
+        return {"total": 0, "benchmarks": [], "siguiente_cursor": None}
+
+
+@router.get("/export.ndjson")
+async def exportar_benchmarks():
+    """Exporta todas las benchmarks activas como NDJSON, en streaming"""
+    return StreamingResponse(
+        exportar_ndjson(consulta_exportacion(Benchmark, Benchmark.deleted_at == None)),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="benchmarks.ndjson"'}
+    )
+
+
 @router.get("/crear", response_class=HTMLResponse)
 async def crear_benchmark_form(request: Request):
     """Formulario crear benchmark (HTML)"""
@@ -51,7 +94,7 @@ async def crear_benchmark_form(request: Request):
 
 
 @router.post("/crear", response_class=RedirectResponse)
-async def crear_benchmark_web(
+def crear_benchmark_web(
     request: Request,
     pais: str = Form(...),
     genero: str = Form(...),
@@ -77,7 +120,6 @@ async def crear_benchmark_web(
             valence_promedio=valence_promedio
         )
 
-        await asyncio.sleep(0.01)
         session.add(benchmark)
         session.commit()
 
@@ -92,14 +134,13 @@ async def crear_benchmark_web(
 
 
 @router.get("/{id}", response_class=HTMLResponse)
-async def detalle_benchmark_html(
+def detalle_benchmark_html(
     request: Request,
     id: int,
     session: Session = Depends(get_session)
 ):
     """Detalle benchmark (HTML)"""
     try:
-        await asyncio.sleep(0.01)
         benchmark = session.get(Benchmark, id)
         if not benchmark or benchmark.deleted_at:
             return templates.TemplateResponse("error.html", {
@@ -121,14 +162,13 @@ async def detalle_benchmark_html(
 
 
 @router.get("/{id}/editar", response_class=HTMLResponse)
-async def editar_benchmark_form(
+def editar_benchmark_form(
     request: Request,
     id: int,
     session: Session = Depends(get_session)
 ):
     """Formulario editar benchmark (HTML)"""
     try:
-        await asyncio.sleep(0.01)
         benchmark = session.get(Benchmark, id)
         if not benchmark or benchmark.deleted_at:
             return templates.TemplateResponse("error.html", {
@@ -150,7 +190,7 @@ async def editar_benchmark_form(
 
 
 @router.post("/{id}/editar", response_class=RedirectResponse)
-async def procesar_editar_benchmark(
+def procesar_editar_benchmark(
     id: int,
     pais: str = Form(None),
     genero: str = Form(None),
@@ -162,7 +202,6 @@ async def procesar_editar_benchmark(
 ):
     """Procesar edición de benchmark"""
     try:
-        await asyncio.sleep(0.01)
         benchmark = session.get(Benchmark, id)
         if not benchmark or benchmark.deleted_at:
             raise HTTPException(404, "Benchmark no encontrado")
@@ -185,7 +224,6 @@ async def procesar_editar_benchmark(
         if valence_promedio is not None:
             benchmark.valence_promedio = valence_promedio
 
-        await asyncio.sleep(0.01)
         session.add(benchmark)
         session.commit()
 
@@ -200,7 +238,7 @@ async def procesar_editar_benchmark(
 
 
 @router.get("/{id}/eliminar", response_class=HTMLResponse)
-async def confirmar_eliminar_benchmark(
+def confirmar_eliminar_benchmark(
     request: Request,
     id: int,
     session: Session = Depends(get_session)
@@ -228,7 +266,7 @@ async def confirmar_eliminar_benchmark(
 
 
 @router.post("/{id}", response_class=RedirectResponse)
-async def eliminar_benchmark_web(
+def eliminar_benchmark_web(
     id: int,
     session: Session = Depends(get_session)
 ):
@@ -254,7 +292,7 @@ async def eliminar_benchmark_web(
 
 
 @router.get("/{id}/analizar", response_class=HTMLResponse)
-async def analizar_benchmark_html(
+def analizar_benchmark_html(
     request: Request,
     id: int,
     session: Session = Depends(get_session)
@@ -284,7 +322,7 @@ async def analizar_benchmark_html(
 # ========== ENDPOINTS ORIGINALES (JSON) ==========
 
 @router.post("/", response_model=Benchmark)
-async def crear_benchmark(
+def crear_benchmark(
     pais: str = Form(...),
     genero: str = Form(...),
     tempo_promedio: float = Form(...),
@@ -309,7 +347,6 @@ async def crear_benchmark(
             valence_promedio=valence_promedio
         )
 
-        await asyncio.sleep(0.01)
         session.add(benchmark)
         session.commit()
         session.refresh(benchmark)
@@ -323,24 +360,10 @@ async def crear_benchmark(
         raise HTTPException(500, "Error interno del servidor")
 
 
-@router.get("/api", response_model=list[Benchmark])
-async def listar_benchmarks(session: Session = Depends(get_session)):
-    """API: Listar benchmarks (JSON) - ORIGINAL"""
-    try:
-        await asyncio.sleep(0.01)
-        return session.exec(
-            select(Benchmark).where(Benchmark.deleted_at == None)
-        ).all()
-    except Exception as e:
-        logger.error(f"Error listando benchmarks: {e}")
-        return []
-
-
 @router.get("/api/{id}", response_model=Benchmark)
-async def obtener_benchmark(id: int, session: Session = Depends(get_session)):
+def obtener_benchmark(id: int, session: Session = Depends(get_session)):
     """API: Obtener benchmark (JSON) - ORIGINAL"""
     try:
-        await asyncio.sleep(0.01)
         benchmark = session.get(Benchmark, id)
         if not benchmark or benchmark.deleted_at:
             raise HTTPException(404, "Benchmark no encontrado")
@@ -353,7 +376,7 @@ async def obtener_benchmark(id: int, session: Session = Depends(get_session)):
 
 
 @router.put("/{id}", response_model=Benchmark)
-async def actualizar_benchmark(
+def actualizar_benchmark(
     id: int,
     pais: str = None,
     genero: str = None,
@@ -365,7 +388,6 @@ async def actualizar_benchmark(
 ):
     """API: Actualizar benchmark (JSON) - ORIGINAL"""
     try:
-        await asyncio.sleep(0.01)
         benchmark = session.get(Benchmark, id)
         if not benchmark or benchmark.deleted_at:
             raise HTTPException(404, "Benchmark no encontrado")
@@ -388,7 +410,6 @@ async def actualizar_benchmark(
         if valence_promedio is not None:
             benchmark.valence_promedio = valence_promedio
 
-        await asyncio.sleep(0.01)
         session.add(benchmark)
         session.commit()
         session.refresh(benchmark)
@@ -403,10 +424,9 @@ async def actualizar_benchmark(
 
 
 @router.delete("/{id}")
-async def eliminar_benchmark(id: int, session: Session = Depends(get_session)):
+def eliminar_benchmark(id: int, session: Session = Depends(get_session)):
     """API: Eliminar benchmark (JSON) - ORIGINAL"""
     try:
-        await asyncio.sleep(0.01)
         benchmark = session.get(Benchmark, id)
         if not benchmark:
             raise HTTPException(404, "Benchmark no encontrado")
@@ -415,7 +435,6 @@ async def eliminar_benchmark(id: int, session: Session = Depends(get_session)):
             return {"message": "Benchmark ya estaba eliminado", "ok": True}
 
         benchmark.deleted_at = datetime.utcnow()
-        await asyncio.sleep(0.01)
         session.add(benchmark)
         session.commit()
         return {"message": "Benchmark eliminado exitosamente", "ok": True}
@@ -429,10 +448,9 @@ async def eliminar_benchmark(id: int, session: Session = Depends(get_session)):
 
 
 @router.get("/{id}/restaurar")
-async def restaurar_benchmark(id: int, session: Session = Depends(get_session)):
+def restaurar_benchmark(id: int, session: Session = Depends(get_session)):
     """API: Restaurar benchmark con redirección"""
     try:
-        await asyncio.sleep(0.01)
         benchmark = session.get(Benchmark, id)
 
         if not benchmark:
@@ -1,13 +1,19 @@
-from fastapi import APIRouter, Depends, UploadFile, Form, HTTPException, File, Request
+from fastapi import APIRouter, Depends, Query, UploadFile, Form, HTTPException, File, Request
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime
-from database import get_session
+from typing import Optional
+from database import get_session, get_async_session
 from models import Cancion
+from services.contadores_service import leer_contadores
+from services.exportacion_service import consulta_exportacion, exportar_ndjson
+from services.paginacion_service import LIMITE_PAGINA, LIMITE_MAXIMO, paginar, cortar_pagina
 from supabase_service import upload_to_bucket
+from services.similitud_service import actualizar_matriz
+from services.lista_vecinos_service import actualizar_vecinos
 import logging
-import asyncio
 
 router = APIRouter(prefix="/canciones", tags=["Canciones"])
 logger = logging.getLogger(__name__)
@@ -21,19 +27,23 @@ templates = Jinja2Templates(directory="templates")
 @router.get("/", response_class=HTMLResponse)
 async def listar_canciones_html(
         request: Request,
-        session: Session = Depends(get_session)
+        limit: int = Query(LIMITE_PAGINA, ge=1, le=LIMITE_MAXIMO),
+        cursor: Optional[str] = None,
+        session: AsyncSession = Depends(get_async_session)
 ):
-    """Lista canciones (HTML)"""
+    """Lista canciones (HTML), una página a la vez"""
     try:
-        await asyncio.sleep(0.01)
-        canciones = session.exec(
-            select(Cancion).where(Cancion.deleted_at == None)
-        ).all()
+        canciones, siguiente = cortar_pagina((await session.exec(
+            paginar(select(Cancion).where(Cancion.deleted_at == None), Cancion, limit, cursor)
+        )).all(), limit)
+        contadores = await session.run_sync(leer_contadores)
 
         return templates.TemplateResponse("canciones/list.html", {
             "request": request,
             "canciones": canciones,
-            "total": len(canciones)
+            "total": contadores["cancion"][0],
+            "siguiente_cursor": siguiente,
+            "limit": limit
         })
 
     except Exception as e:
@@ -44,6 +54,41 @@ async def listar_canciones_html(
         })
 
 
+# /api y /export.ndjson van antes de /{id}; si no, se tomarían como un id
+@router.get("/api")
+async def listar_canciones(
+        limit: int = Query(LIMITE_PAGINA, ge=1, le=LIMITE_MAXIMO),
+        cursor: Optional[str] = None,
+        session: AsyncSession = Depends(get_async_session)
+):
+    """API: Listar canciones (JSON) por páginas; el total sale de los contadores"""
+    try:
+        canciones, siguiente = cortar_pagina((await session.exec(
+            paginar(select(Cancion).where(Cancion.deleted_at == None), Cancion, limit, cursor)
+        )).all(), limit)
+        contadores = await session.run_sync(leer_contadores)
+        return {
+            "total": contadores["cancion"][0],
+            "canciones": canciones,
+            "siguiente_cursor": siguiente
+        }
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        logger.error(f"Error listando canciones: {e}")
+        return {"total": 0, "canciones": [], "siguiente_cursor": None}
+
+
+@router.get("/export.ndjson")
+async def exportar_canciones():
+    """Exporta todas las canciones activas como NDJSON, en streaming"""
+    return StreamingResponse(
+        exportar_ndjson(consulta_exportacion(Cancion, Cancion.deleted_at == None)),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="canciones.ndjson"'}
+    )
+
+
 @router.get("/crear", response_class=HTMLResponse)
 async def crear_cancion_form(request: Request):
     """Formulario crear canción (HTML)"""
@@ -53,7 +98,7 @@ async def crear_cancion_form(request: Request):
 
 
 @router.post("/crear", response_class=RedirectResponse)
-async def crear_cancion_web(
+def crear_cancion_web(
         request: Request,
         nombre: str = Form(...),
         artista: str = Form(...),
@@ -80,11 +125,11 @@ async def crear_cancion_web(
                         logger.warning(f"Archivo no es imagen: {imagen.content_type}")
                         url = None
                     else:
-                        url = await upload_to_bucket(imagen)
+                        url = upload_to_bucket(imagen)
                         if not url:
                             logger.warning("upload_to_bucket devolvió None")
                 else:
-                    url = await upload_to_bucket(imagen)
+                    url = upload_to_bucket(imagen)
             except Exception as img_error:
                 logger.warning(f"Error procesando imagen: {img_error}")
                 url = None
@@ -100,9 +145,10 @@ async def crear_cancion_web(
             imagen_url=url
         )
 
-        await asyncio.sleep(0.01)
         session.add(cancion)
         session.commit()
+        actualizar_matriz(cancion)
+        actualizar_vecinos(session, cancion)
 
         return RedirectResponse("/canciones?success=Canción creada exitosamente", status_code=303)
 
@@ -115,14 +161,13 @@ async def crear_cancion_web(
 
 
 @router.get("/{id}", response_class=HTMLResponse)
-async def detalle_cancion_html(
+def detalle_cancion_html(
         request: Request,
         id: str,
         session: Session = Depends(get_session)
 ):
     """Detalle canción (HTML)"""
     try:
-        await asyncio.sleep(0.01)
         cancion = session.get(Cancion, id)
         if not cancion or cancion.deleted_at:
             return templates.TemplateResponse("error.html", {
@@ -144,14 +189,13 @@ async def detalle_cancion_html(
 
 
 @router.get("/{id}/editar", response_class=HTMLResponse)
-async def editar_cancion_form(
+def editar_cancion_form(
         request: Request,
         id: str,
         session: Session = Depends(get_session)
 ):
     """Formulario editar canción (HTML)"""
     try:
-        await asyncio.sleep(0.01)
         cancion = session.get(Cancion, id)
         if not cancion or cancion.deleted_at:
             return templates.TemplateResponse("error.html", {
@@ -173,7 +217,7 @@ async def editar_cancion_form(
 
 
 @router.post("/{id}/editar", response_class=RedirectResponse)
-async def procesar_editar_cancion(
+def procesar_editar_cancion(
         id: str,
         nombre: str = Form(None),
         artista: str = Form(None),
@@ -187,7 +231,6 @@ async def procesar_editar_cancion(
 ):
     """Procesar edición de canción"""
     try:
-        await asyncio.sleep(0.01)
         cancion = session.get(Cancion, id)
         if not cancion or cancion.deleted_at:
             raise HTTPException(404, "Canción no encontrada")
@@ -214,15 +257,16 @@ async def procesar_editar_cancion(
 
         if imagen:
             try:
-                url = await upload_to_bucket(imagen)
+                url = upload_to_bucket(imagen)
                 if url:
                     cancion.imagen_url = url
             except Exception as img_error:
                 logger.warning(f"Error actualizando imagen: {img_error}")
 
-        await asyncio.sleep(0.01)
         session.add(cancion)
         session.commit()
+        actualizar_matriz(cancion)
+        actualizar_vecinos(session, cancion)
 
         return RedirectResponse(f"/canciones/{id}?success=Canción actualizada exitosamente", status_code=303)
 
@@ -237,7 +281,7 @@ async def procesar_editar_cancion(
 # ========== ENDPOINTS ORIGINALES (JSON) - MANTENER TODOS ==========
 
 @router.post("/", response_model=Cancion)
-async def crear_cancion(
+def crear_cancion(
         nombre: str = Form(...),
         artista: str = Form(...),
         tempo: float = Form(...),
@@ -263,11 +307,11 @@ async def crear_cancion(
                         logger.warning(f"Archivo no es imagen: {imagen.content_type}")
                         url = None
                     else:
-                        url = await upload_to_bucket(imagen)
+                        url = upload_to_bucket(imagen)
                         if not url:
                             logger.warning("upload_to_bucket devolvió None")
                 else:
-                    url = await upload_to_bucket(imagen)
+                    url = upload_to_bucket(imagen)
             except Exception as img_error:
                 logger.warning(f"Error procesando imagen: {img_error}")
                 url = None
@@ -283,9 +327,10 @@ async def crear_cancion(
             imagen_url=url
         )
 
-        await asyncio.sleep(0.01)
         session.add(cancion)
         session.commit()
+        actualizar_matriz(cancion)
+        actualizar_vecinos(session, cancion)
         session.refresh(cancion)
         return cancion
 
@@ -297,24 +342,10 @@ async def crear_cancion(
         raise HTTPException(500, "Error interno del servidor")
 
 
-@router.get("/api", response_model=list[Cancion])
-async def listar_canciones(session: Session = Depends(get_session)):
-    """API: Listar canciones (JSON) - ORIGINAL"""
-    try:
-        await asyncio.sleep(0.01)
-        return session.exec(
-            select(Cancion).where(Cancion.deleted_at == None)
-        ).all()
-    except Exception as e:
-        logger.error(f"Error listando canciones: {e}")
-        return []
-
-
 @router.get("/api/{id}", response_model=Cancion)
-async def obtener_cancion(id: str, session: Session = Depends(get_session)):
+def obtener_cancion(id: str, session: Session = Depends(get_session)):
     """API: Obtener canción (JSON) - ORIGINAL"""
     try:
-        await asyncio.sleep(0.01)
         cancion = session.get(Cancion, id)
         if not cancion or cancion.deleted_at:
             raise HTTPException(404, "Canción no encontrada")
@@ -327,7 +358,7 @@ async def obtener_cancion(id: str, session: Session = Depends(get_session)):
 
 
 @router.put("/{id}", response_model=Cancion)
-async def actualizar_cancion(
+def actualizar_cancion(
         id: str,
         nombre: str = Form(None),
         artista: str = Form(None),
@@ -341,7 +372,6 @@ async def actualizar_cancion(
 ):
     """API: Actualizar canción (JSON) - ORIGINAL"""
     try:
-        await asyncio.sleep(0.01)
         cancion = session.get(Cancion, id)
         if not cancion or cancion.deleted_at:
             raise HTTPException(404, "Canción no encontrada")
@@ -372,19 +402,20 @@ async def actualizar_cancion(
                     if not imagen.content_type.startswith('image/'):
                         logger.warning(f"Archivo no es imagen: {imagen.content_type}")
                     else:
-                        url = await upload_to_bucket(imagen)
+                        url = upload_to_bucket(imagen)
                         if url:
                             cancion.imagen_url = url
                 else:
-                    url = await upload_to_bucket(imagen)
+                    url = upload_to_bucket(imagen)
                     if url:
                         cancion.imagen_url = url
             except Exception as img_error:
                 logger.warning(f"Error actualizando imagen: {img_error}")
 
-        await asyncio.sleep(0.01)
         session.add(cancion)
         session.commit()
+        actualizar_matriz(cancion)
+        actualizar_vecinos(session, cancion)
         session.refresh(cancion)
         return cancion
 
@@ -397,10 +428,9 @@ async def actualizar_cancion(
 
 
 @router.delete("/{id}")
-async def eliminar_cancion(id: str, session: Session = Depends(get_session)):
+def eliminar_cancion(id: str, session: Session = Depends(get_session)):
     """API: Eliminar canción (JSON) - ORIGINAL"""
     try:
-        await asyncio.sleep(0.01)
         cancion = session.get(Cancion, id)
         if not cancion:
             raise HTTPException(404, "Canción no encontrada")
@@ -409,9 +439,10 @@ async def eliminar_cancion(id: str, session: Session = Depends(get_session)):
             return {"message": "Canción ya estaba eliminada", "ok": True}
 
         cancion.deleted_at = datetime.utcnow()
-        await asyncio.sleep(0.01)
         session.add(cancion)
         session.commit()
+        actualizar_matriz(cancion)
+        actualizar_vecinos(session, cancion)
         return {"message": "Canción eliminada exitosamente", "ok": True}
 
     except HTTPException:
@@ -424,9 +455,8 @@ async def eliminar_cancion(id: str, session: Session = Depends(get_session)):
 
 
 @router.get("/{id}/restaurar")
-async def restaurar_cancion(id: str, session: Session = Depends(get_session)):
+def restaurar_cancion(id: str, session: Session = Depends(get_session)):
     try:
-        await asyncio.sleep(0.01)
         cancion = session.get(Cancion, id)
 
         if not cancion:
@@ -439,6 +469,8 @@ async def restaurar_cancion(id: str, session: Session = Depends(get_session)):
         cancion.deleted_at = None
         session.add(cancion)
         session.commit()
+        actualizar_matriz(cancion)
+        actualizar_vecinos(session, cancion)
 
         # ✔ Redirección deseada
         return RedirectResponse("/canciones", status_code=303)
@@ -452,7 +484,7 @@ async def restaurar_cancion(id: str, session: Session = Depends(get_session)):
 
 
 @router.patch("/{id}")
-async def actualizar_parcial_cancion(
+def actualizar_parcial_cancion(
         id: str,
         nombre: str = Form(None),
         artista: str = Form(None),
@@ -466,7 +498,6 @@ async def actualizar_parcial_cancion(
 ):
     """API: Actualización parcial (JSON) - ORIGINAL"""
     try:
-        await asyncio.sleep(0.01)
         cancion = session.get(Cancion, id)
         if not cancion or cancion.deleted_at:
             raise HTTPException(404, "Canción no encontrada")
@@ -504,7 +535,7 @@ async def actualizar_parcial_cancion(
                     if not imagen.content_type.startswith('image/'):
                         raise HTTPException(400, "Archivo debe ser una imagen")
 
-                url = await upload_to_bucket(imagen)
+                url = upload_to_bucket(imagen)
                 if url:
                     cancion.imagen_url = url
                     updates["imagen_url"] = url
@@ -514,9 +545,10 @@ async def actualizar_parcial_cancion(
         if not updates:
             return {"message": "No se proporcionaron campos para actualizar", "cancion": cancion}
 
-        await asyncio.sleep(0.01)
         session.add(cancion)
         session.commit()
+        actualizar_matriz(cancion)
+        actualizar_vecinos(session, cancion)
         session.refresh(cancion)
 
         return {
@@ -534,7 +566,7 @@ async def actualizar_parcial_cancion(
 
 
 @router.get("/{id}/eliminar", response_class=HTMLResponse)
-async def confirmar_eliminar_cancion(
+def confirmar_eliminar_cancion(
         request: Request,
         id: str,
         session: Session = Depends(get_session)
@@ -562,7 +594,7 @@ async def confirmar_eliminar_cancion(
 
 
 @router.post("/{id}", response_class=RedirectResponse)
-async def eliminar_cancion_web(
+def eliminar_cancion_web(
         id: str,
         session: Session = Depends(get_session)
 ):
@@ -578,6 +610,8 @@ async def eliminar_cancion_web(
         cancion.deleted_at = datetime.utcnow()
         session.add(cancion)
         session.commit()
+        actualizar_matriz(cancion)
+        actualizar_vecinos(session, cancion)
 
         return RedirectResponse("/canciones?success=Canción eliminada exitosamente", status_code=303)
 
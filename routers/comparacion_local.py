@@ -6,7 +6,6 @@ from sqlmodel import Session, select
 from database import get_session
 from models import Cancion, Artista
 import logging
-import asyncio
 
 router = APIRouter(prefix="/comparacion-local", tags=["Comparación Local"])
 logger = logging.getLogger(__name__)
@@ -17,7 +16,7 @@ templates = Jinja2Templates(directory="templates")
 # ========== ENDPOINTS HTML ==========
 
 @router.get("/", response_class=HTMLResponse)
-async def pagina_comparacion_local(
+def pagina_comparacion_local(
     request: Request,
     session: Session = Depends(get_session)
 ):
@@ -45,7 +44,7 @@ async def pagina_comparacion_local(
         })
 
 @router.get("/canciones/{cancion1_id}/{cancion2_id}", response_class=HTMLResponse)
-async def comparar_canciones_locales_html(
+def comparar_canciones_locales_html(
     request: Request,
     cancion1_id: str,
     cancion2_id: str,
@@ -53,7 +52,7 @@ async def comparar_canciones_locales_html(
 ):
     """Comparar canciones locales (HTML)"""
     try:
-        resultado = await comparar_canciones_locales(cancion1_id, cancion2_id, session)
+        resultado = comparar_canciones_locales(cancion1_id, cancion2_id, session)
         return templates.TemplateResponse("comparacion/comparar_canciones.html", {
             "request": request,
             "comparacion": resultado
@@ -72,7 +71,7 @@ async def comparar_canciones_locales_html(
         })
 
 @router.get("/artistas/{artista1_id}/{artista2_id}", response_class=HTMLResponse)
-async def comparar_artistas_locales_html(
+def comparar_artistas_locales_html(
     request: Request,
     artista1_id: int,
     artista2_id: int,
@@ -80,7 +79,7 @@ async def comparar_artistas_locales_html(
 ):
     """Comparar artistas locales (HTML)"""
     try:
-        resultado = await comparar_artistas_locales(artista1_id, artista2_id, session)
+        resultado = comparar_artistas_locales(artista1_id, artista2_id, session)
         return templates.TemplateResponse("comparacion/comparar_artistas.html", {
             "request": request,
             "comparacion": resultado
@@ -99,7 +98,7 @@ async def comparar_artistas_locales_html(
         })
 
 @router.get("/cancion/{cancion_id}/seleccionar", response_class=HTMLResponse)
-async def seleccionar_cancion_comparar(
+def seleccionar_cancion_comparar(
     request: Request,
     cancion_id: str,
     session: Session = Depends(get_session)
@@ -135,15 +134,13 @@ async def seleccionar_cancion_comparar(
 
 # ========== FUNCIONES DE COMPARACIÓN (ORIGINALES) ==========
 
-async def comparar_canciones_locales(
+def comparar_canciones_locales(
     cancion1_id: str,
     cancion2_id: str,
     session: Session
 ):
     """Compara dos canciones locales entre sí"""
     try:
-        await asyncio.sleep(0.01)
-
         # Obtener ambas canciones
         cancion1 = session.get(Cancion, cancion1_id)
         cancion2 = session.get(Cancion, cancion2_id)
@@ -325,15 +322,13 @@ async def comparar_canciones_locales(
         logger.error(f"Error comparando canciones locales: {e}")
         raise HTTPException(500, "Error en comparación")
 
-async def comparar_artistas_locales(
+def comparar_artistas_locales(
     artista1_id: int,
     artista2_id: int,
     session: Session
 ):
     """Compara dos artistas locales entre sí"""
     try:
-        await asyncio.sleep(0.01)
-
         # Obtener ambos artistas
         artista1 = session.get(Artista, artista1_id)
         artista2 = session.get(Artista, artista2_id)
@@ -520,25 +515,25 @@ def _generar_recomendacion_artistas(artista1, artista2, similitud):
 # ========== ENDPOINTS ORIGINALES (JSON) ==========
 
 @router.get("/api/artistas/{artista1_id}/{artista2_id}")
-async def comparar_artistas_locales_api(
+def comparar_artistas_locales_api(
     artista1_id: int,
     artista2_id: int,
     session: Session = Depends(get_session)
 ):
     """API: Comparar artistas locales (JSON) - ORIGINAL"""
-    return await comparar_artistas_locales(artista1_id, artista2_id, session)
+    return comparar_artistas_locales(artista1_id, artista2_id, session)
 
 @router.get("/api/canciones/{cancion1_id}/{cancion2_id}")
-async def comparar_canciones_locales_api(
+def comparar_canciones_locales_api(
     cancion1_id: str,
     cancion2_id: str,
     session: Session = Depends(get_session)
 ):
     """API: Comparar canciones locales (JSON) - ORIGINAL"""
-    return await comparar_canciones_locales(cancion1_id, cancion2_id, session)
+    return comparar_canciones_locales(cancion1_id, cancion2_id, session)
 
 @router.get("/api/artista-con-spotify/{artista_id}")
-async def comparar_artista_con_spotify(
+def comparar_artista_con_spotify(
     artista_id: int,
     session: Session = Depends(get_session)
 ):
@@ -550,7 +545,7 @@ async def comparar_artista_con_spotify(
     }
 
 @router.get("/api/cancion-con-spotify/{cancion_id}")
-async def comparar_cancion_con_spotify(
+def comparar_cancion_con_spotify(
     cancion_id: str,
     session: Session = Depends(get_session)
 ):
@@ -1,14 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
-from sqlmodel import Session, select
-from database import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_async_session
 from models import Cancion, Artista
 from routers.spotify_auth import get_spotify_token_dependency
-import requests
+from services.spotify_service import ClienteSpotify, get_cliente_spotify
 import logging
 from difflib import SequenceMatcher
-import asyncio
 
 router = APIRouter(prefix="/comparar", tags=["Comparación Spotify"])
 logger = logging.getLogger(__name__)
@@ -23,11 +22,12 @@ async def comparar_cancion_spotify_html(
     request: Request,
     cancion_id: str,
     token: str = Depends(get_spotify_token_dependency),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session),
+    cliente: ClienteSpotify = Depends(get_cliente_spotify)
 ):
     """Comparar canción con Spotify (HTML)"""
     try:
-        resultado = await comparar_cancion_spotify(cancion_id, token, session)
+        resultado = await comparar_cancion_spotify(cancion_id, token, session, cliente)
         return templates.TemplateResponse("comparacion_spotify/comparar_cancion.html", {
             "request": request,
             "comparacion": resultado
@@ -45,11 +45,12 @@ async def comparar_artista_spotify_html(
     request: Request,
     artista_id: int,
     token: str = Depends(get_spotify_token_dependency),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session),
+    cliente: ClienteSpotify = Depends(get_cliente_spotify)
 ):
     """Comparar artista con Spotify (HTML)"""
     try:
-        resultado = await comparar_artista_spotify(artista_id, token, session)
+        resultado = await comparar_artista_spotify(artista_id, token, session, cliente)
         return templates.TemplateResponse("comparacion_spotify/comparar_artista.html", {
             "request": request,
             "comparacion": resultado
@@ -73,27 +74,22 @@ def similitud_texto(texto1: str, texto2: str) -> float:
 async def comparar_cancion_spotify(
     cancion_id: str,
     token: str,
-    session: Session
+    session: AsyncSession,
+    cliente: ClienteSpotify
 ):
     """Comparar canción con Spotify"""
     try:
-        await asyncio.sleep(0.01)
-        cancion = session.get(Cancion, cancion_id)
+        cancion = await session.get(Cancion, cancion_id)
         if not cancion:
             raise HTTPException(404, "Canción no encontrada")
 
-        headers = {'Authorization': f'Bearer {token}'}
         params = {
             'q': f"{cancion.nombre} {cancion.artista}",
             'type': 'track',
             'limit': 10
         }
 
-        response = requests.get(
-            'https://api.spotify.com/v1/search',
-            headers=headers,
-            params=params
-        )
+        response = await cliente.get('/search', token, params=params)
 
         if response.status_code != 200:
             return {
@@ -104,18 +100,11 @@ async def comparar_cancion_spotify(
 
         comparaciones = []
         tracks = response.json().get('tracks', {}).get('items', [])
+        features_por_track = await cliente.audio_features(token, [t['id'] for t in tracks[:5]])
 
         for track in tracks[:5]:
             track_id = track['id']
-
-            features_response = requests.get(
-                f'https://api.spotify.com/v1/audio-features/{track_id}',
-                headers=headers
-            )
-
-            features = {}
-            if features_response.status_code == 200:
-                features = features_response.json()
+            features = features_por_track.get(track_id) or {}
 
             sim_nombre = similitud_texto(cancion.nombre, track['name'])
             sim_artista = similitud_texto(cancion.artista, track['artists'][0]['name'])
@@ -170,27 +159,22 @@ async def comparar_cancion_spotify(
 async def comparar_artista_spotify(
     artista_id: int,
     token: str,
-    session: Session
+    session: AsyncSession,
+    cliente: ClienteSpotify
 ):
     """Comparar artista con Spotify"""
     try:
-        await asyncio.sleep(0.01)
-        artista = session.get(Artista, artista_id)
+        artista = await session.get(Artista, artista_id)
         if not artista:
             raise HTTPException(404, "Artista no encontrado")
 
-        headers = {'Authorization': f'Bearer {token}'}
         params = {
             'q': artista.nombre,
             'type': 'artist',
             'limit': 10
         }
 
-        response = requests.get(
-            'https://api.spotify.com/v1/search',
-            headers=headers,
-            params=params
-        )
+        response = await cliente.get('/search', token, params=params)
 
         if response.status_code != 200:
             return {
@@ -256,17 +240,19 @@ async def comparar_artista_spotify(
 async def comparar_cancion_spotify_api(
     cancion_id: str,
     token: str = Depends(get_spotify_token_dependency),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session),
+    cliente: ClienteSpotify = Depends(get_cliente_spotify)
 ):
     """API: Comparar canción con Spotify (JSON) - ORIGINAL"""
-    return await comparar_cancion_spotify(cancion_id, token, session)
+    return await comparar_cancion_spotify(cancion_id, token, session, cliente)
 
 
 @router.get("/api/artista/{artista_id}")
 async def comparar_artista_spotify_api(
     artista_id: int,
     token: str = Depends(get_spotify_token_dependency),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session),
+    cliente: ClienteSpotify = Depends(get_cliente_spotify)
 ):
     """API: Comparar artista con Spotify (JSON) - ORIGINAL"""
-    return await comparar_artista_spotify(artista_id, token, session)
\ No newline at end of file
+    return await comparar_artista_spotify(artista_id, token, session, cliente)
\ No newline at end of file
@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, Request
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
-from sqlmodel import Session, select, func
+from fastapi.responses import HTMLResponse, StreamingResponse
+from sqlmodel import Session
 from database import get_session
-from models import Cancion, Artista, Benchmark, AnalisisResultado
+from services.dashboard_service import obtener_resumen, snapshot_stream, delta_para_cliente, TEMA_DELTAS
+from services.eventos_service import bus
 import logging
-from datetime import datetime, timedelta
 import asyncio
+import json
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 logger = logging.getLogger(__name__)
@@ -14,112 +15,41 @@ logger = logging.getLogger(__name__)
 # Templates
 templates = Jinja2Templates(directory="templates")
 
+# Segundos sin eventos tras los que se manda un comentario para mantener viva la conexión
+SSE_KEEPALIVE = 15
+
 
 @router.get("/", response_class=HTMLResponse)
-async def obtener_dashboard_html(
+def obtener_dashboard_html(
         request: Request,
         session: Session = Depends(get_session)
 ):
     """Dashboard HTML"""
     try:
-        await asyncio.sleep(0.01)
-
-        # Totales
-        total_canciones = session.exec(
-            select(func.count()).select_from(Cancion).where(Cancion.deleted_at == None)
-        ).one()
-
-        total_artistas = session.exec(
-            select(func.count()).select_from(Artista).where(Artista.deleted_at == None)
-        ).one()
-
-        total_benchmarks = session.exec(
-            select(func.count()).select_from(Benchmark).where(Benchmark.deleted_at == None)
-        ).one()
-
-        # Eliminados
-        canciones_eliminadas = session.exec(
-            select(func.count()).select_from(Cancion).where(Cancion.deleted_at != None)
-        ).one()
-
-        artistas_eliminados = session.exec(
-            select(func.count()).select_from(Artista).where(Artista.deleted_at != None)
-        ).one()
-
-        benchmarks_eliminados = session.exec(
-            select(func.count()).select_from(Benchmark).where(Benchmark.deleted_at != None)
-        ).one()
-
-        # Análisis
-        total_analisis = session.exec(
-            select(func.count()).select_from(AnalisisResultado)
-        ).one()
-
-        ultimas_24h = datetime.utcnow() - timedelta(hours=24)
-        analisis_recientes = session.exec(
-            select(func.count()).select_from(AnalisisResultado)
-            .where(AnalisisResultado.creado_en >= ultimas_24h)
-        ).one()
-
-        # Afinidad promedio
-        afinidad_promedio_result = session.exec(
-            select(func.avg(AnalisisResultado.afinidad)).select_from(AnalisisResultado)
-        ).one()
-        afinidad_promedio = f"{round(afinidad_promedio_result or 0, 1)}%"
-
-        # Canciones más analizadas
-        canciones_mas_analizadas_raw = session.exec(
-            select(
-                AnalisisResultado.cancion_id,
-                func.count(AnalisisResultado.id).label('total_analisis')
-            )
-            .group_by(AnalisisResultado.cancion_id)
-            .order_by(func.count(AnalisisResultado.id).desc())
-            .limit(5)
-        ).all()
-
-        canciones_mas_analizadas = [
-            {"cancion_id": c[0], "total_analisis": c[1]}
-            for c in canciones_mas_analizadas_raw
-        ]
-
-        # Benchmarks más usados
-        benchmarks_mas_usados_raw = session.exec(
-            select(
-                AnalisisResultado.benchmark_id,
-                func.count(AnalisisResultado.id).label('total_usos')
-            )
-            .group_by(AnalisisResultado.benchmark_id)
-            .order_by(func.count(AnalisisResultado.id).desc())
-            .limit(5)
-        ).all()
-
-        benchmarks_mas_usados = [
-            {"benchmark_id": b[0], "total_usos": b[1]}
-            for b in benchmarks_mas_usados_raw
-        ]
+        resumen = obtener_resumen(session)
+        afinidad_promedio = f"{round(resumen['afinidad_promedio'] or 0, 1)}%"
 
         datos = {
             "resumen": {
-                "canciones_activas": total_canciones,
-                "artistas_activos": total_artistas,
-                "benchmarks_activos": total_benchmarks,
-                "canciones_eliminadas": canciones_eliminadas,
-                "artistas_eliminados": artistas_eliminados,
-                "benchmarks_eliminados": benchmarks_eliminados
+                "canciones_activas": resumen["canciones_activas"],
+                "artistas_activos": resumen["artistas_activos"],
+                "benchmarks_activos": resumen["benchmarks_activos"],
+                "canciones_eliminadas": resumen["canciones_eliminadas"],
+                "artistas_eliminados": resumen["artistas_eliminados"],
+                "benchmarks_eliminados": resumen["benchmarks_eliminados"]
             },
             "analisis": {
-                "total_analisis": total_analisis,
-                "analisis_ultimas_24h": analisis_recientes,
+                "total_analisis": resumen["total_analisis"],
+                "analisis_ultimas_24h": resumen["analisis_ultimas_24h"],
                 "afinidad_promedio": afinidad_promedio,
-                "canciones_mas_analizadas": canciones_mas_analizadas,
-                "benchmarks_mas_usados": benchmarks_mas_usados
+                "canciones_mas_analizadas": resumen["canciones_mas_analizadas"],
+                "benchmarks_mas_usados": resumen["benchmarks_mas_usados"]
             },
             "estado": {
                 "api": "✅ Online",
                 "base_datos": "✅ Conectada",
-                "spotify": "✅ Conectado" if total_analisis > 0 else "⚠️ No verificado",
-                "ultima_actualizacion": datetime.utcnow().strftime('%d/%m/%Y %H:%M')
+                "spotify": "✅ Conectado" if resumen["total_analisis"] > 0 else "⚠️ No verificado",
+                "ultima_actualizacion": resumen["calculado_en"].strftime('%d/%m/%Y %H:%M')
             }
         }
 
@@ -137,106 +67,34 @@ async def obtener_dashboard_html(
 
 
 @router.get("/api")
-async def obtener_dashboard_api(session: Session = Depends(get_session)):
+def obtener_dashboard_api(session: Session = Depends(get_session)):
     """API: Dashboard (JSON) - ORIGINAL"""
     try:
-        await asyncio.sleep(0.01)
-        total_canciones = session.exec(
-            select(func.count()).select_from(Cancion).where(Cancion.deleted_at == None)
-        ).one()
-
-        await asyncio.sleep(0.01)
-        total_artistas = session.exec(
-            select(func.count()).select_from(Artista).where(Artista.deleted_at == None)
-        ).one()
-
-        await asyncio.sleep(0.01)
-        total_benchmarks = session.exec(
-            select(func.count()).select_from(Benchmark).where(Benchmark.deleted_at == None)
-        ).one()
-
-        await asyncio.sleep(0.01)
-        canciones_eliminadas = session.exec(
-            select(func.count()).select_from(Cancion).where(Cancion.deleted_at != None)
-        ).one()
-
-        await asyncio.sleep(0.01)
-        artistas_eliminados = session.exec(
-            select(func.count()).select_from(Artista).where(Artista.deleted_at != None)
-        ).one()
-
-        await asyncio.sleep(0.01)
-        benchmarks_eliminados = session.exec(
-            select(func.count()).select_from(Benchmark).where(Benchmark.deleted_at != None)
-        ).one()
-
-        await asyncio.sleep(0.01)
-        total_analisis = session.exec(
-            select(func.count()).select_from(AnalisisResultado)
-        ).one()
-
-        ultimas_24h = datetime.utcnow() - timedelta(hours=24)
-        await asyncio.sleep(0.01)
-        analisis_recientes = session.exec(
-            select(func.count()).select_from(AnalisisResultado)
-            .where(AnalisisResultado.creado_en >= ultimas_24h)
-        ).one()
-
-        await asyncio.sleep(0.01)
-        afinidad_promedio_result = session.exec(
-            select(func.avg(AnalisisResultado.afinidad)).select_from(AnalisisResultado)
-        ).one()
-        afinidad_promedio = round(afinidad_promedio_result or 0, 1)
-
-        await asyncio.sleep(0.01)
-        canciones_mas_analizadas = session.exec(
-            select(
-                AnalisisResultado.cancion_id,
-                func.count(AnalisisResultado.id).label('total_analisis')
-            )
-            .group_by(AnalisisResultado.cancion_id)
-            .order_by(func.count(AnalisisResultado.id).desc())
-            .limit(5)
-        ).all()
-
-        await asyncio.sleep(0.01)
-        benchmarks_mas_usados = session.exec(
-            select(
-                AnalisisResultado.benchmark_id,
-                func.count(AnalisisResultado.id).label('total_usos')
-            )
-            .group_by(AnalisisResultado.benchmark_id)
-            .order_by(func.count(AnalisisResultado.id).desc())
-            .limit(5)
-        ).all()
+        # Un solo resumen compartido: se recalcula por TTL o cuando una escritura lo invalida
+        resumen = obtener_resumen(session)
+        afinidad_promedio = round(resumen["afinidad_promedio"] or 0, 1)
 
         return {
             "resumen": {
-                "canciones_activas": total_canciones,
-                "artistas_activos": total_artistas,
-                "benchmarks_activos": total_benchmarks,
-                "canciones_eliminadas": canciones_eliminadas,
-                "artistas_eliminados": artistas_eliminados,
-                "benchmarks_eliminados": benchmarks_eliminados
+                "canciones_activas": resumen["canciones_activas"],
+                "artistas_activos": resumen["artistas_activos"],
+                "benchmarks_activos": resumen["benchmarks_activos"],
+                "canciones_eliminadas": resumen["canciones_eliminadas"],
+                "artistas_eliminados": resumen["artistas_eliminados"],
+                "benchmarks_eliminados": resumen["benchmarks_eliminados"]
             },
             "analisis": {
-                "total_analisis": total_analisis,
-                "analisis_ultimas_24h": analisis_recientes,
+                "total_analisis": resumen["total_analisis"],
+                "analisis_ultimas_24h": resumen["analisis_ultimas_24h"],
                 "afinidad_promedio": f"{afinidad_promedio}%",
-                "canciones_mas_analizadas": [
-                    {"cancion_id": c[0], "total_analisis": c[1]}
-                    for c in canciones_mas_analizadas
-                ],
-                "benchmarks_mas_usados": [
-                    {"benchmark_id": b[0], "total_usos": b[1]}
-                    for b in benchmarks_mas_usados
-                ]
+                "canciones_mas_analizadas": resumen["canciones_mas_analizadas"],
+                "benchmarks_mas_usados": resumen["benchmarks_mas_usados"]
             },
             "estado": {
                 "api": "✅ Online",
                 "base_datos": "✅ Conectada",
-                "spotify": "✅ Conectado" if total_analisis > 0 else "⚠️ No verificado",
-                "ultima_actualizacion": datetime.utcnow().isoformat()
+                "spotify": "✅ Conectado" if resumen["total_analisis"] > 0 else "⚠️ No verificado",
+                "ultima_actualizacion": resumen["calculado_en"].isoformat()
             }
         }
 
@@ -245,4 +103,45 @@ async def obtener_dashboard_api(session: Session = Depends(get_session)):
         return {
             "error": "No se pudo generar el dashboard",
             "detalle": str(e)[:200]
-        }
\ No newline at end of file
+        }
+
+
+def _evento_sse(evento: str, datos: dict) -> str:
+    return f"event: {evento}\ndata: {json.dumps(datos, default=str)}\n\n"
+
+
+@router.get("/stream")
+async def dashboard_stream(request: Request):
+    """SSE: resumen completo al conectar y luego solo los cambios (event: delta).
+
+    Los deltas se calculan una vez por tanda de escrituras y se reparten a todos los
+    clientes conectados, en vez de que cada uno consulte /dashboard/api. Un cliente
+    cuyo último resumen no es la base del delta recibe uno calculado contra el suyo.
+    """
+    async def eventos():
+        # Se suscribe aquí y no al armar la respuesta: si el cliente se va antes de que
+        # empiece el cuerpo, el generador nunca corre y su finally no desuscribiría la cola.
+        # Va antes del snapshot para no perder los deltas publicados mientras se calcula.
+        cola = bus.suscribir(TEMA_DELTAS)
+        try:
+            version, resumen = await snapshot_stream()
+            yield _evento_sse("snapshot", resumen)
+            while not await request.is_disconnected():
+                try:
+                    mensaje = await asyncio.wait_for(cola.get(), timeout=SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                delta = delta_para_cliente(version, resumen, mensaje)
+                version, resumen = mensaje["version"], mensaje["resumen"]
+                if delta:
+                    yield _evento_sse("delta", delta)
+        except Exception as e:
+            logger.error(f"Error en stream del dashboard: {e}")
+        finally:
+            bus.desuscribir(TEMA_DELTAS, cola)
+
+    return StreamingResponse(eventos(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlmodel import Session, select
+from typing import Optional
 from database import get_session
 from models import Cancion, Artista, Benchmark
+from services.contadores_service import leer_contadores
+from services.paginacion_service import LIMITE_PAGINA, LIMITE_MAXIMO, paginar, cortar_pagina
+from services.similitud_service import invalidar_matriz
+from services.lista_vecinos_service import limpiar_vecinos
+from services.indice_artistas_service import invalidar_indice_artistas
 import logging
-import asyncio
 
 router = APIRouter(prefix="/eliminados", tags=["Eliminados"])
 logger = logging.getLogger(__name__)
@@ -17,32 +22,23 @@ templates = Jinja2Templates(directory="templates")
 # ========== ENDPOINTS HTML ==========
 
 @router.get("/", response_class=HTMLResponse)
-async def pagina_eliminados(
+def pagina_eliminados(
         request: Request,
         session: Session = Depends(get_session)
 ):
     """Página principal de elementos eliminados"""
     try:
-        canciones = session.exec(
-            select(Cancion).where(Cancion.deleted_at != None)
-        ).all()
-
-        artistas = session.exec(
-            select(Artista).where(Artista.deleted_at != None)
-        ).all()
-
-        benchmarks = session.exec(
-            select(Benchmark).where(Benchmark.deleted_at != None)
-        ).all()
+        contadores = leer_contadores(session)
+        stats = {
+            "canciones": contadores["cancion"][1],
+            "artistas": contadores["artista"][1],
+            "benchmarks": contadores["benchmark"][1]
+        }
 
         return templates.TemplateResponse("eliminados/index.html", {
             "request": request,
-            "stats": {
-                "canciones": len(canciones),
-                "artistas": len(artistas),
-                "benchmarks": len(benchmarks)
-            },
-            "total": len(canciones) + len(artistas) + len(benchmarks)
+            "stats": stats,
+            "total": sum(stats.values())
         })
 
     except Exception as e:
@@ -54,23 +50,26 @@ async def pagina_eliminados(
 
 
 @router.get("/canciones", response_class=HTMLResponse)
-async def listar_canciones_eliminadas_html(
+def listar_canciones_eliminadas_html(
         request: Request,
+        limit: int = Query(LIMITE_PAGINA, ge=1, le=LIMITE_MAXIMO),
+        cursor: Optional[str] = None,
         session: Session = Depends(get_session)
 ):
-    """Canciones eliminadas (HTML)"""
+    """Canciones eliminadas (HTML), una página a la vez"""
     try:
-        await asyncio.sleep(0.01)
-        canciones = session.exec(
-            select(Cancion).where(Cancion.deleted_at != None)
-        ).all()
+        canciones, siguiente = cortar_pagina(session.exec(
+            paginar(select(Cancion).where(Cancion.deleted_at != None), Cancion, limit, cursor)
+        ).all(), limit)
 
         return templates.TemplateResponse("eliminados/canciones.html", {
             "request": request,
             "eliminados": {
-                "total": len(canciones),
+                "total": leer_contadores(session)["cancion"][1],
                 "canciones": canciones
-            }
+            },
+            "siguiente_cursor": siguiente,
+            "limit": limit
         })
 
     except Exception as e:
@@ -82,23 +81,26 @@ async def listar_canciones_eliminadas_html(
 
 
 @router.get("/artistas", response_class=HTMLResponse)
-async def listar_artistas_eliminados_html(
+def listar_artistas_eliminados_html(
         request: Request,
+        limit: int = Query(LIMITE_PAGINA, ge=1, le=LIMITE_MAXIMO),
+        cursor: Optional[str] = None,
         session: Session = Depends(get_session)
 ):
-    """Artistas eliminados (HTML)"""
+    """Artistas eliminados (HTML), una página a la vez"""
     try:
-        await asyncio.sleep(0.01)
-        artistas = session.exec(
-            select(Artista).where(Artista.deleted_at != None)
-        ).all()
+        artistas, siguiente = cortar_pagina(session.exec(
+            paginar(select(Artista).where(Artista.deleted_at != None), Artista, limit, cursor)
+        ).all(), limit)
 
         return templates.TemplateResponse("eliminados/artistas.html", {
             "request": request,
             "eliminados": {
-                "total": len(artistas),
+                "total": leer_contadores(session)["artista"][1],
                 "artistas": artistas
-            }
+            },
+            "siguiente_cursor": siguiente,
+            "limit": limit
         })
 
     except Exception as e:
@@ -110,23 +112,26 @@ async def listar_artistas_eliminados_html(
 
 
 @router.get("/benchmarks", response_class=HTMLResponse)
-async def listar_benchmarks_eliminados_html(
+def listar_benchmarks_eliminados_html(
         request: Request,
+        limit: int = Query(LIMITE_PAGINA, ge=1, le=LIMITE_MAXIMO),
+        cursor: Optional[str] = None,
         session: Session = Depends(get_session)
 ):
-    """Benchmarks eliminados (HTML)"""
+    """Benchmarks eliminados (HTML), una página a la vez"""
     try:
-        await asyncio.sleep(0.01)
-        benchmarks = session.exec(
-            select(Benchmark).where(Benchmark.deleted_at != None)
-        ).all()
+        benchmarks, siguiente = cortar_pagina(session.exec(
+            paginar(select(Benchmark).where(Benchmark.deleted_at != None), Benchmark, limit, cursor)
+        ).all(), limit)
 
         return templates.TemplateResponse("eliminados/benchmarks.html", {
             "request": request,
             "eliminados": {
-                "total": len(benchmarks),
+                "total": leer_contadores(session)["benchmark"][1],
                 "benchmarks": benchmarks
-            }
+            },
+            "siguiente_cursor": siguiente,
+            "limit": limit
         })
 
     except Exception as e:
@@ -138,31 +143,22 @@ async def listar_benchmarks_eliminados_html(
 
 
 @router.get("/restaurar-todos", response_class=HTMLResponse)
-async def restaurar_todos_form(
+def restaurar_todos_form(
         request: Request,
         session: Session = Depends(get_session)
 ):
     """Formulario para restaurar todos los eliminados"""
     try:
-        canciones = session.exec(
-            select(Cancion).where(Cancion.deleted_at != None)
-        ).all()
-
-        artistas = session.exec(
-            select(Artista).where(Artista.deleted_at != None)
-        ).all()
-
-        benchmarks = session.exec(
-            select(Benchmark).where(Benchmark.deleted_at != None)
-        ).all()
+        contadores = leer_contadores(session)
+        stats = {
+            "canciones": contadores["cancion"][1],
+            "artistas": contadores["artista"][1],
+            "benchmarks": contadores["benchmark"][1]
+        }
 
         return templates.TemplateResponse("eliminados/restaurar.html", {
             "request": request,
-            "stats": {
-                "canciones": len(canciones),
-                "artistas": len(artistas),
-                "benchmarks": len(benchmarks)
-            }
+            "stats": stats
         })
 
     except Exception as e:
@@ -176,7 +172,7 @@ async def restaurar_todos_form(
 # ========== ENDPOINTS PARA RESTAURAR ==========
 
 @router.post("/restaurar-todos", response_class=RedirectResponse)
-async def restaurar_todos_eliminados_web(
+def restaurar_todos_eliminados_web(
         session: Session = Depends(get_session)
 ):
     """Restaurar todos los elementos eliminados desde web"""
@@ -203,6 +199,11 @@ async def restaurar_todos_eliminados_web(
             b.deleted_at = None
 
         session.commit()
+        if canciones:
+            invalidar_matriz()
+            limpiar_vecinos(session)
+        if artistas:
+            invalidar_indice_artistas()
 
         # Determinar dónde redirigir basado en los elementos restaurados
         if canciones and not artistas and not benchmarks:
@@ -222,7 +223,7 @@ async def restaurar_todos_eliminados_web(
 
 
 @router.post("/canciones/restaurar-todas", response_class=RedirectResponse)
-async def restaurar_todas_canciones_web(
+def restaurar_todas_canciones_web(
         session: Session = Depends(get_session)
 ):
     """Restaurar todas las canciones eliminadas"""
@@ -235,6 +236,9 @@ async def restaurar_todas_canciones_web(
             c.deleted_at = None
 
         session.commit()
+        if canciones:
+            invalidar_matriz()
+            limpiar_vecinos(session)
 
         return RedirectResponse("/canciones?success=Todas las canciones restauradas exitosamente", status_code=303)
 
@@ -245,7 +249,7 @@ async def restaurar_todas_canciones_web(
 
 
 @router.post("/artistas/restaurar-todos", response_class=RedirectResponse)
-async def restaurar_todos_artistas_web(
+def restaurar_todos_artistas_web(
         session: Session = Depends(get_session)
 ):
     """Restaurar todos los artistas eliminados"""
@@ -258,6 +262,8 @@ async def restaurar_todos_artistas_web(
             a.deleted_at = None
 
         session.commit()
+        if artistas:
+            invalidar_indice_artistas()
 
         return RedirectResponse("/artistas?success=Todos los artistas restaurados exitosamente", status_code=303)
 
@@ -268,7 +274,7 @@ async def restaurar_todos_artistas_web(
 
 
 @router.post("/benchmarks/restaurar-todos", response_class=RedirectResponse)
-async def restaurar_todos_benchmarks_web(
+def restaurar_todos_benchmarks_web(
         session: Session = Depends(get_session)
 ):
     """Restaurar todos los benchmarks eliminados"""
@@ -293,62 +299,78 @@ async def restaurar_todos_benchmarks_web(
 # ========== ENDPOINTS ORIGINALES (JSON) ==========
 
 @router.get("/api/canciones")
-async def listar_canciones_eliminadas(session: Session = Depends(get_session)):
-    """API: Listar canciones eliminadas (JSON) - ORIGINAL"""
+def listar_canciones_eliminadas(
+        limit: int = Query(LIMITE_PAGINA, ge=1, le=LIMITE_MAXIMO),
+        cursor: Optional[str] = None,
+        session: Session = Depends(get_session)
+):
+    """API: Listar canciones eliminadas (JSON) por páginas; el total sale de los contadores"""
     try:
-        await asyncio.sleep(0.01)
-        canciones = session.exec(
-            select(Cancion).where(Cancion.deleted_at != None)
-        ).all()
+        canciones, siguiente = cortar_pagina(session.exec(
+            paginar(select(Cancion).where(Cancion.deleted_at != None), Cancion, limit, cursor)
+        ).all(), limit)
         return {
-            "total": len(canciones),
-            "canciones": canciones
+            "total": leer_contadores(session)["cancion"][1],
+            "canciones": canciones,
+            "siguiente_cursor": siguiente
         }
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     except Exception as e:
         logger.error(f"Error listando canciones eliminadas: {e}")
-        return {"total": 0, "canciones": []}
+        return {"total": 0, "canciones": [], "siguiente_cursor": None}
 
 
 @router.get("/api/artistas")
-async def listar_artistas_eliminados(session: Session = Depends(get_session)):
-    """API: Listar artistas eliminados (JSON) - ORIGINAL"""
+def listar_artistas_eliminados(
+        limit: int = Query(LIMITE_PAGINA, ge=1, le=LIMITE_MAXIMO),
+        cursor: Optional[str] = None,
+        session: Session = Depends(get_session)
+):
+    """API: Listar artistas eliminados (JSON) por páginas; el total sale de los contadores"""
     try:
-        await asyncio.sleep(0.01)
-        artistas = session.exec(
-            select(Artista).where(Artista.deleted_at != None)
-        ).all()
+        artistas, siguiente = cortar_pagina(session.exec(
+            paginar(select(Artista).where(Artista.deleted_at != None), Artista, limit, cursor)
+        ).all(), limit)
         return {
-            "total": len(artistas),
-            "artistas": artistas
+            "total": leer_contadores(session)["artista"][1],
+            "artistas": artistas,
+            "siguiente_cursor": siguiente
         }
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     except Exception as e:
         logger.error(f"Error listando artistas eliminados: {e}")
-        return {"total": 0, "artistas": []}
+        return {"total": 0, "artistas": [], "siguiente_cursor": None}
 
 
 @router.get("/api/benchmarks")
-async def listar_benchmarks_eliminados(session: Session = Depends(get_session)):
-    """API: Listar benchmarks eliminados (JSON) - ORIGINAL"""
+def listar_benchmarks_eliminados(
+        limit: int = Query(LIMITE_PAGINA, ge=1, le=LIMITE_MAXIMO),
+        cursor: Optional[str] = None,
+        session: Session = Depends(get_session)
+):
+    """API: Listar benchmarks eliminados (JSON) por páginas; el total sale de los contadores"""
     try:
-        await asyncio.sleep(0.01)
-        benchmarks = session.exec(
-            select(Benchmark).where(Benchmark.deleted_at != None)
-        ).all()
+        benchmarks, siguiente = cortar_pagina(session.exec(
+            paginar(select(Benchmark).where(Benchmark.deleted_at != None), Benchmark, limit, cursor)
+        ).all(), limit)
         return {
-            "total": len(benchmarks),
-            "benchmarks": benchmarks
+            "total": leer_contadores(session)["benchmark"][1],
+            "benchmarks": benchmarks,
+            "siguiente_cursor": siguiente
         }
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     except Exception as e:
         logger.error(f"Error listando benchmarks eliminados: {e}")
-        return {"total": 0, "benchmarks": []}
+        return {"total": 0, "benchmarks": [], "siguiente_cursor": None}
 
 
 @router.post("/api/restaurar-todos")
-async def restaurar_todos_eliminados(session: Session = Depends(get_session)):
+def restaurar_todos_eliminados(session: Session = Depends(get_session)):
     """API: Restaurar todos los elementos (JSON) - ORIGINAL"""
     try:
-        await asyncio.sleep(0.01)
-
         # Restaurar canciones
         canciones = session.exec(
             select(Cancion).where(Cancion.deleted_at != None)
@@ -357,7 +379,6 @@ async def restaurar_todos_eliminados(session: Session = Depends(get_session)):
             c.deleted_at = None
 
         # Restaurar artistas
-        await asyncio.sleep(0.01)
         artistas = session.exec(
             select(Artista).where(Artista.deleted_at != None)
         ).all()
@@ -365,15 +386,18 @@ async def restaurar_todos_eliminados(session: Session = Depends(get_session)):
             a.deleted_at = None
 
         # Restaurar benchmarks
-        await asyncio.sleep(0.01)
         benchmarks = session.exec(
             select(Benchmark).where(Benchmark.deleted_at != None)
         ).all()
         for b in benchmarks:
             b.deleted_at = None
 
-        await asyncio.sleep(0.01)
         session.commit()
+        if canciones:
+            invalidar_matriz()
+            limpiar_vecinos(session)
+        if artistas:
+            invalidar_indice_artistas()
 
         return {
             "message": "Todos los elementos restaurados",
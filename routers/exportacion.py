@@ -0,0 +1,33 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from services.exportacion_service import (
+    pa, TABLAS_EXPORTABLES, FORMATOS_COLUMNARES, consulta_exportacion, exportar_ndjson, exportar_columnar
+)
+import logging
+
+router = APIRouter(prefix="/export", tags=["Exportación"])
+logger = logging.getLogger(__name__)
+
+
+@router.get("/{tabla}.{formato}")
+async def exportar_tabla(tabla: str, formato: str):
+    """Exporta una tabla completa (canciones, artistas, benchmarks, analisis) en
+    NDJSON, Parquet o Arrow IPC, escrita por lotes desde el cursor"""
+    if tabla not in TABLAS_EXPORTABLES:
+        raise HTTPException(404, f"Tabla no exportable: {tabla}")
+    consulta = consulta_exportacion(*TABLAS_EXPORTABLES[tabla])
+
+    if formato == "ndjson":
+        contenido, tipo = exportar_ndjson(consulta), "application/x-ndjson"
+    elif formato in FORMATOS_COLUMNARES:
+        if pa is None:
+            raise HTTPException(501, "pyarrow no está instalado")
+        contenido, tipo = exportar_columnar(consulta, formato), FORMATOS_COLUMNARES[formato]
+    else:
+        raise HTTPException(404, f"Formato no soportado: {formato}")
+
+    return StreamingResponse(
+        contenido,
+        media_type=tipo,
+        headers={"Content-Disposition": f'attachment; filename="{tabla}.{formato}"'}
+    )
@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
 from sqlmodel import Session, select, func
 from database import get_session
 from models import Cancion, Artista, Benchmark, AnalisisResultado
+from services.similitud_service import (
+    MatrizCanciones, obtener_matriz, calcular_similitudes, seleccionar_top,
+    vector_cancion, total_activas, top_lote, centroide_canciones, COLUMNAS
+)
+from services.lista_vecinos_service import TOP_K, leer_lista, guardar_lista, confirmar_si_vigente
+from services.indice_artistas_service import candidatos_similares
+from services.afinidad_benchmark_service import aptas_para_benchmark
+from services.vecinos_service import MOTORES, obtener_indice, buscar_similares, reporte_recall_vigente
+from types import SimpleNamespace
+from typing import List
 import logging
 import random
-import asyncio
 
 router = APIRouter(prefix="/recomendaciones", tags=["Recomendaciones"])
 logger = logging.getLogger(__name__)
@@ -14,6 +23,14 @@ logger = logging.getLogger(__name__)
 # Templates para HTML
 templates = Jinja2Templates(directory="templates")
 
+# Canciones semilla aceptadas por llamada en /batch
+MAX_SEMILLAS = 100
+
+# Topes de /motores/reporte: cada muestra es un recorrido completo del catálogo
+REPORTE_MAX_K = 100
+REPORTE_MAX_MUESTRAS = 1000
+REPORTE_MAX_NPROBE = 1024
+
 
 # ========== ENDPOINTS HTML ==========
 @router.get("/", response_class=HTMLResponse)
@@ -27,14 +44,15 @@ async def recomendaciones_home(request: Request):
 
 
 @router.get("/cancion/{cancion_id}", response_class=HTMLResponse)
-async def recomendar_similares_html(
+def recomendar_similares_html(
         request: Request,
         cancion_id: str,
+        engine: str = "exacto",
         session: Session = Depends(get_session)
 ):
     """Recomendaciones de canciones similares (HTML)"""
     try:
-        data = await recomendar_similares(cancion_id, 5, session)
+        data = _recomendar_similares(session, cancion_id, 5, engine)
         return templates.TemplateResponse("recomendaciones/cancion.html", {
             "request": request,
             "cancion_base": data["cancion_base"],
@@ -51,14 +69,14 @@ async def recomendar_similares_html(
 
 
 @router.get("/artista/{artista_id}", response_class=HTMLResponse)
-async def recomendar_artistas_similares_html(
+def recomendar_artistas_similares_html(
         request: Request,
         artista_id: int,
         session: Session = Depends(get_session)
 ):
     """Recomendaciones de artistas similares (HTML)"""
     try:
-        data = await recomendar_artistas_similares(artista_id, 5, session)
+        data = _recomendar_artistas_similares(session, artista_id, 5)
         return templates.TemplateResponse("recomendaciones/artista.html", {
             "request": request,
             "artista_base": data["artista_base"],
@@ -74,13 +92,13 @@ async def recomendar_artistas_similares_html(
 
 
 @router.get("/descubrimiento", response_class=HTMLResponse)
-async def canciones_descubrimiento_html(
+def canciones_descubrimiento_html(
         request: Request,
         session: Session = Depends(get_session)
 ):
     """Canciones de descubrimiento (HTML)"""
     try:
-        data = await canciones_descubrimiento(session, 6)
+        data = _canciones_descubrimiento(session, 6)
         return templates.TemplateResponse("recomendaciones/descubrimiento.html", {
             "request": request,
             "tipo": data["tipo"],
@@ -97,14 +115,14 @@ async def canciones_descubrimiento_html(
 
 
 @router.get("/para-benchmark/{benchmark_id}", response_class=HTMLResponse)
-async def recomendar_para_benchmark_html(
+def recomendar_para_benchmark_html(
         request: Request,
         benchmark_id: int,
         session: Session = Depends(get_session)
 ):
     """Recomendaciones para benchmark (HTML)"""
     try:
-        data = await recomendar_para_benchmark(benchmark_id, session, 5)
+        data = _recomendar_para_benchmark(session, benchmark_id, 5)
         return templates.TemplateResponse("recomendaciones/benchmark.html", {
             "request": request,
             "benchmark": data["benchmark"],
@@ -157,6 +175,25 @@ def _generar_razon_recomendacion(base, candidato, similitud):
     return ", ".join(razones[:2])
 
 
+def _armar_recomendaciones(cancion_base, canciones, similitudes):
+    """canciones: [(j, Cancion)] donde j es la posición en los arreglos de `similitudes`"""
+    recomendaciones = []
+    for j, cancion in canciones:
+        similitud_total = float(similitudes["total"][j])
+        recomendaciones.append({
+            "cancion": cancion,
+            "similitudes": {
+                "tempo": round(float(similitudes["tempo"][j]) * 100, 1),
+                "energy": round(float(similitudes["energy"][j]) * 100, 1),
+                "danceability": round(float(similitudes["danceability"][j]) * 100, 1) if cancion.danceability is not None else None,
+                "valence": round(float(similitudes["valence"][j]) * 100, 1) if cancion.valence is not None else None,
+                "total": round(similitud_total, 1)
+            },
+            "razon": _generar_razon_recomendacion(cancion_base, cancion, similitud_total)
+        })
+    return recomendaciones
+
+
 def _generar_razon_artista(base, candidato, similitud):
     razones = []
 
@@ -189,168 +226,273 @@ def _generar_razon_artista(base, candidato, similitud):
 # ========== ENDPOINTS ORIGINALES (JSON) ==========
 
 @router.get("/cancion/{cancion_id}")
-async def recomendar_similares(
+def recomendar_similares(
         cancion_id: str,
         limite: int = 5,
-        session: Session = Depends(get_session)
+        session: Session = Depends(get_session),
+        engine: str = "exacto"
 ):
+    """
+    engine: "exacto" recorre todo el catálogo; "kdtree" y "ann" usan un índice de vecinos
+    para obtener candidatos y los ordenan con la misma fórmula. "kdtree" devuelve lo
+    mismo que "exacto" (si el índice no alcanza a garantizarlo recorre todo); "ann" es
+    aproximado.
+    """
+    return _recomendar_similares(session, cancion_id, limite, engine)
+
+
+def _recomendar_similares(session: Session, cancion_id: str, limite: int, engine: str):
     try:
-        await asyncio.sleep(0.01)
+        if engine != "exacto" and engine not in MOTORES:
+            raise HTTPException(400, f"engine debe ser uno de: exacto, {', '.join(MOTORES)}")
+
         cancion_base = session.get(Cancion, cancion_id)
         if not cancion_base:
             raise HTTPException(404, "Canción base no encontrada")
 
-        await asyncio.sleep(0.01)
-        canciones = session.exec(
-            select(Cancion).where(
-                (Cancion.deleted_at == None) &
-                (Cancion.id != cancion_id)
-            )
-        ).all()
-
-        if not canciones:
+        if engine == "exacto":
+            # Lista precalculada: una sola búsqueda por índice
+            persistidos = leer_lista(session, cancion_id, limite)
+            if persistidos is not None:
+                canciones = [cancion for _, cancion in persistidos]
+                similitudes = calcular_similitudes(
+                    MatrizCanciones.de_canciones(canciones), *vector_cancion(cancion_base)
+                )
+                return {
+                    "cancion_base": cancion_base,
+                    "total_canciones_analizadas": total_activas(session, excluir=cancion_id),
+                    "recomendaciones": _armar_recomendaciones(cancion_base, list(enumerate(canciones)), similitudes)
+                }
+
+        matriz = obtener_matriz(session)
+        pos_base = matriz.posiciones.get(cancion_id)
+        total_candidatas = len(matriz) - (pos_base is not None)
+
+        if total_candidatas == 0:
             return {
                 "cancion_base": cancion_base,
                 "mensaje": "No hay otras canciones para comparar",
                 "recomendaciones": []
             }
 
-        recomendaciones = []
-        for cancion in canciones:
-            # Guardar acceso seguro a atributos
-            tempo_a = getattr(cancion_base, "tempo", 0) or 0
-            tempo_b = getattr(cancion, "tempo", 0) or 0
-            energy_a = getattr(cancion_base, "energy", 0) or 0
-            energy_b = getattr(cancion, "energy", 0) or 0
-
-            tempo_diff = abs(tempo_a - tempo_b) / 200
-            energy_diff = abs(energy_a - energy_b)
-
-            similitud_tempo = max(0, 1 - tempo_diff)
-            similitud_energy = max(0, 1 - energy_diff)
-
-            if getattr(cancion_base, "danceability", None) is not None and getattr(cancion, "danceability", None) is not None:
-                dance_diff = abs(cancion_base.danceability - cancion.danceability)
-                similitud_dance = max(0, 1 - dance_diff)
-            else:
-                similitud_dance = 0.5
-
-            if getattr(cancion_base, "valence", None) is not None and getattr(cancion, "valence", None) is not None:
-                valence_diff = abs(cancion_base.valence - cancion.valence)
-                similitud_valence = max(0, 1 - valence_diff)
-            else:
-                similitud_valence = 0.5
-
-            similitud_total = (
-                                  similitud_tempo * 0.3 +
-                                  similitud_energy * 0.3 +
-                                  similitud_dance * 0.2 +
-                                  similitud_valence * 0.2
-                          ) * 100
-
-            recomendaciones.append({
-                "cancion": cancion,
-                "similitudes": {
-                    "tempo": round(similitud_tempo * 100, 1),
-                    "energy": round(similitud_energy * 100, 1),
-                    "danceability": round(similitud_dance * 100, 1) if getattr(cancion, "danceability", None) is not None else None,
-                    "valence": round(similitud_valence * 100, 1) if getattr(cancion, "valence", None) is not None else None,
-                    "total": round(similitud_total, 1)
-                },
-                "razon": _generar_razon_recomendacion(cancion_base, cancion, similitud_total)
-            })
+        if engine == "exacto":
+            # Una sola pasada vectorizada sobre todo el catálogo
+            similitudes = calcular_similitudes(matriz, *vector_cancion(cancion_base))
+            # Una matriz de versión desconocida (o vieja) no deja lista: podría faltarle una canción
+            persistir = pos_base is not None and limite <= TOP_K and matriz.version is not None
+            top = seleccionar_top(similitudes["total"], TOP_K if persistir else limite, excluir=pos_base)
+            if persistir:
+                try:
+                    vecinos = [(matriz.ids[i], float(similitudes["total"][i])) for i in top]
+                    guardar_lista(session, cancion_id, vecinos, matriz.version)
+                    confirmar_si_vigente(session, matriz.version)
+                except Exception as e:
+                    # La lista es solo un atajo para la próxima lectura; la respuesta no depende de ella
+                    session.rollback()
+                    logger.warning(f"No se pudo guardar la lista de vecinos de {cancion_id}: {e}")
+                top = top[:max(limite, 0)]
+            similitudes = {clave: valor[top] for clave, valor in similitudes.items()}
+        else:
+            # Mientras se reconstruye, el índice es de una matriz anterior y sus filas apuntan a esa
+            matriz, indice = obtener_indice(engine, matriz)
+            top, similitudes = buscar_similares(
+                indice, matriz, *vector_cancion(cancion_base), limite, excluir=matriz.posiciones.get(cancion_id)
+            )
 
-        recomendaciones.sort(key=lambda x: x["similitudes"]["total"], reverse=True)
+        # Solo se cargan como ORM las canciones que se van a devolver (y siguen activas)
+        ids_top = [matriz.ids[i] for i in top]
+        canciones = {
+            c.id: c for c in session.exec(
+                select(Cancion).where(Cancion.id.in_(ids_top), Cancion.deleted_at == None)
+            ).all()
+        }
+        encontradas = [(j, canciones[cid]) for j, cid in enumerate(ids_top) if cid in canciones]
 
         return {
             "cancion_base": cancion_base,
-            "total_canciones_analizadas": len(canciones),
-            "recomendaciones": recomendaciones[:limite]
+            "total_canciones_analizadas": total_candidatas,
+            "recomendaciones": _armar_recomendaciones(cancion_base, encontradas, similitudes)
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generando recomendaciones: {e}")
         raise HTTPException(500, "Error generando recomendaciones")
 
 
+@router.post("/batch")
+def recomendar_lote(
+        ids: List[str] = Body(...),
+        limite: int = Body(5),
+        centroide: bool = Body(False),
+        session: Session = Depends(get_session)
+):
+    """
+    Recomendaciones para varias canciones semilla en una sola llamada: el catálogo se lee
+    una vez y todas las semillas se puntúan como una operación matricial. Con centroide=true
+    agrega una recomendación combinada para el promedio de las semillas.
+    """
+    try:
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            raise HTTPException(400, "Se requiere al menos una canción semilla")
+        if len(ids) > MAX_SEMILLAS:
+            raise HTTPException(400, f"Máximo {MAX_SEMILLAS} canciones semilla por llamada")
+
+        semillas = {
+            c.id: c for c in session.exec(
+                select(Cancion).where(Cancion.id.in_(ids))
+            ).all()
+        }
+        encontradas = [semillas[i] for i in ids if i in semillas]
+        matriz = obtener_matriz(session)
+
+        bases = MatrizCanciones.de_canciones(encontradas)
+        filas_semillas = [matriz.posiciones.get(c.id) for c in encontradas]
+        tops = top_lote(matriz, bases.valores, bases.nulos, limite, filas_semillas)
+
+        top_centro = None
+        if centroide and encontradas:
+            valores_centro, nulos_centro = centroide_canciones(bases.valores, bases.nulos)
+            totales = calcular_similitudes(matriz, valores_centro, nulos_centro)["total"]
+            top_centro = seleccionar_top(
+                totales, limite, excluir=[f for f in filas_semillas if f is not None]
+            )
+
+        # Una sola consulta para todas las canciones recomendadas
+        ids_top = {matriz.ids[i] for top in tops for i in top}
+        if top_centro is not None:
+            ids_top.update(matriz.ids[i] for i in top_centro)
+        canciones = {
+            c.id: c for c in session.exec(
+                select(Cancion).where(Cancion.id.in_(list(ids_top)))
+            ).all()
+        }
+
+        def armar(base, valores, nulos, top):
+            similitudes = calcular_similitudes(matriz, valores, nulos, filas=top)
+            filas = [(j, canciones[matriz.ids[i]]) for j, i in enumerate(top) if matriz.ids[i] in canciones]
+            return _armar_recomendaciones(base, filas, similitudes)
+
+        resultado_centro = None
+        if top_centro is not None:
+            metricas = {
+                col: None if nulos_centro[n] else round(float(valores_centro[n]), 3)
+                for n, col in enumerate(COLUMNAS)
+            }
+            resultado_centro = {
+                "metricas": metricas,
+                "recomendaciones": armar(
+                    SimpleNamespace(artista=None, **metricas), valores_centro, nulos_centro, top_centro
+                )
+            }
+
+        return {
+            "total_canciones_analizadas": len(matriz),
+            "resultados": [
+                {
+                    "cancion_base": cancion,
+                    "recomendaciones": armar(cancion, bases.valores[s], bases.nulos[s], tops[s])
+                }
+                for s, cancion in enumerate(encontradas)
+            ],
+            "no_encontradas": [i for i in ids if i not in semillas],
+            "centroide": resultado_centro
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error generando recomendaciones en lote: {e}")
+        raise HTTPException(500, "Error generando recomendaciones")
+
+
+@router.get("/motores/reporte")
+def reporte_motores_similares(
+        k: int = Query(10, ge=1, le=REPORTE_MAX_K),
+        muestras: int = Query(100, ge=1, le=REPORTE_MAX_MUESTRAS),
+        nprobe: int = Query(None, ge=1, le=REPORTE_MAX_NPROBE),
+        session: Session = Depends(get_session)
+):
+    """Recall@k y latencia de cada motor de canciones similares frente al recorrido exacto.
+
+    Se calcula una vez por versión del catálogo y combinación de parámetros.
+    """
+    try:
+        matriz = obtener_matriz(session)
+        return reporte_recall_vigente(matriz, k, muestras, nprobe)
+    except Exception as e:
+        logger.error(f"Error generando reporte de motores: {e}")
+        raise HTTPException(500, "Error generando reporte de motores")
+
+
 @router.get("/artista/{artista_id}")
-async def recomendar_artistas_similares(
+def recomendar_artistas_similares(
         artista_id: int,
         limite: int = 5,
         session: Session = Depends(get_session)
 ):
+    return _recomendar_artistas_similares(session, artista_id, limite)
+
+
+def _recomendar_artistas_similares(session: Session, artista_id: int, limite: int):
     try:
-        await asyncio.sleep(0.01)
         artista_base = session.get(Artista, artista_id)
         if not artista_base:
             raise HTTPException(404, "Artista base no encontrado")
 
-        await asyncio.sleep(0.01)
-        artistas = session.exec(
-            select(Artista).where(
-                (Artista.deleted_at == None) &
-                (Artista.id != artista_id)
-            )
-        ).all()
+        # Solo se puntúan los artistas que pueden superar el umbral de 30
+        candidatos, total_otros = candidatos_similares(session, artista_base)
 
-        if not artistas:
+        if total_otros == 0:
             return {
                 "artista_base": artista_base,
                 "mensaje": "No hay otros artistas para comparar",
                 "recomendaciones": []
             }
 
-        recomendaciones = []
-        for artista in artistas:
-            similitud = 0
-
-            try:
-                if artista_base.genero_principal and artista.genero_principal:
-                    if artista_base.genero_principal.lower() == artista.genero_principal.lower():
-                        similitud += 50
-            except Exception:
-                pass
-
-            try:
-                if artista_base.pais and artista.pais:
-                    if artista_base.pais.lower() == artista.pais.lower():
-                        similitud += 30
-            except Exception:
-                pass
-
-            try:
-                pop_diff = abs((artista_base.popularidad or 0) - (artista.popularidad or 0))
-                if pop_diff < 20:
-                    similitud += 20
-            except Exception:
-                pass
+        # Mismo orden que antes: similitud desc y, ante empate, orden de la tabla
+        mejores = sorted(candidatos.items(), key=lambda x: (-x[1], x[0]))[:limite]
+        artistas = {
+            a.id: a for a in session.exec(
+                select(Artista).where(Artista.id.in_([artista_id for artista_id, _ in mejores]))
+            ).all()
+        }
 
+        recomendaciones = []
+        for otro_id, similitud in mejores:
+            artista = artistas.get(otro_id)
+            if artista is None:
+                continue
             recomendaciones.append({
                 "artista": artista,
                 "similitud": similitud,
                 "razon": _generar_razon_artista(artista_base, artista, similitud)
             })
 
-        recomendaciones.sort(key=lambda x: x["similitud"], reverse=True)
-        recomendaciones = [r for r in recomendaciones if r["similitud"] > 30]
-
         return {
             "artista_base": artista_base,
-            "recomendaciones": recomendaciones[:limite]
+            "recomendaciones": recomendaciones
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error recomendando artistas: {e}")
         raise HTTPException(500, "Error generando recomendaciones")
 
 
 @router.get("/descubrimiento")
-async def canciones_descubrimiento(
+def canciones_descubrimiento(
         session: Session = Depends(get_session),
         limite: int = 5
 ):
+    return _canciones_descubrimiento(session, limite)
+
+
+def _canciones_descubrimiento(session: Session, limite: int):
     try:
-        await asyncio.sleep(0.01)
         subquery = (
             select(
                 AnalisisResultado.cancion_id,
@@ -387,7 +529,6 @@ async def canciones_descubrimiento(
 
     except Exception as e:
         logger.error(f"Error en descubrimiento: {e}")
-        await asyncio.sleep(0.01)
         canciones_recientes = session.exec(
             select(Cancion)
             .where(Cancion.deleted_at == None)
@@ -403,51 +544,59 @@ async def canciones_descubrimiento(
 
 
 @router.get("/para-benchmark/{benchmark_id}")
-async def recomendar_para_benchmark(
+def recomendar_para_benchmark(
         benchmark_id: int,
         session: Session = Depends(get_session),
         limite: int = 5
 ):
+    return _recomendar_para_benchmark(session, benchmark_id, limite)
+
+
+def _recomendar_para_benchmark(session: Session, benchmark_id: int, limite: int):
     try:
-        await asyncio.sleep(0.01)
         benchmark = session.get(Benchmark, benchmark_id)
         if not benchmark:
             raise HTTPException(404, "Benchmark no encontrado")
 
-        await asyncio.sleep(0.01)
-        canciones = session.exec(
-            select(Cancion).where(Cancion.deleted_at == None)
-        ).all()
+        # El umbral de afinidad se traduce en rangos de tempo/energy: solo se puntúan
+        # las canciones que pueden calificar y solo se cargan las que se devuelven
+        matriz = obtener_matriz(session)
+        filas, afinidades = aptas_para_benchmark(
+            matriz, benchmark.tempo_promedio or 0, benchmark.energy_promedio or 0, limite
+        )
+
+        ids_top = [matriz.ids[i] for i in filas]
+        canciones = {
+            c.id: c for c in session.exec(
+                select(Cancion).where(Cancion.id.in_(ids_top))
+            ).all()
+        }
 
         recomendaciones = []
-        for cancion in canciones:
-            tempo_diff = abs((getattr(cancion, "tempo", 0) or 0) - (benchmark.tempo_promedio or 0))
-            energy_diff = abs((getattr(cancion, "energy", 0) or 0) - (benchmark.energy_promedio or 0))
-
-            distancia = (tempo_diff / 200 * 100 * 0.5) + (energy_diff * 100 * 0.5)
-            afinidad = max(0, 100 - distancia)
-
-            if afinidad > 60:
-                recomendaciones.append({
-                    "cancion": cancion,
-                    "afinidad_con_benchmark": round(afinidad, 1),
-                    "explicacion": f"Ideal para {benchmark.genero} en {benchmark.pais}",
-                    "metricas_comparadas": {
-                        "tempo_cancion": getattr(cancion, "tempo", None),
-                        "tempo_benchmark": benchmark.tempo_promedio,
-                        "energy_cancion": getattr(cancion, "energy", None),
-                        "energy_benchmark": benchmark.energy_promedio
-                    }
-                })
-
-        recomendaciones.sort(key=lambda x: x["afinidad_con_benchmark"], reverse=True)
+        for cancion_id, afinidad in zip(ids_top, afinidades):
+            cancion = canciones.get(cancion_id)
+            if cancion is None:
+                continue
+            recomendaciones.append({
+                "cancion": cancion,
+                "afinidad_con_benchmark": round(float(afinidad), 1),
+                "explicacion": f"Ideal para {benchmark.genero} en {benchmark.pais}",
+                "metricas_comparadas": {
+                    "tempo_cancion": getattr(cancion, "tempo", None),
+                    "tempo_benchmark": benchmark.tempo_promedio,
+                    "energy_cancion": getattr(cancion, "energy", None),
+                    "energy_benchmark": benchmark.energy_promedio
+                }
+            })
 
         return {
             "benchmark": f"{benchmark.genero} ({benchmark.pais})",
-            "total_canciones_analizadas": len(canciones),
-            "canciones_recomendadas": recomendaciones[:limite]
+            "total_canciones_analizadas": len(matriz),
+            "canciones_recomendadas": recomendaciones
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error recomendando para benchmark: {e}")
         raise HTTPException(500, "Error generando recomendaciones")
@@ -1,17 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
-import requests
+from fastapi import APIRouter, Body, Depends, HTTPException
 from routers.spotify_auth import get_spotify_token_dependency
+from services.spotify_service import IDS_POR_LOTE, ClienteSpotify, get_cliente_spotify
 
 router = APIRouter(prefix="/spotify/data", tags=["Spotify Data"])
 
 
 @router.get("/search")
-def buscar_canciones(
+async def buscar_canciones(
         query: str,
         limit: int = 5,
-        token: str = Depends(get_spotify_token_dependency)
+        token: str = Depends(get_spotify_token_dependency),
+        cliente: ClienteSpotify = Depends(get_cliente_spotify)
 ):
-    headers = {'Authorization': f'Bearer {token}'}
     params = {
         'q': query,
         'type': 'track',
@@ -19,12 +19,7 @@ def buscar_canciones(
         'market': 'CO'
     }
 
-    response = requests.get(
-        'https://api.spotify.com/v1/search',
-        headers=headers,
-        params=params,
-        timeout=10
-    )
+    response = await cliente.get('/search', token, params=params)
 
     if response.status_code == 200:
         data = response.json()
@@ -52,26 +47,51 @@ def buscar_canciones(
 
 
 @router.get("/audio-features/{track_id}")
-def obtener_audio_features(
+async def obtener_audio_features(
         track_id: str,
-        token: str = Depends(get_spotify_token_dependency)
+        token: str = Depends(get_spotify_token_dependency),
+        cliente: ClienteSpotify = Depends(get_cliente_spotify)
 ):
-    headers = {'Authorization': f'Bearer {token}'}
-
-    response = requests.get(
-        f'https://api.spotify.com/v1/audio-features/{track_id}',
-        headers=headers,
-        timeout=10
-    )
+    response = await cliente.get(f'/audio-features/{track_id}', token)
 
     if response.status_code == 200:
-        features = response.json()
-        return {
-            'tempo': features.get('tempo'),
-            'energy': features.get('energy'),
-            'danceability': features.get('danceability'),
-            'valence': features.get('valence'),
-            'acousticness': features.get('acousticness')
-        }
+        return _resumir_features(response.json())
     else:
-        raise HTTPException(response.status_code, f"Spotify API: {response.text}")
\ No newline at end of file
+        raise HTTPException(response.status_code, f"Spotify API: {response.text}")
+
+
+@router.post("/audio-features")
+async def obtener_audio_features_lote(
+        ids: list[str] = Body(..., embed=True),
+        token: str = Depends(get_spotify_token_dependency),
+        cliente: ClienteSpotify = Depends(get_cliente_spotify)
+):
+    """Audio features de hasta IDS_POR_LOTE pistas en una sola llamada a Spotify"""
+    if not ids or len(set(ids)) > IDS_POR_LOTE:
+        raise HTTPException(400, f"Se necesitan entre 1 y {IDS_POR_LOTE} ids")
+
+    features = await cliente.audio_features(token, ids)
+    return {
+        'total': len(features),
+        'audio_features': {
+            id_: _resumir_features(f) if f else None for id_, f in features.items()
+        }
+    }
+
+
+@router.get("/cache")
+async def metricas_cache(cliente: ClienteSpotify = Depends(get_cliente_spotify)):
+    """Aciertos, fallos y tamaño de la caché de respuestas de Spotify, y llamadas compartidas"""
+    if cliente.cache is None:
+        return {'activa': False, 'solicitudes_compartidas': cliente.compartidas}
+    return {'activa': True, **cliente.cache.metricas(), 'solicitudes_compartidas': cliente.compartidas}
+
+
+def _resumir_features(features: dict) -> dict:
+    return {
+        'tempo': features.get('tempo'),
+        'energy': features.get('energy'),
+        'danceability': features.get('danceability'),
+        'valence': features.get('valence'),
+        'acousticness': features.get('acousticness')
+    }
\ No newline at end of file
@@ -2,8 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from routers.spotify_auth import get_spotify_token_dependency
-import requests
-import asyncio
+from services.spotify_service import ClienteSpotify, get_cliente_spotify
 import logging
 
 router = APIRouter(prefix="/spotify-info", tags=["Spotify"])
@@ -36,9 +35,10 @@ async def buscar_artista_form(request: Request):
 async def buscar_artista_resultado(
     request: Request,
     nombre: str,
-    token: str = Depends(get_spotify_token_dependency)
+    token: str = Depends(get_spotify_token_dependency),
+    cliente: ClienteSpotify = Depends(get_cliente_spotify)
 ):
-    data = await buscar_artista_api(nombre, token)
+    data = await buscar_artista_api(nombre, token, cliente)
 
     return templates.TemplateResponse(
         "spotify/resultados_artista.html",
@@ -52,14 +52,15 @@ async def buscar_artista_resultado(
 
 
 @router.get("/api/buscar-artista/{nombre}")
-async def buscar_artista_api(nombre: str, token=Depends(get_spotify_token_dependency)):
+async def buscar_artista_api(
+    nombre: str,
+    token=Depends(get_spotify_token_dependency),
+    cliente: ClienteSpotify = Depends(get_cliente_spotify)
+):
     try:
-        await asyncio.sleep(0.01)
-
-        headers = {"Authorization": f"Bearer {token}"}
         params = {"q": nombre, "type": "artist", "limit": 10, "market": "CO"}
 
-        r = requests.get("https://api.spotify.com/v1/search", headers=headers, params=params)
+        r = await cliente.get("/search", token, params=params)
         items = r.json().get("artists", {}).get("items", [])
 
         resultados = []
@@ -89,16 +90,23 @@ async def buscar_artista_api(nombre: str, token=Depends(get_spotify_token_depend
 # ======================================================
 
 @router.get("/artista/{id}", response_class=HTMLResponse)
-async def artista_html(request: Request, id: str, token=Depends(get_spotify_token_dependency)):
-    data = await artista_api(id, token)
+async def artista_html(
+    request: Request,
+    id: str,
+    token=Depends(get_spotify_token_dependency),
+    cliente: ClienteSpotify = Depends(get_cliente_spotify)
+):
+    data = await artista_api(id, token, cliente)
     return templates.TemplateResponse("spotify/artista.html", {"request": request, "info": data})
 
 
 @router.get("/api/artista/{id}")
-async def artista_api(id: str, token=Depends(get_spotify_token_dependency)):
-    headers = {"Authorization": f"Bearer {token}"}
-
-    r = requests.get(f"https://api.spotify.com/v1/artists/{id}", headers=headers)
+async def artista_api(
+    id: str,
+    token=Depends(get_spotify_token_dependency),
+    cliente: ClienteSpotify = Depends(get_cliente_spotify)
+):
+    r = await cliente.get(f"/artists/{id}", token)
     if r.status_code != 200:
         raise HTTPException(404, "Artista no encontrado")
 
@@ -130,9 +138,10 @@ async def buscar_track_form(request: Request):
 async def buscar_track_resultado(
     request: Request,
     nombre: str,
-    token=Depends(get_spotify_token_dependency)
+    token=Depends(get_spotify_token_dependency),
+    cliente: ClienteSpotify = Depends(get_cliente_spotify)
 ):
-    data = await buscar_track_api(nombre, token)
+    data = await buscar_track_api(nombre, token, cliente)
 
     return templates.TemplateResponse(
         "spotify/resultados_track.html",
@@ -146,11 +155,14 @@ async def buscar_track_resultado(
 
 
 @router.get("/api/buscar-track/{nombre}")
-async def buscar_track_api(nombre: str, token=Depends(get_spotify_token_dependency)):
-    headers = {"Authorization": f"Bearer {token}"}
+async def buscar_track_api(
+    nombre: str,
+    token=Depends(get_spotify_token_dependency),
+    cliente: ClienteSpotify = Depends(get_cliente_spotify)
+):
     params = {"q": nombre, "type": "track", "limit": 10, "market": "CO"}
 
-    r = requests.get("https://api.spotify.com/v1/search", headers=headers, params=params)
+    r = await cliente.get("/search", token, params=params)
     items = r.json().get("tracks", {}).get("items", [])
 
     resultados = []
@@ -174,15 +186,23 @@ async def buscar_track_api(nombre: str, token=Depends(get_spotify_token_dependen
 # ======================================================
 
 @router.get("/track/{id}", response_class=HTMLResponse)
-async def track_html(request: Request, id: str, token=Depends(get_spotify_token_dependency)):
-    data = await track_api(id, token)
+async def track_html(
+    request: Request,
+    id: str,
+    token=Depends(get_spotify_token_dependency),
+    cliente: ClienteSpotify = Depends(get_cliente_spotify)
+):
+    data = await track_api(id, token, cliente)
     return templates.TemplateResponse("spotify/track.html", {"request": request, "info": data})
 
 
 @router.get("/api/track/{id}")
-async def track_api(id: str, token=Depends(get_spotify_token_dependency)):
-    headers = {"Authorization": f"Bearer {token}"}
-    r = requests.get(f"https://api.spotify.com/v1/tracks/{id}", headers=headers)
+async def track_api(
+    id: str,
+    token=Depends(get_spotify_token_dependency),
+    cliente: ClienteSpotify = Depends(get_cliente_spotify)
+):
+    r = await cliente.get(f"/tracks/{id}", token)
 
     if r.status_code != 200:
         raise HTTPException(404, "Track no encontrado")
@@ -0,0 +1,69 @@
+import threading
+from typing import Optional
+
+import numpy as np
+
+from services.similitud_service import MatrizCanciones, seleccionar_top, TEMPO, ENERGY
+
+# Afinidad mínima (exclusiva) para recomendar una canción a un benchmark
+UMBRAL_AFINIDAD = 60
+
+# afinidad = 100 - (Δtempo / 200 · 50 + Δenergy · 50): para superar el umbral cada
+# diferencia por sí sola tiene que quedar por debajo de estos máximos
+MAX_DIFF_TEMPO = (100 - UMBRAL_AFINIDAD) / 50 * 200
+MAX_DIFF_ENERGY = (100 - UMBRAL_AFINIDAD) / 50
+
+# Holgura de los rangos para no perder bordes por redondeo; el filtro final es exacto
+MARGEN = 1e-9
+
+
+class IndiceTempo:
+    """Filas de la matriz ordenadas por tempo: un rango de tempo es un corte por búsqueda binaria."""
+
+    def __init__(self, matriz: MatrizCanciones):
+        tempos = matriz.valores[:, TEMPO]
+        self.orden = np.argsort(tempos, kind="stable")
+        self.tempos = tempos[self.orden]
+
+    def rango(self, minimo: float, maximo: float) -> np.ndarray:
+        inicio = np.searchsorted(self.tempos, minimo, side="left")
+        fin = np.searchsorted(self.tempos, maximo, side="right")
+        return self.orden[inicio:fin]
+
+
+_indice: Optional[tuple] = None
+_lock = threading.Lock()
+
+
+def obtener_indice_tempo(matriz: MatrizCanciones) -> IndiceTempo:
+    """Índice de tempo de esta matriz; se reconstruye cuando la matriz cambia."""
+    global _indice
+    with _lock:
+        if _indice is None or _indice[0] is not matriz:
+            _indice = (matriz, IndiceTempo(matriz))
+        return _indice[1]
+
+
+def afinidad_benchmark(tempos: np.ndarray, energies: np.ndarray, tempo: float, energy: float) -> np.ndarray:
+    """Afinidad canción-benchmark (0 a 100) según diferencias de tempo y energy."""
+    distancia = (np.abs(tempos - tempo) / 200 * 100 * 0.5) + (np.abs(energies - energy) * 100 * 0.5)
+    return np.maximum(0, 100 - distancia)
+
+
+def aptas_para_benchmark(matriz: MatrizCanciones, tempo: float, energy: float, limite: int) -> tuple:
+    """Filas de las `limite` canciones más afines (> UMBRAL_AFINIDAD) y su afinidad.
+
+    Solo se puntúan las filas dentro de los rangos de tempo y energy que pueden
+    superar el umbral. El orden es afinidad (redondeada) desc y, ante empate,
+    posición en la matriz, igual que el recorrido completo.
+    """
+    filas = obtener_indice_tempo(matriz).rango(tempo - MAX_DIFF_TEMPO - MARGEN, tempo + MAX_DIFF_TEMPO + MARGEN)
+    filas = filas[np.abs(matriz.valores[filas, ENERGY] - energy) <= MAX_DIFF_ENERGY + MARGEN]
+    filas = np.sort(filas)
+
+    afinidades = afinidad_benchmark(matriz.valores[filas, TEMPO], matriz.valores[filas, ENERGY], tempo, energy)
+    superan = afinidades > UMBRAL_AFINIDAD
+    filas, afinidades = filas[superan], afinidades[superan]
+
+    top = seleccionar_top(afinidades, limite)
+    return filas[top], afinidades[top]
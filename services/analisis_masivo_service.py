@@ -0,0 +1,253 @@
+import os
+import math
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Optional
+
+import numpy as np
+from sqlmodel import Session, select
+
+from models import Benchmark, AnalisisResultado
+from services.similitud_service import cargar_matriz, redondear, TEMPO, ENERGY, DANCE, VALENCE
+from services.sql_service import insert_dialecto
+from services.tendencias_service import registrar_resultados
+from services.resultados_service import (
+    entradas_cancion, entradas_benchmark, hash_entradas, versiones_existentes, registrar_solicitud
+)
+
+# Distancia máxima posible (tempo hasta 200, el resto entre 0 y 1)
+MAX_DISTANCIA = math.sqrt(200 ** 2 + 1 ** 2 + 1 ** 2 + 1 ** 2)
+
+# (umbral exclusivo, nivel, recomendación) de mayor a menor; por debajo de todos queda BAJO
+NIVELES_AFINIDAD = (
+    (80, "🎵 EXCELENTE", "Perfecto para este mercado"),
+    (60, "✅ BUENO", "Funcionaría bien"),
+    (40, "⚠️ REGULAR", "Podría mejorar"),
+)
+NIVEL_BAJO = ("❌ BAJO", "No es el mercado objetivo")
+
+# Celdas (canciones × benchmarks) que se calculan e insertan por tanda
+CELDAS_POR_TANDA = 200_000
+
+# Trabajos terminados que se conservan para consultar su estado, y por cuántos segundos
+MAX_TRABAJOS = int(os.getenv("ANALISIS_MAX_TRABAJOS", "100"))
+RETENCION_TRABAJOS = float(os.getenv("ANALISIS_RETENCION_TRABAJOS", "3600"))
+
+
+def nivel_afinidad(afinidad: float) -> tuple:
+    """(nivel, recomendación) para una afinidad sin redondear."""
+    for umbral, nivel, recomendacion in NIVELES_AFINIDAD:
+        if afinidad > umbral:
+            return nivel, recomendacion
+    return NIVEL_BAJO
+
+
+def matriz_afinidad(canciones: np.ndarray, benchmarks: np.ndarray) -> np.ndarray:
+    """Afinidad (sin redondear) de cada canción contra cada benchmark, forma (canciones, benchmarks).
+
+    Ambos arreglos traen columnas tempo, energy, danceability, valence; mismo cálculo
+    y mismo orden de operaciones que `calcular_afinidad_completa`.
+    """
+    diferencias = [np.abs(canciones[:, c, None] - benchmarks[None, :, c]) for c in range(4)]
+    distancia = np.sqrt(
+        diferencias[0] ** 2 +
+        diferencias[1] ** 2 +
+        diferencias[2] ** 2 +
+        diferencias[3] ** 2
+    )
+    return np.maximum(0, 100 - (distancia / MAX_DISTANCIA * 100))
+
+
+def hallazgos(afinidades: np.ndarray) -> np.ndarray:
+    """Nivel de cada afinidad, vectorizado."""
+    return np.select(
+        [afinidades > umbral for umbral, _, _ in NIVELES_AFINIDAD],
+        [nivel for _, nivel, _ in NIVELES_AFINIDAD],
+        default=NIVEL_BAJO[0]
+    )
+
+
+def analizar_catalogo(
+        session: Session,
+        celdas_por_tanda: int = CELDAS_POR_TANDA,
+        progreso: Optional[Callable[[int, int], None]] = None
+) -> dict:
+    """Calcula y guarda la afinidad de todas las canciones activas contra todos los benchmarks activos.
+
+    Trabaja por tandas de canciones: cada tanda es una operación matricial y un
+    INSERT por lotes con su commit. Los pares cuyas entradas no cambiaron desde el
+    último análisis ya tienen su resultado y no se vuelven a escribir; si otra escritura
+    guarda la misma versión mientras tanto, el INSERT la omite (ON CONFLICT DO NOTHING)
+    y solo lo insertado entra en las tendencias.
+    `progreso(canciones_procesadas, total)` se llama al terminar cada tanda.
+    """
+    inicio = time.perf_counter()
+    matriz = cargar_matriz(session)
+    benchmarks = session.exec(
+        select(Benchmark).where(Benchmark.deleted_at == None)
+    ).all()
+
+    total = len(matriz)
+    if not benchmarks or not total:
+        if progreso:
+            progreso(0, total)
+        return {"canciones": total, "benchmarks": len(benchmarks), "calculados": 0, "resultados": 0, "segundos": 0.0}
+
+    ids_benchmarks = [b.id for b in benchmarks]
+    entradas_benchmarks = [entradas_benchmark(b) for b in benchmarks]
+    valores_benchmarks = np.array([
+        [b.tempo_promedio or 0, b.energy_promedio or 0, b.danceability_promedio or 0, b.valence_promedio or 0]
+        for b in benchmarks
+    ], dtype=np.float64)
+    valores_canciones = matriz.valores[:, [TEMPO, ENERGY, DANCE, VALENCE]]
+
+    por_tanda = max(1, celdas_por_tanda // len(benchmarks))
+    creado_en = datetime.utcnow()
+    guardados = 0
+
+    for desde in range(0, total, por_tanda):
+        hasta = min(desde + por_tanda, total)
+        afinidades = matriz_afinidad(valores_canciones[desde:hasta], valores_benchmarks)
+        niveles = hallazgos(afinidades)
+        # Mismo redondeo que round() en calcular_afinidad_completa
+        redondeadas = redondear(afinidades, 1)
+        existentes = versiones_existentes(session, list(matriz.ids[desde:hasta]))
+
+        filas = []
+        for i in range(hasta - desde):
+            cancion_id = matriz.ids[desde + i]
+            entradas_c = entradas_cancion(*valores_canciones[desde + i])
+            for j, benchmark_id in enumerate(ids_benchmarks):
+                version = hash_entradas(entradas_c, entradas_benchmarks[j])
+                if (cancion_id, benchmark_id, version) in existentes:
+                    continue
+                filas.append({
+                    "cancion_id": cancion_id,
+                    "benchmark_id": benchmark_id,
+                    "afinidad": float(redondeadas[i, j]),
+                    "hallazgo": str(niveles[i, j]),
+                    "hash_entradas": version,
+                    "creado_en": creado_en
+                })
+
+        insertadas = []
+        if filas:
+            insertadas = session.execute(
+                insert_dialecto(session, AnalisisResultado)
+                .on_conflict_do_nothing(index_elements=["cancion_id", "benchmark_id", "hash_entradas"])
+                .returning(AnalisisResultado.benchmark_id, AnalisisResultado.afinidad),
+                filas
+            ).all()
+            registrar_resultados(session, [(benchmark_id, creado_en, afinidad) for benchmark_id, afinidad in insertadas])
+        session.commit()
+        guardados += len(insertadas)
+
+        if progreso:
+            progreso(hasta, total)
+
+    registrar_solicitud(session, None, "masivo", len(benchmarks), guardados)
+    session.commit()
+
+    return {
+        "canciones": total,
+        "benchmarks": len(benchmarks),
+        "calculados": total * len(benchmarks),
+        "resultados": guardados,
+        "segundos": round(time.perf_counter() - inicio, 2)
+    }
+
+
+# ========== TRABAJOS EN SEGUNDO PLANO ==========
+
+_trabajos = {}
+_lock = threading.Lock()
+
+
+def _podar_trabajos() -> None:
+    """Quita los trabajos terminados hace más de RETENCION_TRABAJOS y, si aún sobran, los más viejos.
+
+    Los pendientes y en curso nunca se quitan. Se llama con el lock tomado.
+    """
+    limite = time.monotonic() - RETENCION_TRABAJOS
+    terminados = sorted(
+        (t["terminado_en"], trabajo_id) for trabajo_id, t in _trabajos.items() if t["terminado_en"] is not None
+    )
+    sobrantes = max(0, len(_trabajos) - MAX_TRABAJOS + 1)
+    for i, (terminado_en, trabajo_id) in enumerate(terminados):
+        if terminado_en > limite and i >= sobrantes:
+            break
+        del _trabajos[trabajo_id]
+
+
+def crear_trabajo() -> tuple:
+    """(id, creado): registra un trabajo nuevo, salvo que ya haya uno pendiente o en curso.
+
+    Cada trabajo recorre todo el catálogo; dos a la vez solo duplicarían el trabajo y la
+    carga sobre la base, así que en ese caso se devuelve el existente con creado=False.
+    """
+    trabajo_id = uuid.uuid4().hex[:12]
+    with _lock:
+        for existente in _trabajos.values():
+            if existente["estado"] in ("pendiente", "en_curso"):
+                return existente["id"], False
+        _podar_trabajos()
+        _trabajos[trabajo_id] = {
+            "id": trabajo_id,
+            "estado": "pendiente",
+            "procesadas": 0,
+            "total": None,
+            "iniciado_en": datetime.utcnow(),
+            "resultado": None,
+            "error": None,
+            "terminado_en": None
+        }
+    return trabajo_id, True
+
+
+def estado_trabajo(trabajo_id: str) -> Optional[dict]:
+    with _lock:
+        trabajo = _trabajos.get(trabajo_id)
+        return {k: v for k, v in trabajo.items() if k != "terminado_en"} if trabajo else None
+
+
+def ejecutar_trabajo(trabajo_id: str, celdas_por_tanda: int = CELDAS_POR_TANDA) -> None:
+    """Corre `analizar_catalogo` con su propia sesión y deja el avance en el registro de trabajos."""
+    from database import engine
+
+    def progreso(procesadas, total):
+        with _lock:
+            _trabajos[trabajo_id].update(procesadas=procesadas, total=total)
+
+    with _lock:
+        _trabajos[trabajo_id]["estado"] = "en_curso"
+    try:
+        with Session(engine) as session:
+            resultado = analizar_catalogo(session, celdas_por_tanda, progreso)
+        with _lock:
+            _trabajos[trabajo_id].update(estado="terminado", resultado=resultado, terminado_en=time.monotonic())
+    except Exception as e:
+        with _lock:
+            _trabajos[trabajo_id].update(estado="error", error=str(e)[:200], terminado_en=time.monotonic())
+
+
+if __name__ == "__main__":
+    # python -m services.analisis_masivo_service [--celdas N]
+    import argparse
+    from database import engine, create_db_and_tables
+
+    parser = argparse.ArgumentParser(description="Análisis masivo canciones × benchmarks")
+    parser.add_argument("--celdas", type=int, default=CELDAS_POR_TANDA, help="celdas por tanda")
+    args = parser.parse_args()
+
+    create_db_and_tables()
+
+    def imprimir(procesadas, total):
+        porcentaje = procesadas / total * 100 if total else 100
+        print(f"  {procesadas}/{total} canciones ({porcentaje:.1f}%)", flush=True)
+
+    with Session(engine) as session:
+        resumen = analizar_catalogo(session, args.celdas, imprimir)
+    print(f"✅ {resumen['resultados']} resultados ({resumen['canciones']} canciones × "
+          f"{resumen['benchmarks']} benchmarks) en {resumen['segundos']} s")
@@ -0,0 +1,98 @@
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class CacheTTL:
+    """Caché de respuestas en dos niveles: LRU en memoria y, opcionalmente, SQLite en disco.
+
+    Cada entrada tiene un TTL y una ventana extra en la que sigue sirviéndose como
+    vencida (stale-while-revalidate): quien la lee recibe el contenido al instante y
+    decide si la revalida en segundo plano. Un acierto en memoria no sale del event
+    loop; el nivel en disco sobrevive a reinicios y se lee en un hilo.
+    """
+
+    def __init__(self, entradas: int, archivo: Optional[str] = None):
+        self.entradas = entradas
+        self.memoria: OrderedDict = OrderedDict()
+        self.disco = None
+        self._lock_disco = threading.Lock()
+        self._escrituras = 0
+        self.contadores = {
+            "aciertos_memoria": 0, "aciertos_disco": 0, "vencidos_servidos": 0,
+            "fallos": 0, "guardados": 0, "revalidaciones": 0,
+        }
+        if archivo:
+            self.disco = sqlite3.connect(archivo, check_same_thread=False)
+            self.disco.execute("PRAGMA journal_mode=WAL")
+            self.disco.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "clave TEXT PRIMARY KEY, contenido BLOB, vence_en REAL, descartar_en REAL)"
+            )
+
+    async def obtener(self, clave: str) -> Optional[tuple]:
+        """(contenido, vencido) o None si no está o ya pasó su ventana de stale."""
+        ahora = time.time()
+        entrada = self.memoria.get(clave)
+        if entrada is not None and entrada[2] > ahora:
+            self.memoria.move_to_end(clave)
+            self.contadores["aciertos_memoria"] += 1
+        else:
+            entrada = await asyncio.to_thread(self._leer_disco, clave, ahora) if self.disco else None
+            if entrada is None:
+                self.contadores["fallos"] += 1
+                return None
+            self._guardar_memoria(clave, entrada)
+            self.contadores["aciertos_disco"] += 1
+
+        contenido, vence_en, _ = entrada
+        vencido = vence_en <= ahora
+        if vencido:
+            self.contadores["vencidos_servidos"] += 1
+        return contenido, vencido
+
+    async def guardar(self, clave: str, contenido: bytes, ttl: float, stale: float):
+        ahora = time.time()
+        entrada = (contenido, ahora + ttl, ahora + ttl + stale)
+        self._guardar_memoria(clave, entrada)
+        self.contadores["guardados"] += 1
+        if self.disco:
+            await asyncio.to_thread(self._escribir_disco, clave, entrada, ahora)
+
+    def metricas(self) -> dict:
+        consultas = self.contadores["aciertos_memoria"] + self.contadores["aciertos_disco"] + self.contadores["fallos"]
+        aciertos = consultas - self.contadores["fallos"]
+        return {
+            **self.contadores,
+            "entradas_memoria": len(self.memoria),
+            "disco": self.disco is not None,
+            "tasa_aciertos": round(aciertos / consultas, 3) if consultas else None,
+        }
+
+    def _guardar_memoria(self, clave: str, entrada: tuple):
+        if self.entradas <= 0:
+            return
+        self.memoria[clave] = entrada
+        self.memoria.move_to_end(clave)
+        while len(self.memoria) > self.entradas:
+            self.memoria.popitem(last=False)
+
+    def _leer_disco(self, clave: str, ahora: float) -> Optional[tuple]:
+        with self._lock_disco:
+            fila = self.disco.execute(
+                "SELECT contenido, vence_en, descartar_en FROM cache WHERE clave = ? AND descartar_en > ?",
+                (clave, ahora)
+            ).fetchone()
+        return tuple(fila) if fila else None
+
+    def _escribir_disco(self, clave: str, entrada: tuple, ahora: float):
+        with self._lock_disco:
+            self.disco.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", (clave, *entrada))
+            self._escrituras += 1
+            # Cada tanto se borran las entradas que ya no se pueden servir ni como vencidas
+            if self._escrituras % 500 == 0:
+                self.disco.execute("DELETE FROM cache WHERE descartar_en <= ?", (ahora,))
+            self.disco.commit()
@@ -0,0 +1,182 @@
+import os
+import asyncio
+import logging
+
+from typing import Optional
+
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session as SesionORM
+from sqlmodel import Session, select, func
+
+from models import Cancion, Artista, Benchmark, Contador
+
+# Tablas con contador, por nombre de tabla
+MODELOS_CONTADOS = {modelo.__tablename__: modelo for modelo in (Cancion, Artista, Benchmark)}
+
+# Segundos entre reconciliaciones contra COUNT(*) reales
+RECONCILIAR_CADA = float(os.getenv("CONTADORES_RECONCILIAR_CADA", "3600"))
+
+logger = logging.getLogger(__name__)
+
+
+def _cargar_valor_previo(objetivo, valor, anterior, iniciador):
+    return valor
+
+
+# Sin historial activo, asignar deleted_at en una instancia expirada (tras un commit)
+# no carga el valor anterior y no se podría saber si cambió de estado
+for _modelo in MODELOS_CONTADOS.values():
+    event.listen(_modelo.deleted_at, "set", _cargar_valor_previo, active_history=True, retval=True)
+
+
+def _sumar(deltas: dict, tabla: str, eliminado: bool, signo: int):
+    activos, eliminados = deltas.get(tabla, (0, 0))
+    deltas[tabla] = (activos, eliminados + signo) if eliminado else (activos + signo, eliminados)
+
+
+@event.listens_for(SesionORM, "before_flush")
+def _aplicar_deltas(session, flush_context, instances):
+    """Traduce altas, borrados lógicos y restauraciones pendientes en incrementos de los contadores.
+
+    Corre dentro del flush, así que los contadores se confirman o se descartan
+    junto con la escritura que los originó.
+    """
+    deltas = {}
+    for obj in session.new:
+        if getattr(obj, "__tablename__", None) not in MODELOS_CONTADOS:
+            continue
+        _sumar(deltas, obj.__tablename__, obj.deleted_at is not None, 1)
+
+    for obj in session.dirty:
+        if getattr(obj, "__tablename__", None) not in MODELOS_CONTADOS:
+            continue
+        historial = inspect(obj).attrs.deleted_at.history
+        if not historial.has_changes():
+            continue
+        antes = historial.deleted[0] if historial.deleted else None
+        if (antes is None) != (obj.deleted_at is None):
+            _sumar(deltas, obj.__tablename__, antes is not None, -1)
+            _sumar(deltas, obj.__tablename__, obj.deleted_at is not None, 1)
+
+    for obj in session.deleted:
+        if getattr(obj, "__tablename__", None) not in MODELOS_CONTADOS:
+            continue
+        historial = inspect(obj).attrs.deleted_at.history
+        antes = historial.deleted[0] if historial.deleted else obj.deleted_at
+        _sumar(deltas, obj.__tablename__, antes is not None, -1)
+
+    for tabla, (activos, eliminados) in deltas.items():
+        if activos or eliminados:
+            session.connection().execute(
+                update(Contador.__table__)
+                .where(Contador.__table__.c.tabla == tabla)
+                .values(
+                    activos=Contador.__table__.c.activos + activos,
+                    eliminados=Contador.__table__.c.eliminados + eliminados
+                )
+            )
+
+    if not session.info.get("catalogo_versionado") and _escribe_canciones(session):
+        session.info["catalogo_versionado"] = True
+        columnas = Contador.__table__.c
+        session.connection().execute(
+            update(Contador.__table__)
+            .where(columnas.tabla == Cancion.__tablename__)
+            .values(version=func.coalesce(columnas.version, 0) + 1)
+        )
+
+
+def _escribe_canciones(session) -> bool:
+    return any(isinstance(obj, Cancion) for obj in session.new) \
+        or any(isinstance(obj, Cancion) for obj in session.deleted) \
+        or any(isinstance(obj, Cancion) and session.is_modified(obj) for obj in session.dirty)
+
+
+@event.listens_for(SesionORM, "after_commit")
+@event.listens_for(SesionORM, "after_soft_rollback")
+def _cerrar_version(session, *args):
+    session.info.pop("catalogo_versionado", None)
+
+
+def version_catalogo(session: Session, bloquear: bool = False) -> Optional[int]:
+    """Versión actual del catálogo de canciones; None si todavía no hay contador.
+
+    Con bloquear=True la fila queda tomada (FOR UPDATE en PostgreSQL; en SQLite la
+    transacción ya escribió y tiene el lock) hasta el commit: ninguna escritura de
+    canciones puede confirmarse entre esta lectura y el commit de quien la pidió.
+    """
+    consulta = select(func.coalesce(Contador.version, 0)).where(Contador.tabla == Cancion.__tablename__)
+    if bloquear:
+        consulta = consulta.with_for_update()
+    return session.exec(consulta).first()
+
+
+def _conteos_reales(modelo):
+    return (
+        select(func.count()).select_from(modelo).where(modelo.deleted_at == None).scalar_subquery(),
+        select(func.count()).select_from(modelo).where(modelo.deleted_at != None).scalar_subquery()
+    )
+
+
+def reconciliar_contadores(session: Session) -> dict:
+    """Compara cada contador con COUNT(*) y corrige los que se desviaron (o faltan).
+
+    La corrección es un UPDATE con los conteos como subconsultas, atómico frente a
+    escrituras concurrentes. Devuelve {tabla: {"contador", "real"}} de los corregidos.
+    """
+    guardados = {c.tabla: c for c in session.exec(select(Contador)).all()}
+    corregidos = {}
+
+    for tabla, modelo in MODELOS_CONTADOS.items():
+        activos, eliminados = _conteos_reales(modelo)
+        real = tuple(session.exec(select(activos, eliminados)).one())
+        contador = guardados.get(tabla)
+        actual = (contador.activos, contador.eliminados) if contador else None
+        if actual == real:
+            continue
+
+        corregidos[tabla] = {"contador": actual, "real": real}
+        if contador is None:
+            session.add(Contador(tabla=tabla, activos=real[0], eliminados=real[1]))
+        else:
+            session.execute(
+                update(Contador)
+                .where(Contador.tabla == tabla)
+                .values(activos=activos, eliminados=eliminados)
+                .execution_options(synchronize_session=False)
+            )
+    session.commit()
+
+    for tabla, diferencia in corregidos.items():
+        logger.warning(f"Contador de {tabla} corregido: {diferencia['contador']} -> {diferencia['real']}")
+    return corregidos
+
+
+def leer_contadores(session: Session) -> dict:
+    """{tabla: (activos, eliminados)}; las tablas sin contador se cuentan en vivo.
+
+    Solo lee: crear los contadores que faltan queda para la reconciliación del arranque
+    y la periódica, así una lectura nunca escribe ni hace commit.
+    """
+    contadores = {c.tabla: (c.activos, c.eliminados) for c in session.exec(select(Contador)).all()}
+    for tabla, modelo in MODELOS_CONTADOS.items():
+        if tabla not in contadores:
+            activos, eliminados = _conteos_reales(modelo)
+            contadores[tabla] = tuple(session.exec(select(activos, eliminados)).one())
+    return contadores
+
+
+async def reconciliar_periodicamente():
+    """Tarea de fondo: reconcilia los contadores cada RECONCILIAR_CADA segundos."""
+    from database import engine
+
+    def reconciliar():
+        with Session(engine) as session:
+            return reconciliar_contadores(session)
+
+    while True:
+        await asyncio.sleep(RECONCILIAR_CADA)
+        try:
+            await asyncio.to_thread(reconciliar)
+        except Exception as e:
+            logger.error(f"Error reconciliando contadores: {e}")
@@ -0,0 +1,243 @@
+import os
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Optional
+
+from sqlalchemy import String, case, cast, event, literal, union_all
+from sqlalchemy.orm import Session as SesionORM
+from sqlmodel import Session, select, func
+
+from models import Cancion, Artista, Benchmark, AnalisisResultado
+from services.contadores_service import leer_contadores
+from services.eventos_service import bus
+
+# Segundos que se reutiliza el último resumen si ninguna escritura lo invalidó
+DASHBOARD_TTL = float(os.getenv("DASHBOARD_TTL", "30"))
+
+# Tablas cuyos cambios invalidan el resumen
+TABLAS_DASHBOARD = (Cancion, Artista, Benchmark, AnalisisResultado)
+
+TOP_DASHBOARD = 5
+
+# Temas del bus: escrituras confirmadas y deltas ya calculados para los clientes
+TEMA_CAMBIOS = "dashboard.cambios"
+TEMA_DELTAS = "dashboard.deltas"
+
+# Segundos que se esperan tras un cambio para agrupar ráfagas de escrituras
+ESPERA_DELTAS = float(os.getenv("DASHBOARD_ESPERA_DELTAS", "0.25"))
+
+logger = logging.getLogger(__name__)
+
+
+def calcular_resumen(session: Session) -> dict:
+    """Totales, eliminados y agregados de análisis del dashboard.
+
+    Activos y eliminados salen de la tabla de contadores (sin recorrer las tablas);
+    los agregados de análisis, de una sola consulta, y los dos rankings, de una
+    consulta con UNION ALL.
+    """
+    contadores = leer_contadores(session)
+    ultimas_24h = datetime.utcnow() - timedelta(hours=24)
+    analisis = session.exec(
+        select(
+            func.count(AnalisisResultado.id),
+            func.sum(case((AnalisisResultado.creado_en >= ultimas_24h, 1), else_=0)),
+            func.avg(AnalisisResultado.afinidad)
+        )
+    ).one()
+
+    conteo = func.count(AnalisisResultado.id)
+    mas_analizadas = (
+        select(literal("cancion").label("tipo"), AnalisisResultado.cancion_id.label("id"), conteo.label("total"))
+        .group_by(AnalisisResultado.cancion_id)
+        .order_by(conteo.desc())
+        .limit(TOP_DASHBOARD)
+        .subquery()
+    )
+    mas_usados = (
+        select(literal("benchmark").label("tipo"), cast(AnalisisResultado.benchmark_id, String).label("id"), conteo.label("total"))
+        .group_by(AnalisisResultado.benchmark_id)
+        .order_by(conteo.desc())
+        .limit(TOP_DASHBOARD)
+        .subquery()
+    )
+    rankings = session.exec(union_all(select(mas_analizadas), select(mas_usados))).all()
+
+    return {
+        "canciones_activas": contadores["cancion"][0],
+        "artistas_activos": contadores["artista"][0],
+        "benchmarks_activos": contadores["benchmark"][0],
+        "canciones_eliminadas": contadores["cancion"][1],
+        "artistas_eliminados": contadores["artista"][1],
+        "benchmarks_eliminados": contadores["benchmark"][1],
+        "total_analisis": analisis[0],
+        "analisis_ultimas_24h": analisis[1] or 0,
+        "afinidad_promedio": analisis[2],
+        "canciones_mas_analizadas": [
+            {"cancion_id": id_, "total_analisis": total} for tipo, id_, total in rankings if tipo == "cancion"
+        ],
+        "benchmarks_mas_usados": [
+            {"benchmark_id": int(id_), "total_usos": total} for tipo, id_, total in rankings if tipo == "benchmark"
+        ],
+        "calculado_en": datetime.utcnow()
+    }
+
+
+_resumen: Optional[dict] = None
+_calculado_en = 0.0
+# Sube con cada invalidación; un cálculo que empezó antes no se guarda
+_version = 0
+_lock = threading.Lock()
+
+
+def obtener_resumen(session: Session) -> dict:
+    """Resumen compartido del proceso; se recalcula si venció el TTL o hubo escrituras.
+
+    Las consultas corren fuera del lock (ver similitud_service.obtener_matriz).
+    """
+    global _resumen, _calculado_en
+    with _lock:
+        if _resumen is not None and time.monotonic() - _calculado_en <= DASHBOARD_TTL:
+            return _resumen
+        version = _version
+
+    resumen = calcular_resumen(session)
+    with _lock:
+        if _version == version:
+            _resumen = resumen
+            _calculado_en = time.monotonic()
+    return resumen
+
+
+def invalidar_dashboard() -> None:
+    global _resumen, _version
+    with _lock:
+        _version += 1
+        _resumen = None
+
+
+# ========== INVALIDACIÓN AL ESCRIBIR ==========
+# Cualquier commit que toque las tablas del dashboard descarta el resumen, sin importar
+# qué router escribió (altas, ediciones, borrados lógicos, restauraciones, análisis).
+
+@event.listens_for(SesionORM, "before_flush")
+def _marcar_cambios(session, flush_context, instances):
+    if any(isinstance(o, TABLAS_DASHBOARD) for o in chain(session.new, session.dirty, session.deleted)):
+        session.info["dashboard_modificado"] = True
+
+
+@event.listens_for(SesionORM, "do_orm_execute")
+def _marcar_sentencias(estado):
+    # INSERT/UPDATE/DELETE por lotes (session.execute) no pasan por el flush
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        mapper = estado.bind_mapper
+        if mapper is not None and issubclass(mapper.class_, TABLAS_DASHBOARD):
+            estado.session.info["dashboard_modificado"] = True
+
+
+@event.listens_for(SesionORM, "after_commit")
+def _invalidar_al_confirmar(session):
+    if session.info.pop("dashboard_modificado", False):
+        invalidar_dashboard()
+        bus.publicar(TEMA_CAMBIOS)
+
+
+@event.listens_for(SesionORM, "after_rollback")
+def _descartar_marca(session):
+    session.info.pop("dashboard_modificado", None)
+
+
+# ========== DELTAS EN VIVO ==========
+
+def serializar_resumen(resumen: dict) -> dict:
+    return {**resumen, "calculado_en": resumen["calculado_en"].isoformat()}
+
+
+def diferencias(anterior: Optional[dict], actual: dict) -> dict:
+    """Claves del resumen que cambiaron (todas si no hay anterior), más los análisis nuevos."""
+    if anterior is None:
+        return dict(actual)
+    delta = {
+        clave: valor for clave, valor in actual.items()
+        if clave != "calculado_en" and anterior.get(clave) != valor
+    }
+    if not delta:
+        return {}
+    if "total_analisis" in delta:
+        delta["nuevos_analisis"] = actual["total_analisis"] - anterior["total_analisis"]
+    delta["calculado_en"] = actual["calculado_en"]
+    return delta
+
+
+def resumen_actual() -> dict:
+    """Resumen serializado usando una sesión propia (para tareas y streams sin dependencia)."""
+    from database import engine
+    with Session(engine) as session:
+        return serializar_resumen(obtener_resumen(session))
+
+
+_ultimo_difundido: Optional[dict] = None
+# Sube con cada delta publicado; cada delta lleva la versión de la que parte (base)
+_version_difundida = 0
+
+
+async def snapshot_stream() -> tuple:
+    """(versión, resumen completo) para un cliente que se conecta.
+
+    Si es el primero, el resumen pasa a ser la base de los deltas y se devuelve su
+    versión; si no, la versión es None: el resumen puede ser más nuevo que la base del
+    próximo delta y el stream tiene que calcular el suyo (ver delta_para_cliente).
+    """
+    global _ultimo_difundido
+    resumen = await asyncio.to_thread(resumen_actual)
+    if _ultimo_difundido is None:
+        _ultimo_difundido = resumen
+        return _version_difundida, resumen
+    return None, resumen
+
+
+def delta_para_cliente(version: Optional[int], resumen: dict, mensaje: dict) -> dict:
+    """Delta a mandar a un cliente que tiene `resumen` en `version`.
+
+    Si el delta publicado parte de esa versión se reenvía tal cual; si no (el cliente se
+    conectó entre dos difusiones, o su cola descartó un delta) se calcula contra lo que
+    el cliente tiene, para no contar dos veces ni perder cambios como nuevos_analisis.
+    """
+    if version is not None and mensaje["base"] == version:
+        return mensaje["delta"]
+    return diferencias(resumen, mensaje["resumen"])
+
+
+async def difundir_dashboard():
+    """Tarea de fondo: por cada tanda de escrituras confirmadas recalcula el resumen una vez
+    y publica solo lo que cambió; todos los clientes conectados reciben el mismo delta."""
+    global _ultimo_difundido, _version_difundida
+    cambios = bus.suscribir(TEMA_CAMBIOS)
+    while True:
+        await cambios.get()
+        await asyncio.sleep(ESPERA_DELTAS)
+        while not cambios.empty():
+            cambios.get_nowait()
+
+        if not bus.suscriptores(TEMA_DELTAS):
+            _ultimo_difundido = None
+            continue
+        try:
+            actual = await asyncio.to_thread(resumen_actual)
+        except Exception as e:
+            logger.error(f"Error calculando delta del dashboard: {e}")
+            continue
+        delta = diferencias(_ultimo_difundido, actual)
+        _ultimo_difundido = actual
+        if delta:
+            _version_difundida += 1
+            bus.publicar(TEMA_DELTAS, {
+                "base": _version_difundida - 1,
+                "version": _version_difundida,
+                "delta": delta,
+                "resumen": actual
+            })
@@ -0,0 +1,50 @@
+import asyncio
+import threading
+from typing import Optional
+
+
+class BusEventos:
+    """Bus de eventos en proceso: cada suscriptor recibe en su cola lo que se publica en su tema.
+
+    Se puede publicar desde cualquier hilo (por ejemplo desde un hook de commit); la
+    entrega se agenda en el loop de cada suscriptor. Un suscriptor lento pierde los
+    eventos más viejos en vez de frenar a quien publica.
+    """
+
+    def __init__(self, maximo_por_cola: int = 100):
+        self.maximo_por_cola = maximo_por_cola
+        self._suscriptores = {}
+        self._lock = threading.Lock()
+
+    def suscribir(self, tema: str) -> asyncio.Queue:
+        cola = asyncio.Queue(maxsize=self.maximo_por_cola)
+        with self._lock:
+            self._suscriptores.setdefault(tema, {})[cola] = asyncio.get_running_loop()
+        return cola
+
+    def desuscribir(self, tema: str, cola: asyncio.Queue) -> None:
+        with self._lock:
+            self._suscriptores.get(tema, {}).pop(cola, None)
+
+    def suscriptores(self, tema: str) -> int:
+        with self._lock:
+            return len(self._suscriptores.get(tema, {}))
+
+    def publicar(self, tema: str, evento: Optional[dict] = None) -> None:
+        with self._lock:
+            destinos = list(self._suscriptores.get(tema, {}).items())
+        for cola, loop in destinos:
+            try:
+                loop.call_soon_threadsafe(self._entregar, cola, evento)
+            except RuntimeError:
+                # El loop del suscriptor ya cerró
+                self.desuscribir(tema, cola)
+
+    @staticmethod
+    def _entregar(cola: asyncio.Queue, evento) -> None:
+        if cola.full():
+            cola.get_nowait()
+        cola.put_nowait(evento)
+
+
+bus = BusEventos()
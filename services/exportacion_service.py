@@ -0,0 +1,161 @@
+import os
+import json
+import asyncio
+import logging
+from datetime import date, datetime
+from typing import AsyncIterator
+
+from sqlalchemy import select
+
+from models import Cancion, Artista, Benchmark, AnalisisResultado
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Filas que se leen del cursor y se envían por cada fragmento de la respuesta
+LOTE_EXPORTACION = int(os.getenv("EXPORTACION_LOTE", "1000"))
+# En Parquet cada lote es un row group; lotes chicos comprimen y se leen peor
+LOTE_COLUMNAR = int(os.getenv("EXPORTACION_LOTE_COLUMNAR", "65536"))
+
+# Nombre público -> (modelo, filtros); el catálogo exporta solo lo activo
+TABLAS_EXPORTABLES = {
+    "canciones": (Cancion, Cancion.deleted_at == None),
+    "artistas": (Artista, Artista.deleted_at == None),
+    "benchmarks": (Benchmark, Benchmark.deleted_at == None),
+    "analisis": (AnalisisResultado,),
+}
+
+FORMATOS_COLUMNARES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+logger = logging.getLogger(__name__)
+
+
+def _valor_json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"No serializable: {type(valor).__name__}")
+
+
+def consulta_exportacion(modelo, *filtros):
+    """Columnas de la tabla (sin objetos ORM) en el orden de un índice existente."""
+    tabla = modelo.__table__
+    orden = (tabla.c.creado_en, tabla.c.id) if "deleted_at" in tabla.c else (tabla.c.id,)
+    return select(tabla).where(*filtros).order_by(*orden)
+
+
+async def exportar_ndjson(consulta, lote: int = LOTE_EXPORTACION) -> AsyncIterator[bytes]:
+    """Una línea JSON por fila, leídas de un cursor del lado del servidor en lotes.
+
+    Usa su propia conexión (la respuesta sigue enviándose cuando la dependencia de
+    sesión ya terminó) y solo tiene en memoria un lote a la vez. Un error a mitad de
+    la exportación ya no puede cambiar el código HTTP: se registra y se relanza, así
+    la conexión se corta y el cliente no confunde un archivo truncado con uno completo.
+    """
+    from database import async_engine
+    try:
+        async with async_engine.connect() as conn:
+            resultado = await conn.stream(consulta.execution_options(yield_per=lote))
+            async for filas in resultado.mappings().partitions():
+                yield "".join(
+                    json.dumps(dict(fila), default=_valor_json, ensure_ascii=False) + "\n" for fila in filas
+                ).encode()
+    except Exception as e:
+        logger.error(f"Error exportando NDJSON: {e}")
+        raise
+
+
+# ========== FORMATOS COLUMNARES (PARQUET / ARROW IPC) ==========
+
+def esquema_arrow(columnas):
+    """Esquema Arrow a partir de las columnas de la consulta (tipos y nulabilidad)."""
+    tipos = {
+        int: pa.int64(), float: pa.float64(), bool: pa.bool_(), str: pa.string(),
+        datetime: pa.timestamp("us"), date: pa.date32(),
+    }
+    campos = []
+    for columna in columnas:
+        try:
+            tipo = tipos.get(columna.type.python_type, pa.string())
+        except NotImplementedError:
+            tipo = pa.string()
+        campos.append(pa.field(columna.name, tipo, nullable=columna.nullable))
+    return pa.schema(campos)
+
+
+class _Fragmentos:
+    """Destino de escritura para pyarrow que guarda los bytes hasta que el stream los envía."""
+
+    closed = False
+
+    def __init__(self):
+        self.partes = []
+        self.posicion = 0
+
+    def write(self, datos) -> int:
+        self.partes.append(bytes(datos))
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self) -> int:
+        return self.posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self.partes)
+        self.partes.clear()
+        return datos
+
+
+def _escribir_lote(escritor, esquema, filas: list):
+    columnas = list(zip(*filas)) if filas else [[] for _ in esquema]
+    escritor.write_batch(pa.RecordBatch.from_arrays(
+        [pa.array(valores, type=campo.type) for valores, campo in zip(columnas, esquema)], schema=esquema
+    ))
+
+
+async def exportar_columnar(consulta, formato: str, lote: int = LOTE_COLUMNAR) -> AsyncIterator[bytes]:
+    """Parquet o Arrow IPC (archivo) escrito por lotes directo desde el cursor.
+
+    Cada lote del cursor se convierte en un RecordBatch (en un hilo, para no frenar el
+    event loop) y sus bytes salen en cuanto el escritor los produce; el pie del archivo
+    va al final. Del lado del cliente, el .arrow se puede abrir con memory map sin copiar.
+
+    El pie solo se manda si se escribieron todos los lotes: si la consulta falla o el
+    cliente se desconecta, el escritor se cierra igual pero lo que escribe se descarta,
+    y un archivo cortado no se puede abrir como si estuviera completo.
+    """
+    from database import async_engine
+    esquema = esquema_arrow(consulta.selected_columns)
+    destino = _Fragmentos()
+    if formato == "parquet":
+        escritor = pq.ParquetWriter(destino, esquema)
+    else:
+        escritor = pa.ipc.new_file(destino, esquema)
+    cerrado = False
+    try:
+        async with async_engine.connect() as conn:
+            resultado = await conn.stream(consulta.execution_options(yield_per=lote))
+            async for filas in resultado.partitions():
+                await asyncio.to_thread(_escribir_lote, escritor, esquema, filas)
+                yield destino.vaciar()
+        escritor.close()
+        cerrado = True
+        yield destino.vaciar()
+    except Exception as e:
+        logger.error(f"Error exportando {formato}: {e}")
+        raise
+    finally:
+        if not cerrado:
+            try:
+                escritor.close()
+            except Exception as e:
+                logger.warning(f"Error cerrando el escritor {formato}: {e}")
+            destino.vaciar()
@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from typing import Optional
+
+from sqlmodel import Session, select
+
+from models import Artista
+
+# Ancho de los buckets de popularidad; coincide con la diferencia máxima que suma puntos
+ANCHO_POPULARIDAD = 20
+
+# Segundos que el índice cargado se considera vigente (cubre escrituras de otros workers)
+INDICE_ARTISTAS_TTL = float(os.getenv("INDICE_ARTISTAS_TTL", "300"))
+
+
+def normalizar(valor: Optional[str]) -> Optional[str]:
+    """Clave de comparación de género/país; None si el valor está vacío."""
+    return valor.lower() if valor else None
+
+
+class IndiceArtistas:
+    """Índice invertido de artistas activos: género → ids, país → ids y buckets de popularidad."""
+
+    def __init__(self):
+        self.generos = {}
+        self.paises = {}
+        self.buckets = {}
+        self.datos = {}
+
+    def __len__(self) -> int:
+        return len(self.datos)
+
+    def agregar(self, artista_id: int, genero: Optional[str], pais: Optional[str], popularidad: Optional[int]):
+        self.quitar(artista_id)
+        genero, pais, popularidad = normalizar(genero), normalizar(pais), popularidad or 0
+        self.datos[artista_id] = (genero, pais, popularidad)
+        if genero:
+            self.generos.setdefault(genero, set()).add(artista_id)
+        if pais:
+            self.paises.setdefault(pais, set()).add(artista_id)
+        self.buckets.setdefault(popularidad // ANCHO_POPULARIDAD, set()).add(artista_id)
+
+    def quitar(self, artista_id: int):
+        datos = self.datos.pop(artista_id, None)
+        if datos is None:
+            return
+        genero, pais, popularidad = datos
+        for tabla, clave in (
+                (self.generos, genero),
+                (self.paises, pais),
+                (self.buckets, popularidad // ANCHO_POPULARIDAD)
+        ):
+            if clave is not None and clave in tabla:
+                tabla[clave].discard(artista_id)
+                if not tabla[clave]:
+                    del tabla[clave]
+
+    def candidatos(self, artista: Artista) -> dict:
+        """Artistas con similitud > 30 respecto a `artista`, como {id: similitud}.
+
+        Género suma 50, país 30 y popularidad a menos de 20 suma 20: solo pasan los del
+        mismo género o los del mismo país con popularidad cercana, así que únicamente se
+        recorren esos conjuntos.
+        """
+        genero, pais = normalizar(artista.genero_principal), normalizar(artista.pais)
+        popularidad = artista.popularidad or 0
+
+        def cercana(otro_id):
+            return abs(popularidad - self.datos[otro_id][2]) < ANCHO_POPULARIDAD
+
+        resultado = {}
+        for otro_id in self.generos.get(genero, ()) if genero else ():
+            similitud = 50
+            if pais and self.datos[otro_id][1] == pais:
+                similitud += 30
+            if cercana(otro_id):
+                similitud += 20
+            resultado[otro_id] = similitud
+
+        if pais and pais in self.paises:
+            bucket = popularidad // ANCHO_POPULARIDAD
+            mismo_pais = self.paises[pais]
+            for b in (bucket - 1, bucket, bucket + 1):
+                # & recorre el conjunto más chico de los dos
+                for otro_id in mismo_pais & self.buckets.get(b, set()):
+                    if otro_id not in resultado and cercana(otro_id):
+                        resultado[otro_id] = 50
+
+        resultado.pop(artista.id, None)
+        return resultado
+
+
+_indice: Optional[IndiceArtistas] = None
+_cargado_en = 0.0
+# Sube con cada cambio; una carga que empezó antes de un cambio no se guarda
+_version = 0
+_lock = threading.Lock()
+
+
+def cargar_indice(session: Session) -> IndiceArtistas:
+    """Construye el índice con una sola consulta de columnas."""
+    indice = IndiceArtistas()
+    filas = session.exec(
+        select(Artista.id, Artista.genero_principal, Artista.pais, Artista.popularidad)
+        .where(Artista.deleted_at == None)
+    ).all()
+    for artista_id, genero, pais, popularidad in filas:
+        indice.agregar(artista_id, genero, pais, popularidad)
+    return indice
+
+
+def candidatos_similares(session: Session, artista: Artista) -> tuple:
+    """(candidatos {id: similitud}, total de otros artistas activos) usando el índice compartido."""
+    global _indice, _cargado_en
+    with _lock:
+        if _indice is not None and time.monotonic() - _cargado_en <= INDICE_ARTISTAS_TTL:
+            return _indice.candidatos(artista), len(_indice) - (artista.id in _indice.datos)
+        version = _version
+
+    # La consulta corre fuera del lock (ver similitud_service.obtener_matriz)
+    indice = cargar_indice(session)
+    with _lock:
+        if _version == version:
+            _indice = indice
+            _cargado_en = time.monotonic()
+        return indice.candidatos(artista), len(indice) - (artista.id in indice.datos)
+
+
+def actualizar_indice_artistas(artista: Artista) -> None:
+    """Refleja en el índice un artista creado, editado, eliminado o restaurado."""
+    global _version
+    datos = (artista.id, artista.genero_principal, artista.pais, artista.popularidad)
+    eliminado = artista.deleted_at is not None
+    with _lock:
+        _version += 1
+        if _indice is None:
+            return
+        if eliminado:
+            _indice.quitar(datos[0])
+        else:
+            _indice.agregar(*datos)
+
+
+def invalidar_indice_artistas() -> None:
+    """Descarta el índice; la próxima consulta lo reconstruye."""
+    global _indice, _version
+    with _lock:
+        _version += 1
+        _indice = None
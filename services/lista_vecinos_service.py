@@ -0,0 +1,216 @@
+import os
+import logging
+from typing import Optional
+
+import numpy as np
+from sqlmodel import Session, select, delete, func
+
+from models import Cancion, VecinoCancion
+from services.sql_service import insert_dialecto
+from services.contadores_service import version_catalogo
+from services.similitud_service import (
+    MatrizCanciones, obtener_matriz, invalidar_matriz, calcular_similitudes, seleccionar_top, redondear
+)
+
+# Largo de cada lista persistida; pedidos con un límite mayor se calculan al vuelo
+TOP_K = int(os.getenv("VECINOS_TOP_K", "20"))
+
+# Ids por consulta al leer los cortes de las listas candidatas
+LOTE_CORTES = 500
+
+# Intentos de actualizar_vecinos si otra escritura de canciones se confirma durante el cálculo
+INTENTOS_VECINOS = 3
+
+logger = logging.getLogger(__name__)
+
+
+def guardar_lista(session: Session, cancion_id: str, vecinos: list, version: int) -> None:
+    """Reemplaza la lista de vecinos de una canción (no hace commit).
+
+    Cada puesto se escribe con upsert sobre (cancion_id, posicion): si dos solicitudes
+    calculan la misma lista a la vez, la segunda sobrescribe los puestos en lugar de
+    duplicarlos. `version` es la del catálogo con la que se calculó la lista; confirmar
+    con confirmar_si_vigente.
+    """
+    session.execute(
+        delete(VecinoCancion)
+        .where(VecinoCancion.cancion_id == cancion_id)
+        .where(VecinoCancion.posicion >= len(vecinos))
+    )
+    if not vecinos:
+        return
+    sentencia = insert_dialecto(session, VecinoCancion).values([
+        {"cancion_id": cancion_id, "vecino_id": vecino_id, "posicion": i, "similitud": similitud, "version": version}
+        for i, (vecino_id, similitud) in enumerate(vecinos)
+    ])
+    session.execute(sentencia.on_conflict_do_update(
+        index_elements=["cancion_id", "posicion"],
+        set_={
+            "vecino_id": sentencia.excluded.vecino_id,
+            "similitud": sentencia.excluded.similitud,
+            "version": sentencia.excluded.version
+        }
+    ))
+
+
+def confirmar_si_vigente(session: Session, version: Optional[int]) -> bool:
+    """Hace commit de las listas escritas solo si el catálogo sigue en `version`.
+
+    Si entre la carga de la matriz y este punto se confirmó una escritura de canciones
+    (en este proceso o en otro), las listas pueden no incluirla: se descartan con un
+    rollback. La lectura toma la fila de la versión hasta el commit, así que ninguna
+    escritura nueva puede colarse entre la comparación y la confirmación.
+    """
+    if version is None or version_catalogo(session, bloquear=True) != version:
+        session.rollback()
+        return False
+    session.commit()
+    return True
+
+
+def leer_lista(session: Session, cancion_id: str, limite: int) -> Optional[list]:
+    """Vecinos persistidos como [(VecinoCancion, Cancion)] en orden; None si no hay lista calculada.
+
+    Las listas sin versión (guardadas antes de existir la columna) no se usan.
+    """
+    if limite > TOP_K:
+        return None
+    filas = session.exec(
+        select(VecinoCancion, Cancion)
+        .join(Cancion, (Cancion.id == VecinoCancion.vecino_id) & (Cancion.deleted_at == None))
+        .where(VecinoCancion.cancion_id == cancion_id, VecinoCancion.version != None)
+        .order_by(VecinoCancion.posicion)
+        .limit(limite)
+    ).all()
+
+    if len(filas) < limite:
+        # Más corta de lo pedido: vale solo si no se quedó afuera ninguna canción eliminada
+        guardadas = session.exec(
+            select(func.count()).select_from(VecinoCancion).where(VecinoCancion.cancion_id == cancion_id)
+        ).one()
+        if min(guardadas, limite) > len(filas):
+            return None
+    return filas or None
+
+
+def _entrantes(session: Session, matriz: MatrizCanciones, similitudes: np.ndarray, pos: int) -> dict:
+    """Listas guardadas a las que entra la canción de la fila `pos`: {lista: similitud}.
+
+    La similitud es simétrica, así que alcanza con la fila de la canción: solo las
+    listas de canciones que superan el corte más bajo de todas son candidatas, y solo
+    se leen los cortes (último puesto) de esas.
+    """
+    piso = session.exec(
+        select(func.min(VecinoCancion.similitud))
+        .where(VecinoCancion.posicion == TOP_K - 1, VecinoCancion.version != None)
+    ).one()
+    if piso is None:
+        return {}
+
+    claves = redondear(similitudes, 1)
+    candidatas = np.flatnonzero(claves > round(piso, 1))
+    ids = [matriz.ids[i] for i in candidatas if i != pos]
+
+    entrantes = {}
+    for inicio in range(0, len(ids), LOTE_CORTES):
+        filas = session.exec(
+            select(VecinoCancion.cancion_id, VecinoCancion.similitud)
+            .where(VecinoCancion.posicion == TOP_K - 1, VecinoCancion.version != None)
+            .where(VecinoCancion.cancion_id.in_(ids[inicio:inicio + LOTE_CORTES]))
+        ).all()
+        for lista, corte in filas:
+            fila = matriz.posiciones[lista]
+            if claves[fila] > round(corte, 1):
+                entrantes[lista] = float(similitudes[fila])
+    return entrantes
+
+
+def _insertar_en_listas(session: Session, cancion_id: str, entrantes: dict, version: int) -> None:
+    """Inserta `cancion_id` en las listas indicadas ({lista: similitud}) desplazando el último."""
+    filas = session.exec(
+        select(VecinoCancion)
+        .where(VecinoCancion.cancion_id.in_(list(entrantes)))
+        .order_by(VecinoCancion.cancion_id, VecinoCancion.posicion)
+    ).all()
+
+    listas = {lista: [] for lista in entrantes}
+    for fila in filas:
+        listas[fila.cancion_id].append((fila.vecino_id, fila.similitud))
+
+    for lista, vecinos in listas.items():
+        vecinos.append((cancion_id, entrantes[lista]))
+        # Estable: ante empate la canción nueva queda después, como en el recorrido completo
+        vecinos.sort(key=lambda v: -round(v[1], 1))
+        guardar_lista(session, lista, vecinos[:TOP_K], version)
+
+
+def actualizar_vecinos(session: Session, cancion: Cancion) -> None:
+    """Ajusta las listas tras crear, editar, eliminar o restaurar una canción.
+
+    La lista de la canción y las que la contenían se descartan y se recalculan al
+    consultarlas. Si la canción está activa se recalcula su propia lista y se la
+    inserta en las listas a las que ahora entra. Espera que la matriz compartida ya
+    refleje el cambio; si otro proceso escribió canciones, la recarga.
+    """
+    cancion_id = cancion.id
+    descartar_listas(session, cancion_id)
+    try:
+        for _ in range(INTENTOS_VECINOS):
+            matriz = obtener_matriz(session)
+            if matriz.version is None or matriz.version != version_catalogo(session):
+                invalidar_matriz()
+                matriz = obtener_matriz(session)
+
+            pos = matriz.posiciones.get(cancion_id)
+            if pos is None:
+                return
+            if len(matriz) - 1 <= TOP_K:
+                # Catálogo chico: todas las listas tienen lugar para la canción
+                limpiar_vecinos(session)
+                return
+
+            similitudes = calcular_similitudes(matriz, matriz.valores[pos], matriz.nulos[pos])["total"]
+            top = seleccionar_top(similitudes, TOP_K, excluir=pos)
+            guardar_lista(session, cancion_id, [(matriz.ids[i], float(similitudes[i])) for i in top], matriz.version)
+
+            entrantes = _entrantes(session, matriz, similitudes, pos)
+            if entrantes:
+                _insertar_en_listas(session, cancion_id, entrantes, matriz.version)
+
+            if confirmar_si_vigente(session, matriz.version):
+                return
+
+        # Escrituras concurrentes ganaron todos los intentos: no se sabe a qué listas entra
+        logger.warning(f"Catálogo cambiando durante la actualización de vecinos de {cancion_id}; se descartan las listas")
+        limpiar_vecinos(session)
+
+    except Exception as e:
+        # Mejor recalcular al vuelo que servir listas incoherentes
+        session.rollback()
+        logger.error(f"Error actualizando vecinos de {cancion_id}: {e}")
+        limpiar_vecinos(session)
+
+
+def descartar_listas(session: Session, cancion_id: str) -> None:
+    """Borra la lista de la canción y las que la contienen; se recalculan al consultarlas."""
+    try:
+        contenedoras = select(VecinoCancion.cancion_id).where(VecinoCancion.vecino_id == cancion_id)
+        session.execute(
+            delete(VecinoCancion).where(
+                (VecinoCancion.cancion_id == cancion_id) | VecinoCancion.cancion_id.in_(contenedoras)
+            )
+        )
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error descartando listas de {cancion_id}: {e}")
+
+
+def limpiar_vecinos(session: Session) -> None:
+    """Borra todas las listas; se vuelven a calcular al consultarlas."""
+    try:
+        session.execute(delete(VecinoCancion))
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error limpiando vecinos: {e}")
@@ -0,0 +1,51 @@
+import os
+import json
+import base64
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import or_
+
+# Filas por página si el cliente no pide otra cantidad, y tope que puede pedir
+LIMITE_PAGINA = int(os.getenv("LIMITE_PAGINA", "50"))
+LIMITE_MAXIMO = int(os.getenv("LIMITE_PAGINA_MAXIMO", "500"))
+
+
+def codificar_cursor(fila) -> str:
+    """Cursor opaco con la posición (creado_en, id) de la última fila entregada."""
+    crudo = json.dumps([fila.creado_en.isoformat(), fila.id])
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> tuple:
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        creado_en, id_ = json.loads(crudo)
+        return datetime.fromisoformat(creado_en), id_
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido")
+
+
+def paginar(consulta, modelo, limite: int, cursor: Optional[str] = None):
+    """Ordena la consulta por (creado_en, id) descendente y la corta después del cursor.
+
+    Es paginación por clave (keyset): cada página es un recorrido acotado del índice
+    (creado_en, id) que arranca donde terminó la anterior, así que la página N cuesta
+    lo mismo que la primera. Se pide una fila de más para saber si hay siguiente.
+    """
+    if cursor:
+        creado_en, id_ = decodificar_cursor(cursor)
+        consulta = consulta.where(
+            modelo.creado_en <= creado_en,
+            or_(modelo.creado_en < creado_en, modelo.id < id_)
+        )
+    return consulta.order_by(modelo.creado_en.desc(), modelo.id.desc()).limit(limite + 1)
+
+
+def cortar_pagina(filas, limite: int) -> tuple:
+    """(filas de la página, cursor de la siguiente o None si es la última)."""
+    filas = list(filas)
+    if len(filas) > limite:
+        filas = filas[:limite]
+        return filas, codificar_cursor(filas[-1])
+    return filas, None
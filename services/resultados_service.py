@@ -0,0 +1,98 @@
+import hashlib
+import logging
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from models import AnalisisResultado, SolicitudAnalisis
+from services.tendencias_service import registrar_resultados
+
+# Cambiarla cuando cambie la fórmula de afinidad: invalida todas las versiones guardadas
+VERSION_FORMULA = "1"
+
+# Canciones por consulta al buscar versiones existentes (cota de parámetros del IN)
+CANCIONES_POR_CONSULTA = 500
+
+logger = logging.getLogger(__name__)
+
+
+def entradas_cancion(tempo, energy, danceability, valence) -> str:
+    """Forma canónica de las métricas de una canción que entran en la afinidad (nulos como 0)."""
+    return "|".join(repr(float(v or 0)) for v in (tempo, energy, danceability, valence))
+
+
+def entradas_benchmark(benchmark) -> str:
+    return entradas_cancion(
+        benchmark.tempo_promedio, benchmark.energy_promedio,
+        benchmark.danceability_promedio, benchmark.valence_promedio
+    )
+
+
+def hash_entradas(entradas_c: str, entradas_b: str) -> str:
+    """Hash de las entradas de un par canción-benchmark; cambia si cambia cualquiera de las dos."""
+    return hashlib.sha1(f"{VERSION_FORMULA}#{entradas_c}#{entradas_b}".encode()).hexdigest()
+
+
+def versiones_existentes(session: Session, cancion_ids: list) -> set:
+    """{(cancion_id, benchmark_id, hash)} ya guardados para estas canciones."""
+    existentes = set()
+    for inicio in range(0, len(cancion_ids), CANCIONES_POR_CONSULTA):
+        existentes.update(session.exec(
+            select(AnalisisResultado.cancion_id, AnalisisResultado.benchmark_id, AnalisisResultado.hash_entradas)
+            .where(AnalisisResultado.cancion_id.in_(cancion_ids[inicio:inicio + CANCIONES_POR_CONSULTA]))
+            .where(AnalisisResultado.hash_entradas != None)
+        ).all())
+    return existentes
+
+
+def version_repetida(error: IntegrityError) -> bool:
+    """Si la violación es de ux_analisisresultado_version (y no de otra restricción)."""
+    mensaje = str(error.orig)
+    # PostgreSQL nombra el índice; SQLite lista sus columnas
+    return "ux_analisisresultado_version" in mensaje or "analisisresultado.hash_entradas" in mensaje
+
+
+def registrar_solicitud(session: Session, cancion_id: Optional[str], origen: str, benchmarks: int, nuevos: int):
+    session.add(SolicitudAnalisis(cancion_id=cancion_id, origen=origen, benchmarks=benchmarks, nuevos=nuevos))
+
+
+def guardar_analisis(session: Session, cancion, benchmarks: list, resultados: list, origen: str) -> int:
+    """Guarda los resultados de una canción que aún no existan para estas entradas y registra la solicitud.
+
+    Si las métricas de la canción y del benchmark no cambiaron desde el último análisis,
+    el resultado ya está guardado y no se escribe nada. Los resúmenes diarios de
+    tendencias se actualizan en la misma transacción. Devuelve cuántos resultados
+    nuevos se insertaron. Hace commit.
+    """
+    cancion_id = cancion.id
+    entradas_c = entradas_cancion(cancion.tempo, cancion.energy, cancion.danceability, cancion.valence)
+    existentes = versiones_existentes(session, [cancion_id])
+
+    nuevos = []
+    for benchmark, analisis in zip(benchmarks, resultados):
+        version = hash_entradas(entradas_c, entradas_benchmark(benchmark))
+        if (cancion_id, benchmark.id, version) not in existentes:
+            nuevos.append(AnalisisResultado(
+                cancion_id=cancion_id,
+                benchmark_id=benchmark.id,
+                afinidad=analisis["afinidad"],
+                hallazgo=analisis["nivel"],
+                hash_entradas=version
+            ))
+
+    try:
+        session.add_all(nuevos)
+        registrar_resultados(session, [(r.benchmark_id, r.creado_en, r.afinidad) for r in nuevos])
+        registrar_solicitud(session, cancion_id, origen, len(benchmarks), len(nuevos))
+        session.commit()
+        return len(nuevos)
+    except IntegrityError as e:
+        session.rollback()
+        if not version_repetida(e):
+            raise
+        # Otra solicitud guardó la misma versión al mismo tiempo: solo queda el registro
+        logger.info(f"Resultados de {cancion_id} ya guardados por otra solicitud")
+        registrar_solicitud(session, cancion_id, origen, len(benchmarks), 0)
+        session.commit()
+        return 0
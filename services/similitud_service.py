@@ -0,0 +1,280 @@
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from sqlmodel import Session, select, func
+
+from models import Cancion
+from services.contadores_service import version_catalogo
+
+# Orden de las columnas de la matriz de métricas
+COLUMNAS = ("tempo", "energy", "danceability", "valence", "acousticness")
+TEMPO, ENERGY, DANCE, VALENCE, ACOUSTIC = range(len(COLUMNAS))
+
+# Segundos que una matriz cargada se considera vigente (cubre escrituras de otros workers)
+MATRIZ_TTL = float(os.getenv("MATRIZ_CANCIONES_TTL", "300"))
+
+
+class MatrizCanciones:
+    """Instantánea inmutable de las métricas de las canciones activas."""
+
+    def __init__(self, ids: np.ndarray, valores: np.ndarray, nulos: np.ndarray, version: Optional[int] = None):
+        self.ids = ids
+        # Versión del catálogo (ver version_catalogo) que refleja; None si no se conoce
+        self.version = version
+        # Por columnas: cada métrica queda contigua en memoria para las operaciones vectorizadas
+        self.valores = np.asfortranarray(valores)
+        self.nulos = np.asfortranarray(nulos)
+        self.posiciones = {cid: i for i, cid in enumerate(ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def de_canciones(cls, canciones: list) -> "MatrizCanciones":
+        """Matriz pequeña armada a partir de objetos Cancion ya cargados."""
+        vectores = [vector_cancion(c) for c in canciones]
+        return cls(
+            np.array([c.id for c in canciones], dtype=object),
+            np.array([v for v, _ in vectores]).reshape(len(canciones), len(COLUMNAS)),
+            np.array([n for _, n in vectores], dtype=bool).reshape(len(canciones), len(COLUMNAS))
+        )
+
+    def con_cancion(self, cancion: Cancion) -> "MatrizCanciones":
+        """Devuelve una copia con la canción insertada, actualizada o retirada.
+
+        La copia queda una versión por delante: cada escritura de canciones sube la del
+        catálogo en uno. Si en el medio escribió otro proceso, la diferencia se nota al
+        compararla con version_catalogo.
+        """
+        pos = self.posiciones.get(cancion.id)
+        version = self.version + 1 if self.version is not None else None
+        if cancion.deleted_at:
+            if pos is None:
+                return MatrizCanciones(self.ids, self.valores, self.nulos, version)
+            return MatrizCanciones(
+                np.delete(self.ids, pos),
+                np.delete(self.valores, pos, axis=0),
+                np.delete(self.nulos, pos, axis=0),
+                version
+            )
+
+        valores, nulos = vector_cancion(cancion)
+        if pos is None:
+            return MatrizCanciones(
+                np.append(self.ids, np.array([cancion.id], dtype=object)),
+                np.vstack([self.valores, valores]),
+                np.vstack([self.nulos, nulos]),
+                version
+            )
+
+        nuevos_valores = self.valores.copy()
+        nuevos_nulos = self.nulos.copy()
+        nuevos_valores[pos] = valores
+        nuevos_nulos[pos] = nulos
+        return MatrizCanciones(self.ids, nuevos_valores, nuevos_nulos, version)
+
+
+_matriz: Optional[MatrizCanciones] = None
+_cargada_en = 0.0
+# Sube con cada cambio; una carga que empezó antes de un cambio no se guarda
+_version = 0
+_lock = threading.Lock()
+
+
+def vector_cancion(cancion) -> tuple:
+    """Métricas de una canción como vector (nulos en 0) y su máscara de nulos."""
+    crudos = [getattr(cancion, col, None) for col in COLUMNAS]
+    nulos = np.array([v is None for v in crudos], dtype=bool)
+    valores = np.array([v or 0 for v in crudos], dtype=np.float64)
+    return valores, nulos
+
+
+def cargar_matriz(session: Session) -> MatrizCanciones:
+    """Lee las métricas de todas las canciones activas en una sola consulta.
+
+    La versión se lee antes que las filas: si una escritura se cuela en el medio, la
+    matriz queda marcada con una versión vieja y se la trata como desactualizada.
+    """
+    version = version_catalogo(session)
+    filas = session.exec(
+        select(Cancion.id, *[getattr(Cancion, col) for col in COLUMNAS])
+        .where(Cancion.deleted_at == None)
+    ).all()
+
+    ids = np.array([f[0] for f in filas], dtype=object)
+    crudos = np.array([f[1:] for f in filas], dtype=object).reshape(len(filas), len(COLUMNAS))
+    nulos = np.equal(crudos, None)
+    valores = np.where(nulos, 0, crudos).astype(np.float64)
+    return MatrizCanciones(ids, valores, nulos, version)
+
+
+def obtener_matriz(session: Session) -> MatrizCanciones:
+    """Matriz compartida del proceso; se recarga si no existe o venció el TTL.
+
+    La consulta y la conversión corren fuera del lock: los demás hilos del pool siguen
+    usando la matriz vigente (o cargando la suya) en lugar de esperar esta lectura.
+    """
+    global _matriz, _cargada_en
+    with _lock:
+        if _matriz is not None and time.monotonic() - _cargada_en <= MATRIZ_TTL:
+            return _matriz
+        version = _version
+
+    matriz = cargar_matriz(session)
+    with _lock:
+        if _version == version:
+            _matriz = matriz
+            _cargada_en = time.monotonic()
+    return matriz
+
+
+def total_activas(session: Session, excluir: Optional[str] = None) -> int:
+    """Canciones activas sin contar `excluir`; usa la matriz si ya está cargada para no contar en la base.
+
+    `excluir` solo resta si está entre las activas de la fuente usada.
+    """
+    with _lock:
+        if _matriz is not None and time.monotonic() - _cargada_en <= MATRIZ_TTL:
+            return len(_matriz) - (excluir in _matriz.posiciones)
+    consulta = select(func.count()).select_from(Cancion).where(Cancion.deleted_at == None)
+    if excluir is not None:
+        consulta = consulta.where(Cancion.id != excluir)
+    return session.exec(consulta).one()
+
+
+def actualizar_matriz(cancion: Cancion) -> None:
+    """Refleja en la matriz compartida una canción creada, editada, eliminada o restaurada."""
+    global _matriz, _version
+    with _lock:
+        _version += 1
+        if _matriz is not None:
+            _matriz = _matriz.con_cancion(cancion)
+
+
+def invalidar_matriz() -> None:
+    """Descarta la matriz compartida; la próxima lectura la recarga."""
+    global _matriz, _version
+    with _lock:
+        _version += 1
+        _matriz = None
+
+
+def calcular_similitudes(
+        matriz: MatrizCanciones,
+        valores: np.ndarray,
+        nulos: np.ndarray,
+        filas: Optional[np.ndarray] = None
+) -> dict:
+    """Similitud de una canción base contra todas las filas (o solo `filas`), en una sola pasada.
+
+    Mismos pesos que la versión fila a fila: tempo 0.3, energy 0.3, danceability 0.2
+    y valence 0.2; si danceability o valence falta en alguna de las dos canciones,
+    esa componente vale 0.5.
+
+    Con `valores`/`nulos` de forma (S, columnas) calcula S bases a la vez y cada
+    arreglo del resultado queda de forma (S, filas).
+    """
+    m = matriz.valores if filas is None else matriz.valores[filas]
+    m_nulos = matriz.nulos if filas is None else matriz.nulos[filas]
+
+    def base(arreglo, columna):
+        # (1,) para una base, (S, 1) para varias: se difunde contra las filas
+        return arreglo[..., columna, None]
+
+    sim_tempo = np.maximum(0, 1 - np.abs(m[:, TEMPO] - base(valores, TEMPO)) / 200)
+    sim_energy = np.maximum(0, 1 - np.abs(m[:, ENERGY] - base(valores, ENERGY)))
+    sim_dance = np.where(
+        m_nulos[:, DANCE] | base(nulos, DANCE),
+        0.5,
+        np.maximum(0, 1 - np.abs(m[:, DANCE] - base(valores, DANCE)))
+    )
+    sim_valence = np.where(
+        m_nulos[:, VALENCE] | base(nulos, VALENCE),
+        0.5,
+        np.maximum(0, 1 - np.abs(m[:, VALENCE] - base(valores, VALENCE)))
+    )
+
+    total = (sim_tempo * 0.3 + sim_energy * 0.3 + sim_dance * 0.2 + sim_valence * 0.2) * 100
+
+    return {
+        "tempo": sim_tempo,
+        "energy": sim_energy,
+        "danceability": sim_dance,
+        "valence": sim_valence,
+        "total": total
+    }
+
+
+def redondear(valores, decimales: int = 1) -> np.ndarray:
+    """round() de Python elemento a elemento, vectorizado.
+
+    np.round escala por 10**decimales y redondea ese producto, así que en los casos
+    x.x5 puede quedar del otro lado que round() (que redondea el valor binario exacto):
+    86.45 da 86.4 con uno y 86.5 con el otro. Esos casos se recalculan con round() para
+    que el orden coincida siempre con lo que se muestra y se guarda.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    resultado = np.round(valores, decimales)
+    fraccion = np.abs(valores * 10.0 ** decimales) % 1
+    for i in np.flatnonzero(np.abs(fraccion - 0.5) < 1e-6):
+        resultado.flat[i] = round(float(valores.flat[i]), decimales)
+    return resultado
+
+
+def seleccionar_top(puntajes: np.ndarray, k: int, excluir=None) -> np.ndarray:
+    """Índices de los k mayores puntajes (redondeados a 1 decimal), sin ordenar todo.
+
+    `excluir` es una fila o lista de filas a omitir. Los empates se resuelven por
+    posición, igual que un sort estable sobre la lista completa.
+    """
+    claves = redondear(puntajes, 1)
+    excluidas = np.unique(np.atleast_1d(np.asarray([] if excluir is None else excluir, dtype=np.intp)))
+    claves[excluidas] = -np.inf
+    disponibles = len(claves) - len(excluidas)
+    k = max(0, min(k, disponibles))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+
+    # Valor del k-ésimo mejor; todo lo que lo supera entra seguro
+    umbral = np.partition(claves, len(claves) - k)[len(claves) - k]
+    mejores = np.flatnonzero(claves > umbral)
+    empatados = np.flatnonzero(claves == umbral)[:k - len(mejores)]
+    indices = np.concatenate([mejores, empatados])
+
+    # lexsort ordena por la última clave: afinidad desc y luego posición asc
+    return indices[np.lexsort((indices, -claves[indices]))]
+
+
+def centroide_canciones(valores: np.ndarray, nulos: np.ndarray) -> tuple:
+    """Promedio por columna de varias canciones ignorando nulos (nulo si todas lo son)."""
+    presentes = (~nulos).sum(axis=0)
+    sumas = np.where(nulos, 0, valores).sum(axis=0)
+    nulos_centro = presentes == 0
+    return np.where(nulos_centro, 0, sumas / np.maximum(presentes, 1)), nulos_centro
+
+
+def top_lote(
+        matriz: MatrizCanciones,
+        valores: np.ndarray,
+        nulos: np.ndarray,
+        k: int,
+        excluir: list,
+        max_elementos: int = 1_000_000
+) -> list:
+    """Top-k de varias canciones base contra el catálogo, por bloques de bases.
+
+    Cada bloque es una sola operación matricial (bases × catálogo); `max_elementos`
+    acota la memoria de esa matriz. `excluir[s]` es la fila a omitir para la base s.
+    """
+    por_bloque = max(1, max_elementos // max(len(matriz), 1))
+    resultado = []
+    for inicio in range(0, len(valores), por_bloque):
+        totales = calcular_similitudes(
+            matriz, valores[inicio:inicio + por_bloque], nulos[inicio:inicio + por_bloque]
+        )["total"]
+        for s, fila in enumerate(totales):
+            resultado.append(seleccionar_top(fila, k, excluir=excluir[inicio + s]))
+    return resultado
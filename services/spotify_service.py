@@ -1,16 +1,56 @@
 import os
-import requests
+import json
+import time
+import asyncio
 import base64
+import logging
+import threading
+from typing import Optional
+
+import httpx
+import requests
 from dotenv import load_dotenv
 
+from services.cache_service import CacheTTL
+
 load_dotenv()
 
 CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 
+# Se pueden apuntar a un Spotify simulado (ver benchmarks/spotify_simulado.py)
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1")
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com")
 
-def get_spotify_token() -> str:
-    """Obtiene token de Spotify con client credentials."""
+# Timeout por llamada (segundos) y conexiones abiertas como máximo hacia la API
+SPOTIFY_TIMEOUT = float(os.getenv("SPOTIFY_TIMEOUT", "10"))
+SPOTIFY_CONEXIONES = int(os.getenv("SPOTIFY_CONEXIONES", "50"))
+
+# Máximo de ids por llamada a /audio-features?ids= (límite de la API)
+IDS_POR_LOTE = 100
+
+# Caché de respuestas: entradas en memoria (0 la apaga) y archivo SQLite opcional
+SPOTIFY_CACHE_ENTRADAS = int(os.getenv("SPOTIFY_CACHE_ENTRADAS", "5000"))
+SPOTIFY_CACHE_ARCHIVO = os.getenv("SPOTIFY_CACHE_ARCHIVO")
+
+# TTL por recurso (segundos); pasado el TTL se sirve vencido otro tanto mientras se revalida
+TTL_POR_RECURSO = {
+    "/search": float(os.getenv("SPOTIFY_CACHE_TTL_BUSQUEDA", "600")),
+    "/tracks/": float(os.getenv("SPOTIFY_CACHE_TTL_ENTIDADES", "21600")),
+    "/artists/": float(os.getenv("SPOTIFY_CACHE_TTL_ENTIDADES", "21600")),
+    "/audio-features/": float(os.getenv("SPOTIFY_CACHE_TTL_FEATURES", "604800")),
+}
+
+# Segundos antes de expires_in en que el token se deja de usar...
+TOKEN_MARGEN = float(os.getenv("SPOTIFY_TOKEN_MARGEN", "60"))
+# ...y ventana previa en la que se renueva en segundo plano mientras se sigue entregando
+TOKEN_RENOVAR_ANTES = float(os.getenv("SPOTIFY_TOKEN_RENOVAR_ANTES", "300"))
+
+logger = logging.getLogger(__name__)
+
+
+def _pedir_token() -> tuple:
+    """POST de client credentials; devuelve (token, instante monotónico en que deja de usarse)."""
     if not CLIENT_ID or not CLIENT_SECRET:
         raise ValueError("❌ Faltan credenciales Spotify")
 
@@ -23,14 +63,273 @@ def get_spotify_token() -> str:
     }
     data = {'grant_type': 'client_credentials'}
 
+    pedido_en = time.monotonic()
     response = requests.post(
-        'https://accounts.spotify.com/api/token',
+        f'{SPOTIFY_ACCOUNTS_URL}/api/token',
         headers=headers,
         data=data,
         timeout=10
     )
 
     if response.status_code == 200:
-        return response.json()['access_token']
+        datos = response.json()
+        return datos['access_token'], pedido_en + float(datos.get('expires_in', 3600)) - TOKEN_MARGEN
     else:
-        raise Exception(f"Error Spotify: {response.status_code}")
\ No newline at end of file
+        raise Exception(f"Error Spotify: {response.status_code}")
+
+
+_token: Optional[str] = None
+_vence_en = 0.0
+_renovando = False
+_lock = threading.Lock()
+
+
+def _renovar_en_segundo_plano():
+    global _token, _vence_en, _renovando
+    try:
+        token, vence_en = _pedir_token()
+        with _lock:
+            _token, _vence_en = token, vence_en
+    except Exception as e:
+        logger.error(f"Error renovando token de Spotify: {e}")
+    finally:
+        _renovando = False
+
+
+def get_spotify_token() -> str:
+    """Token de Spotify (client credentials) compartido por todo el proceso.
+
+    Se reutiliza hasta TOKEN_MARGEN segundos antes de expires_in. En los últimos
+    TOKEN_RENOVAR_ANTES segundos se sigue entregando mientras un hilo pide el nuevo, así
+    que las solicitudes no esperan el POST salvo la primera o si el token ya venció; en
+    ese caso solo un hilo lo pide y el resto espera en el lock y usa el mismo.
+    """
+    global _token, _vence_en, _renovando
+    with _lock:
+        restante = _vence_en - time.monotonic()
+        if _token is not None and restante > 0:
+            if restante <= TOKEN_RENOVAR_ANTES and not _renovando:
+                _renovando = True
+                threading.Thread(target=_renovar_en_segundo_plano, daemon=True).start()
+            return _token
+
+        _token, _vence_en = _pedir_token()
+        return _token
+
+
+# ========== CLIENTE HTTP COMPARTIDO ==========
+
+def clave_cache(ruta: str, params: Optional[dict] = None) -> str:
+    """Misma clave para consultas equivalentes: parámetros ordenados y el texto de búsqueda
+    en minúsculas y sin espacios repetidos (tipo, mercado y límite quedan tal cual)."""
+    partes = []
+    for nombre, valor in sorted((params or {}).items()):
+        valor = " ".join(str(valor).lower().split()) if nombre == "q" else str(valor)
+        partes.append(f"{nombre}={valor}")
+    return f"{ruta}?{'&'.join(partes)}"
+
+
+def _ttl_recurso(ruta: str) -> Optional[float]:
+    return next((ttl for prefijo, ttl in TTL_POR_RECURSO.items() if ruta.startswith(prefijo)), None)
+
+
+def _http2_disponible() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ClienteSpotify:
+    """Cliente de la Web API de Spotify sobre un único httpx.AsyncClient.
+
+    Mantiene las conexiones abiertas entre solicitudes (keep-alive, y HTTP/2 si está
+    instalado h2, que multiplexa todo sobre una sola conexión TLS), así que solo la
+    primera llamada paga el handshake. Cada llamada tiene timeout; se puede ajustar
+    por llamada. Con `cache`, las respuestas exitosas de TTL_POR_RECURSO se reutilizan.
+
+    Las llamadas idénticas que coinciden en el tiempo se combinan (single-flight): la
+    primera sale hacia Spotify y las demás esperan esa misma respuesta.
+    """
+
+    def __init__(self, base_url: str = SPOTIFY_API_URL, timeout: float = SPOTIFY_TIMEOUT,
+                 conexiones: int = SPOTIFY_CONEXIONES, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 cache: Optional[CacheTTL] = None):
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            http2=_http2_disponible(),
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=conexiones, max_keepalive_connections=conexiones),
+            transport=transport
+        )
+        self.cache = cache
+        # Revalidaciones en curso por clave (una sola por clave, y referencia a la tarea)
+        self._revalidando = {}
+        # Llamadas en vuelo por clave y cuántas solicitudes se sumaron a una ya en vuelo
+        self._en_vuelo = {}
+        self.compartidas = 0
+
+    async def get(self, ruta: str, token: str, params: Optional[dict] = None,
+                  timeout: Optional[float] = None) -> httpx.Response:
+        clave = clave_cache(ruta, params)
+        ttl = _ttl_recurso(ruta) if self.cache else None
+        if ttl is None:
+            return await self._una_vez(clave, lambda: self._pedir(ruta, token, params, timeout))
+
+        encontrado = await self.cache.obtener(clave)
+        if encontrado is not None:
+            contenido, vencido = encontrado
+            if vencido:
+                self._revalidar(clave, self._refrescar(clave, ruta, token, params, ttl))
+            return httpx.Response(200, content=contenido, headers={"content-type": "application/json"})
+
+        return await self._una_vez(clave, lambda: self._refrescar(clave, ruta, token, params, ttl, timeout))
+
+    async def _una_vez(self, clave, pedir):
+        """Resultado de `pedir()`, o el de la llamada con la misma clave que ya está en vuelo."""
+        tarea = self._en_vuelo.get(clave)
+        if tarea is None:
+            tarea = asyncio.ensure_future(pedir())
+            self._registrar_en_vuelo(clave, tarea)
+        else:
+            self.compartidas += 1
+        # shield: si quien esperaba se desconecta, la llamada sigue para los demás
+        return await asyncio.shield(tarea)
+
+    def _registrar_en_vuelo(self, clave, tarea: asyncio.Future):
+        def terminar(t):
+            if self._en_vuelo.get(clave) is t:
+                del self._en_vuelo[clave]
+            if not t.cancelled():
+                t.exception()  # ya la recibieron quienes esperaban; evita el aviso de no leída
+
+        self._en_vuelo[clave] = tarea
+        tarea.add_done_callback(terminar)
+
+    async def _refrescar(self, clave: str, ruta: str, token: str, params: Optional[dict], ttl: float,
+                         timeout: Optional[float] = None) -> httpx.Response:
+        respuesta = await self._pedir(ruta, token, params, timeout)
+        if respuesta.status_code == 200:
+            await self.cache.guardar(clave, respuesta.content, ttl, ttl)
+        return respuesta
+
+    def _revalidar(self, clave: str, corrutina):
+        """Corre la revalidación en segundo plano, salvo que esa clave ya tenga una en curso."""
+        if clave in self._revalidando:
+            corrutina.close()
+            return
+
+        async def revalidar():
+            try:
+                await corrutina
+                self.cache.contadores["revalidaciones"] += 1
+            except Exception as e:
+                logger.warning(f"No se pudo revalidar {clave}: {e}")
+            finally:
+                self._revalidando.pop(clave, None)
+
+        self._revalidando[clave] = asyncio.create_task(revalidar())
+
+    async def _pedir(self, ruta: str, token: str, params: Optional[dict] = None,
+                     timeout: Optional[float] = None) -> httpx.Response:
+        return await self.http.get(
+            ruta,
+            params=params,
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+        )
+
+    async def audio_features(self, token: str, ids: list) -> dict:
+        """{id: features o None} de varias pistas con una llamada por cada IDS_POR_LOTE ids.
+
+        Con caché, cada pista se guarda por separado y solo se piden las que faltan; las
+        vencidas se entregan y se piden juntas en segundo plano. Los lotes van en paralelo.
+        Si el endpoint por lotes falla (p. ej. no está habilitado para la app), ese lote se
+        pide pista por pista, también en paralelo.
+        """
+        ids = list(dict.fromkeys(ids))
+        resultados, faltantes, vencidos = {}, [], []
+        for id_ in ids:
+            encontrado = await self.cache.obtener(clave_cache(f"/audio-features/{id_}")) if self.cache else None
+            if encontrado is None:
+                faltantes.append(id_)
+                continue
+            contenido, vencido = encontrado
+            resultados[id_] = json.loads(contenido)
+            if vencido:
+                vencidos.append(id_)
+
+        if vencidos:
+            self._revalidar("audio-features:" + ",".join(vencidos), self._buscar_audio_features(token, vencidos))
+
+        # Las pistas que otra solicitud ya está pidiendo se esperan; el resto va en lotes nuevos
+        esperar, nuevos = {}, []
+        for id_ in faltantes:
+            tarea = self._en_vuelo.get(("audio-features", id_))
+            if tarea is None:
+                nuevos.append(id_)
+            else:
+                esperar.setdefault(tarea, []).append(id_)
+                self.compartidas += 1
+        if nuevos:
+            tarea = asyncio.ensure_future(self._buscar_audio_features(token, nuevos))
+            for id_ in nuevos:
+                self._registrar_en_vuelo(("audio-features", id_), tarea)
+            esperar[tarea] = nuevos
+
+        parciales = await asyncio.gather(*(asyncio.shield(tarea) for tarea in esperar))
+        for parcial, ids_tarea in zip(parciales, esperar.values()):
+            resultados.update({id_: parcial.get(id_) for id_ in ids_tarea})
+        return {id_: resultados.get(id_) for id_ in ids}
+
+    async def _buscar_audio_features(self, token: str, ids: list) -> dict:
+        lotes = [ids[i:i + IDS_POR_LOTE] for i in range(0, len(ids), IDS_POR_LOTE)]
+        resultados = {}
+        for parcial in await asyncio.gather(*(self._audio_features_lote(token, lote) for lote in lotes)):
+            resultados.update(parcial)
+        if self.cache:
+            ttl = TTL_POR_RECURSO["/audio-features/"]
+            for id_, features in resultados.items():
+                if features:
+                    await self.cache.guardar(clave_cache(f"/audio-features/{id_}"), json.dumps(features).encode(), ttl, ttl)
+        return resultados
+
+    async def _audio_features_lote(self, token: str, ids: list) -> dict:
+        respuesta = await self._pedir("/audio-features", token, params={"ids": ",".join(ids)})
+        if respuesta.status_code == 200:
+            encontrados = {f["id"]: f for f in respuesta.json().get("audio_features") or [] if f}
+            return {id_: encontrados.get(id_) for id_ in ids}
+
+        logger.warning(f"audio-features por lotes respondió {respuesta.status_code}; se piden de a una")
+        respuestas = await asyncio.gather(*(self._pedir(f"/audio-features/{id_}", token) for id_ in ids))
+        return {id_: r.json() if r.status_code == 200 else None for id_, r in zip(ids, respuestas)}
+
+    async def cerrar(self):
+        await self.http.aclose()
+
+
+_cliente: Optional[ClienteSpotify] = None
+
+
+def abrir_cliente_spotify() -> ClienteSpotify:
+    """Crea el cliente compartido (al arrancar la app)."""
+    global _cliente
+    if _cliente is None:
+        cache = None
+        if SPOTIFY_CACHE_ENTRADAS > 0 or SPOTIFY_CACHE_ARCHIVO:
+            cache = CacheTTL(SPOTIFY_CACHE_ENTRADAS, SPOTIFY_CACHE_ARCHIVO)
+        _cliente = ClienteSpotify(cache=cache)
+    return _cliente
+
+
+async def cerrar_cliente_spotify():
+    global _cliente
+    if _cliente is not None:
+        await _cliente.cerrar()
+        _cliente = None
+
+
+async def get_cliente_spotify() -> ClienteSpotify:
+    """Dependencia: el cliente compartido (se crea si la app no pasó por el arranque)."""
+    return abrir_cliente_spotify()
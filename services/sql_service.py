@@ -0,0 +1,13 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def insert_dialecto(session, modelo):
+    """INSERT del motor de la sesión, con on_conflict_do_update / on_conflict_do_nothing.
+
+    SQLite (3.24+) y PostgreSQL aceptan el mismo ON CONFLICT (columnas) DO ..., así que
+    las escrituras concurrentes sobre un índice único se resuelven en la base en lugar
+    de un UPDATE/SELECT previo que otra transacción puede ganar.
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(modelo)
+    return sqlite.insert(modelo)
@@ -0,0 +1,178 @@
+import logging
+from datetime import datetime, date, time, timedelta
+from typing import Iterable
+
+from sqlalchemy import Date, Integer, case, delete, insert, literal, union_all
+from sqlmodel import Session, select, func
+
+from models import AnalisisResultado, Benchmark, TendenciaDiaria, Configuracion
+from services.sql_service import insert_dialecto
+
+# Niveles de tendencia y el umbral exclusivo de afinidad de cada uno (BAJO es el resto)
+NIVELES = ("EXCELENTE", "BUENO", "REGULAR", "BAJO")
+UMBRALES = ((80, "EXCELENTE"), (60, "BUENO"), (40, "REGULAR"))
+
+# Clave en Configuracion que marca que los resúmenes ya cubren el historial previo
+CLAVE_RECONSTRUIDA = "tendencias_diarias_reconstruidas"
+
+logger = logging.getLogger(__name__)
+
+
+def nivel_tendencia(afinidad: float) -> str:
+    for umbral, nivel in UMBRALES:
+        if afinidad > umbral:
+            return nivel
+    return "BAJO"
+
+
+def _marcas_niveles(afinidad) -> list:
+    """Expresiones SQL que valen 1 si la fila cae en cada nivel, en el orden de NIVELES."""
+    condiciones = [
+        afinidad > 80,
+        (afinidad > 60) & (afinidad <= 80),
+        (afinidad > 40) & (afinidad <= 60),
+        afinidad <= 40
+    ]
+    return [case((condicion, 1), else_=0) for condicion in condiciones]
+
+
+def registrar_resultados(session: Session, resultados: Iterable[tuple]) -> None:
+    """Suma a los resúmenes diarios los resultados nuevos [(benchmark_id, creado_en, afinidad)].
+
+    No hace commit: va en la misma transacción que la escritura de los resultados.
+    """
+    acumulados = {}
+    for benchmark_id, creado_en, afinidad in resultados:
+        fila = acumulados.setdefault((creado_en.date(), benchmark_id), [0, 0.0] + [0] * len(NIVELES))
+        fila[0] += 1
+        fila[1] += afinidad
+        fila[2 + NIVELES.index(nivel_tendencia(afinidad))] += 1
+
+    if not acumulados:
+        return
+
+    # Upsert: dos transacciones que abren el mismo día y benchmark suman ambas en lugar
+    # de chocar en ux_tendenciadiaria_dia_benchmark
+    sentencia = insert_dialecto(session, TendenciaDiaria).values([
+        {
+            "benchmark_id": benchmark_id, "dia": dia, "total": total, "suma_afinidad": suma,
+            "excelente": excelente, "bueno": bueno, "regular": regular, "bajo": bajo
+        }
+        for (dia, benchmark_id), (total, suma, excelente, bueno, regular, bajo) in acumulados.items()
+    ])
+    session.execute(sentencia.on_conflict_do_update(
+        index_elements=["dia", "benchmark_id"],
+        set_={
+            columna: getattr(TendenciaDiaria, columna) + getattr(sentencia.excluded, columna)
+            for columna in ("total", "suma_afinidad", "excelente", "bueno", "regular", "bajo")
+        }
+    ))
+
+
+def reconstruir_tendencias(session: Session, forzar: bool = False) -> bool:
+    """Recalcula todos los resúmenes diarios desde AnalisisResultado con un INSERT ... SELECT.
+
+    Primero toma la marca de reconstrucción (upsert y luego FOR UPDATE; en SQLite el
+    upsert ya toma el lock de escritura) y la vuelve a mirar dentro de la transacción:
+    si otro worker terminó la reconstrucción mientras tanto, no se repite salvo con
+    forzar=True. Devuelve si reconstruyó.
+    """
+    sentencia = insert_dialecto(session, Configuracion).values(clave=CLAVE_RECONSTRUIDA, valor="")
+    session.execute(sentencia.on_conflict_do_nothing(index_elements=["clave"]))
+    marca = session.exec(
+        select(Configuracion).where(Configuracion.clave == CLAVE_RECONSTRUIDA).with_for_update()
+    ).one()
+    if marca.valor and not forzar:
+        session.rollback()
+        return False
+
+    dia = func.date(AnalisisResultado.creado_en, type_=Date)
+    session.execute(delete(TendenciaDiaria))
+    session.execute(
+        insert(TendenciaDiaria).from_select(
+            ["dia", "benchmark_id", "total", "suma_afinidad", "excelente", "bueno", "regular", "bajo"],
+            select(
+                dia,
+                AnalisisResultado.benchmark_id,
+                func.count(AnalisisResultado.id),
+                func.sum(AnalisisResultado.afinidad),
+                *[func.sum(marca) for marca in _marcas_niveles(AnalisisResultado.afinidad)]
+            ).group_by(dia, AnalisisResultado.benchmark_id)
+        )
+    )
+
+    marca.valor = datetime.utcnow().isoformat()
+    session.add(marca)
+    session.commit()
+    return True
+
+
+def preparar_tendencias(session: Session) -> None:
+    """Al arrancar: si los resúmenes nunca se construyeron, los arma a partir del historial."""
+    marca = session.exec(select(Configuracion).where(Configuracion.clave == CLAVE_RECONSTRUIDA)).first()
+    if (marca is None or not marca.valor) and reconstruir_tendencias(session):
+        logger.info("Resúmenes diarios de tendencias reconstruidos")
+
+
+def tendencias_desde(session: Session, desde: datetime) -> list:
+    """Tendencia por benchmark de los resultados con creado_en >= desde, en una sola consulta.
+
+    Los días completos salen de los resúmenes y solo el día parcial del inicio de la
+    ventana se lee desde AnalisisResultado; ambas partes se unen, se agrupan por
+    benchmark y se cruzan con Benchmark para traer su nombre. Devuelve
+    [{"benchmark_id", "genero", "pais", "total", "afinidad_promedio", "niveles"}].
+    """
+    primer_dia = desde.date() if desde.time() == time.min else desde.date() + timedelta(days=1)
+    afinidad = AnalisisResultado.afinidad
+
+    partes = union_all(
+        select(
+            TendenciaDiaria.benchmark_id.label("benchmark_id"),
+            TendenciaDiaria.total.label("total"),
+            TendenciaDiaria.suma_afinidad.label("suma"),
+            TendenciaDiaria.excelente.label("excelente"),
+            TendenciaDiaria.bueno.label("bueno"),
+            TendenciaDiaria.regular.label("regular"),
+            TendenciaDiaria.bajo.label("bajo")
+        ).where(TendenciaDiaria.dia >= primer_dia),
+        select(
+            AnalisisResultado.benchmark_id,
+            literal(1, Integer),
+            afinidad,
+            *_marcas_niveles(afinidad)
+        )
+        .where(AnalisisResultado.creado_en >= desde)
+        .where(AnalisisResultado.creado_en < datetime.combine(primer_dia, time.min))
+    ).subquery()
+
+    total = func.sum(partes.c.total)
+    filas = session.exec(
+        select(
+            partes.c.benchmark_id,
+            Benchmark.genero,
+            Benchmark.pais,
+            total,
+            func.sum(partes.c.suma) / total,
+            func.sum(partes.c.excelente),
+            func.sum(partes.c.bueno),
+            func.sum(partes.c.regular),
+            func.sum(partes.c.bajo)
+        )
+        .select_from(partes)
+        .outerjoin(Benchmark, Benchmark.id == partes.c.benchmark_id)
+        .group_by(partes.c.benchmark_id, Benchmark.genero, Benchmark.pais)
+        .having(total > 0)
+        .order_by(partes.c.benchmark_id)
+    ).all()
+
+    return [
+        {
+            "benchmark_id": benchmark_id,
+            "genero": genero,
+            "pais": pais,
+            "total": cantidad,
+            "afinidad_promedio": promedio,
+            "niveles": dict(zip(NIVELES, niveles))
+        }
+        for benchmark_id, genero, pais, cantidad, promedio, *niveles in filas
+    ]
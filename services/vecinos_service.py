@@ -0,0 +1,372 @@
+import os
+import logging
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from services.similitud_service import (
+    MatrizCanciones, calcular_similitudes, seleccionar_top, redondear,
+    TEMPO, ENERGY, DANCE, VALENCE
+)
+
+# Peso de cada métrica en el espacio normalizado: la distancia L1 en este espacio es
+# (100 - similitud) / 100 cuando no hay nulos ni componentes recortadas (tempo a más de
+# 200 de distancia, métricas fuera de [0, 1]); en esos casos es solo una aproximación.
+PESOS_ESPACIO = {TEMPO: 0.3 / 200, ENERGY: 0.3, DANCE: 0.2, VALENCE: 0.2}
+_PESOS = np.array(list(PESOS_ESPACIO.values()))
+
+# Candidatos por resultado pedido que se re-puntúan con la fórmula exacta
+SOBREMUESTREO = int(os.getenv("VECINOS_SOBREMUESTREO", "4"))
+IVF_NPROBE = int(os.getenv("VECINOS_IVF_NPROBE", "8"))
+
+logger = logging.getLogger(__name__)
+
+
+def embeber(valores: np.ndarray, nulos: np.ndarray) -> np.ndarray:
+    """Proyecta métricas crudas al espacio normalizado (nulos en el punto medio)."""
+    valores = np.where(nulos, 0.5, valores)
+    columnas = list(PESOS_ESPACIO)
+    return valores[..., columnas] * np.array(list(PESOS_ESPACIO.values()))
+
+
+def _en_rango(puntos: np.ndarray) -> bool:
+    """Si energy, danceability y valence de los puntos embebidos están dentro de [0, 1]."""
+    return bool(((puntos[..., 1:] >= 0) & (puntos[..., 1:] <= _PESOS[1:])).all())
+
+
+def _top_l1(puntos: np.ndarray, vector: np.ndarray, k: int) -> np.ndarray:
+    distancias = np.abs(puntos - vector).sum(axis=1)
+    k = min(k, len(distancias))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    top = np.argpartition(distancias, k - 1)[:k]
+    return top[np.argsort(distancias[top], kind="stable")]
+
+
+class IndiceVecinos:
+    """Interfaz común de los motores de vecinos sobre el espacio normalizado."""
+
+    nombre = "base"
+
+    def __init__(self, puntos: np.ndarray):
+        self.puntos = puntos
+
+    def buscar(self, vector: np.ndarray, k: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def piso_excluidos(self, vector: np.ndarray, candidatos: np.ndarray) -> Optional[float]:
+        """Cota inferior de (100 - similitud) / 100 para las filas fuera de `candidatos`.
+
+        None si el motor no la garantiza (aproximado).
+        """
+        return None
+
+
+class IndiceKDTree(IndiceVecinos):
+    """Vecinos L1 en el espacio normalizado con un KD-tree de SciPy; recorrido completo si no está instalado.
+
+    El espacio normalizado aproxima la fórmula (nulos, tempo recortado); con
+    piso_excluidos buscar_similares comprueba que el top-k es el exacto y si no
+    recorre todo el catálogo.
+    """
+
+    nombre = "kdtree"
+
+    def __init__(self, puntos: np.ndarray):
+        super().__init__(puntos)
+        self.acotado = _en_rango(puntos)
+        try:
+            from scipy.spatial import cKDTree
+            self.arbol = cKDTree(puntos) if len(puntos) else None
+        except ImportError:
+            logger.warning("SciPy no instalado, kdtree usa recorrido completo")
+            self.arbol = None
+
+    def piso_excluidos(self, vector: np.ndarray, candidatos: np.ndarray) -> float:
+        """Las filas excluidas están a distancia L1 >= b, la mayor entre los candidatos.
+
+        La distancia real solo baja de la embebida cuando se recorta una componente:
+        tempo a 0.3 y, con métricas fuera de [0, 1], cualquiera a su peso (o a la mitad
+        si es nula, 0.1 como mínimo). Así la real es al menos min(b, 0.3) con todas las
+        métricas en rango y min(b, 0.1) si no.
+        """
+        if len(candidatos) >= len(self.puntos):
+            return np.inf
+        b = float(np.abs(self.puntos[candidatos] - vector).sum(axis=1).max())
+        return min(b, 0.3 if self.acotado and _en_rango(vector) else 0.1)
+
+    def buscar(self, vector: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, len(self.puntos))
+        if self.arbol is None or k == 0:
+            return _top_l1(self.puntos, vector, k)
+        _, indices = self.arbol.query(vector, k=k, p=1)
+        return np.atleast_1d(indices)
+
+
+class IndiceIVF(IndiceVecinos):
+    """Vecinos aproximados con un índice de archivo invertido (k-means + listas por centroide).
+
+    Cada consulta solo recorre las `nprobe` listas más cercanas, unas nprobe·√N filas.
+    """
+
+    nombre = "ann"
+
+    def __init__(
+            self,
+            puntos: np.ndarray,
+            nlist: Optional[int] = None,
+            nprobe: int = IVF_NPROBE,
+            iteraciones: int = 10,
+            muestra: int = 20000,
+            semilla: int = 0
+    ):
+        super().__init__(puntos)
+        n = len(puntos)
+        rng = np.random.default_rng(semilla)
+
+        entrenamiento = puntos[rng.choice(n, min(n, muestra), replace=False)] if n else puntos
+        self.nlist = max(1, min(nlist or int(np.sqrt(n)), len(entrenamiento)))
+        self.nprobe = max(1, min(nprobe, self.nlist))
+
+        if not n:
+            self.centroides = np.zeros((1, puntos.shape[1]))
+            self.orden = np.empty(0, dtype=np.intp)
+            self.inicios = np.zeros(2, dtype=np.intp)
+            return
+
+        centroides = entrenamiento[rng.choice(len(entrenamiento), self.nlist, replace=False)].copy()
+        for _ in range(iteraciones):
+            asignacion = self._mas_cercano(entrenamiento, centroides)
+            cuentas = np.bincount(asignacion, minlength=self.nlist)
+            sumas = np.zeros_like(centroides)
+            np.add.at(sumas, asignacion, entrenamiento)
+            llenos = cuentas > 0
+            centroides[llenos] = sumas[llenos] / cuentas[llenos, None]
+        self.centroides = centroides
+
+        # Listas invertidas: filas ordenadas por centroide y el inicio de cada lista
+        asignacion = self._mas_cercano(puntos, centroides)
+        self.orden = np.argsort(asignacion, kind="stable")
+        self.inicios = np.searchsorted(asignacion[self.orden], np.arange(self.nlist + 1))
+
+    @staticmethod
+    def _mas_cercano(puntos: np.ndarray, centroides: np.ndarray, bloque: int = 65536) -> np.ndarray:
+        # ||x - c||² = ||x||² - 2·x·c + ||c||²; ||x||² no cambia el argmin
+        normas = (centroides ** 2).sum(axis=1)
+        salida = np.empty(len(puntos), dtype=np.intp)
+        for inicio in range(0, len(puntos), bloque):
+            trozo = puntos[inicio:inicio + bloque]
+            salida[inicio:inicio + bloque] = np.argmin(normas - 2 * trozo @ centroides.T, axis=1)
+        return salida
+
+    def buscar(self, vector: np.ndarray, k: int, nprobe: Optional[int] = None) -> np.ndarray:
+        nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+        distancias = ((self.centroides - vector) ** 2).sum(axis=1)
+        sondas = np.argpartition(distancias, nprobe - 1)[:nprobe]
+        filas = np.concatenate([self.orden[self.inicios[c]:self.inicios[c + 1]] for c in sondas])
+        return filas[_top_l1(self.puntos[filas], vector, k)]
+
+
+MOTORES = {
+    IndiceKDTree.nombre: IndiceKDTree,
+    IndiceIVF.nombre: IndiceIVF
+}
+
+# Último índice construido por motor, como (matriz, índice), y motores con construcción en curso
+_indices = {}
+_construyendo = set()
+_lock = threading.Lock()
+# Avisa a quienes esperan la primera construcción de un motor que terminó (bien o mal)
+_construido = threading.Condition(_lock)
+
+
+def _construir(motor: str, matriz: MatrizCanciones) -> IndiceVecinos:
+    return MOTORES[motor](embeber(matriz.valores, matriz.nulos))
+
+
+def _reconstruir_en_segundo_plano(motor: str, matriz: MatrizCanciones):
+    try:
+        indice = _construir(motor, matriz)
+        with _lock:
+            _indices[motor] = (matriz, indice)
+    except Exception as e:
+        logger.error(f"Error reconstruyendo índice {motor}: {e}")
+    finally:
+        with _lock:
+            _construyendo.discard(motor)
+            _construido.notify_all()
+
+
+def obtener_indice(motor: str, matriz: MatrizCanciones) -> tuple:
+    """(matriz del índice, índice) del motor pedido.
+
+    La construcción nunca corre dentro del lock. Si la matriz cambió desde el último
+    índice, se sigue entregando el anterior junto con su propia matriz (las filas del
+    índice apuntan a esa) mientras un hilo construye el nuevo; varias escrituras seguidas
+    disparan una sola reconstrucción a la vez. Solo las consultas que llegan antes del
+    primer índice de cada motor esperan: una lo construye y las demás aguardan ese.
+    """
+    if motor not in MOTORES:
+        raise ValueError(f"Motor desconocido: {motor}")
+    with _lock:
+        while True:
+            cache = _indices.get(motor)
+            if cache is not None:
+                if cache[0] is not matriz and motor not in _construyendo:
+                    _construyendo.add(motor)
+                    threading.Thread(
+                        target=_reconstruir_en_segundo_plano, args=(motor, matriz), daemon=True
+                    ).start()
+                return cache
+            if motor not in _construyendo:
+                _construyendo.add(motor)
+                break
+            # Si la construcción en curso falla, la próxima vuelta la intenta este hilo
+            _construido.wait()
+
+    try:
+        indice = _construir(motor, matriz)
+        with _lock:
+            _indices.setdefault(motor, (matriz, indice))
+            return _indices[motor]
+    finally:
+        with _lock:
+            _construyendo.discard(motor)
+            _construido.notify_all()
+
+
+def buscar_similares(
+        indice: IndiceVecinos,
+        matriz: MatrizCanciones,
+        valores: np.ndarray,
+        nulos: np.ndarray,
+        k: int,
+        excluir: Optional[int] = None,
+        **opciones
+) -> tuple:
+    """Top-k de la canción base usando el índice para los candidatos y la fórmula exacta para ordenar.
+
+    Si el índice da una cota para las filas que no devolvió (kdtree) y el k-ésimo no la
+    supera, se recorre todo el catálogo: el resultado es el mismo que el del motor exacto.
+
+    Devuelve (filas de la matriz, similitudes de esas filas) en el formato de `calcular_similitudes`.
+    """
+    vector = embeber(valores, nulos)
+    # Ordenados por fila para que los empates se resuelvan igual que en el recorrido completo
+    candidatos = np.sort(indice.buscar(vector, max(k, 1) * SOBREMUESTREO + 1, **opciones))
+    similitudes = calcular_similitudes(matriz, valores, nulos, filas=candidatos)
+
+    pos_excluir = None
+    if excluir is not None:
+        coincidencias = np.flatnonzero(candidatos == excluir)
+        pos_excluir = int(coincidencias[0]) if len(coincidencias) else None
+
+    top = seleccionar_top(similitudes["total"], k, excluir=pos_excluir)
+
+    piso = indice.piso_excluidos(vector, candidatos)
+    if piso is not None and k > 0 and not _top_garantizado(similitudes["total"][top], k, piso):
+        # Alguna fila fuera de los candidatos podría entrar (o empatar): recorrido completo
+        similitudes = calcular_similitudes(matriz, valores, nulos)
+        top = seleccionar_top(similitudes["total"], k, excluir=excluir)
+        return top, {clave: valor[top] for clave, valor in similitudes.items()}
+    return candidatos[top], {clave: valor[top] for clave, valor in similitudes.items()}
+
+
+def _top_garantizado(similitudes_top: np.ndarray, k: int, piso: float) -> bool:
+    """Si el k-ésimo (redondeado) supera a cualquier fila cuya distancia real sea >= piso."""
+    if len(similitudes_top) < k:
+        return False
+    if np.isinf(piso):
+        return True
+    # Estricto: ante un empate en el corte el recorrido completo decide por posición
+    maxima_excluida = round(100 * (1 - piso) + 1e-9, 1)
+    return bool(redondear(similitudes_top[-1:], 1)[0] > maxima_excluida)
+
+
+# Reportes ya calculados por (k, muestras, nprobe) para la versión del catálogo en _reportes_de
+_reportes = {}
+_reportes_de = None
+# Un reporte a la vez: construye todos los índices y recorre el catálogo por cada muestra
+_lock_reportes = threading.Lock()
+
+
+def reporte_recall_vigente(matriz: MatrizCanciones, k: int, muestras: int, nprobe: Optional[int] = None) -> dict:
+    """reporte_recall memorizado mientras no cambie el catálogo.
+
+    Se identifica la matriz por su versión (o por el objeto si no la tiene): una recarga
+    por TTL sin cambios reutiliza el reporte. Las solicitudes concurrentes esperan al que
+    se está calculando en lugar de calcular otro.
+    """
+    global _reportes_de
+    origen = matriz.version if matriz.version is not None else matriz
+    clave = (k, muestras, nprobe)
+    with _lock_reportes:
+        if _reportes_de != origen:
+            _reportes.clear()
+            _reportes_de = origen
+        if clave not in _reportes:
+            _reportes[clave] = reporte_recall(matriz, k=k, muestras=muestras, nprobe=nprobe)
+        return _reportes[clave]
+
+
+def reporte_recall(
+        matriz: MatrizCanciones,
+        k: int = 10,
+        muestras: int = 100,
+        nprobe: Optional[int] = None,
+        semilla: int = 0
+) -> dict:
+    """Compara cada motor contra el recorrido completo: recall@k y latencia media por consulta.
+
+    Un resultado cuenta como acierto si su similitud alcanza la del k-ésimo exacto,
+    así los empates en el corte no penalizan al motor.
+    """
+    n = len(matriz)
+    rng = np.random.default_rng(semilla)
+    consultas = rng.choice(n, min(muestras, n), replace=False) if n else []
+
+    # Similitud (redondeada) del k-ésimo exacto y cuántos resultados hay por consulta
+    exactos = []
+    inicio = time.perf_counter()
+    for fila in consultas:
+        similitudes = calcular_similitudes(matriz, matriz.valores[fila], matriz.nulos[fila])
+        top = seleccionar_top(similitudes["total"], k, excluir=fila)
+        exactos.append((round(float(similitudes["total"][top[-1]]), 1) if len(top) else 0.0, len(top)))
+    latencia_exacta = (time.perf_counter() - inicio) / max(len(consultas), 1)
+
+    reporte = {
+        "canciones": n,
+        "k": k,
+        "consultas": len(consultas),
+        "motores": {
+            "exacto": {"recall": 1.0, "latencia_ms": round(latencia_exacta * 1000, 3), "construccion_ms": 0.0}
+        }
+    }
+
+    for motor, clase in MOTORES.items():
+        inicio = time.perf_counter()
+        indice = clase(embeber(matriz.valores, matriz.nulos))
+        construccion = time.perf_counter() - inicio
+
+        opciones = {"nprobe": nprobe} if nprobe and motor == IndiceIVF.nombre else {}
+        aciertos = 0
+        inicio = time.perf_counter()
+        for fila, (corte, _) in zip(consultas, exactos):
+            _, similitudes = buscar_similares(
+                indice, matriz, matriz.valores[fila], matriz.nulos[fila], k, excluir=fila, **opciones
+            )
+            aciertos += int((redondear(similitudes["total"], 1) >= corte).sum())
+        latencia = (time.perf_counter() - inicio) / max(len(consultas), 1)
+
+        total_esperado = sum(cantidad for _, cantidad in exactos)
+        reporte["motores"][motor] = {
+            "recall": round(aciertos / total_esperado, 4) if total_esperado else 1.0,
+            "latencia_ms": round(latencia * 1000, 3),
+            "construccion_ms": round(construccion * 1000, 1)
+        }
+        if motor == IndiceIVF.nombre:
+            reporte["motores"][motor].update({"nlist": indice.nlist, "nprobe": nprobe or indice.nprobe})
+
+    return reporte
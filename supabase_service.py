@@ -10,8 +10,12 @@ SUPABASE_URL = os.getenv("SUPABASE_URL_MAR")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY_MAR")
 
 
-async def upload_to_bucket(file: UploadFile) -> Optional[str]:
-    """Sube imagen o devuelve None si hay error/archivo vacío."""
+def upload_to_bucket(file: UploadFile) -> Optional[str]:
+    """Sube imagen o devuelve None si hay error/archivo vacío.
+
+    Es bloqueante (cliente de Supabase síncrono): se llama desde handlers `def`,
+    que FastAPI corre en el pool de hilos.
+    """
     if not SUPABASE_URL or not SUPABASE_KEY:
         print("⚠️  Credenciales Supabase no configuradas")
         return None
@@ -26,13 +30,13 @@ async def upload_to_bucket(file: UploadFile) -> Optional[str]:
         client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
         # Leer contenido
-        content = await file.read()
+        content = file.file.read()
         if len(content) == 0:
             print("⚠️  Archivo vacío")
             return None
 
         # Volver al inicio para futuras lecturas
-        await file.seek(0)
+        file.file.seek(0)
 
         # Obtener extensión
         filename = file.filename.lower()
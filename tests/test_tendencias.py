@@ -0,0 +1,120 @@
+"""Tendencias por ventana: una sola consulta y los mismos números que la agregación fila por fila.
+
+Uso:
+    python -m pytest tests/test_tendencias.py
+"""
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, select
+
+from models import AnalisisResultado, Benchmark, Cancion
+from services.tendencias_service import NIVELES, nivel_tendencia, registrar_resultados, tendencias_desde
+
+AHORA = datetime(2024, 3, 10, 15, 30)
+# Incluye los umbrales exactos de cada nivel
+AFINIDADES = (0.0, 12.5, 40.0, 40.1, 55.0, 60.0, 60.1, 79.9, 80.0, 80.1, 99.0)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        _poblar(session)
+        yield session
+    engine.dispose()
+
+
+def _poblar(session: Session) -> None:
+    """Tres benchmarks (uno eliminado) y resultados repartidos en los últimos diez días."""
+    random.seed(7)
+    session.add(Cancion(id="c1", nombre="Canción", artista="Artista", tempo=120, energy=0.5))
+    session.add_all([
+        Benchmark(id=1, pais="CO", genero="pop", tempo_promedio=110, energy_promedio=0.6),
+        Benchmark(id=2, pais="MX", genero="rock", tempo_promedio=130, energy_promedio=0.8),
+        Benchmark(id=3, pais="AR", genero="tango", tempo_promedio=90, energy_promedio=0.4, deleted_at=AHORA)
+    ])
+
+    resultados = []
+    for i in range(400):
+        creado_en = AHORA - timedelta(minutes=random.randrange(10 * 24 * 60))
+        resultados.append(AnalisisResultado(
+            cancion_id="c1",
+            benchmark_id=random.choice((1, 2, 3)),
+            afinidad=random.choice(AFINIDADES),
+            hallazgo="",
+            hash_entradas=str(i),
+            creado_en=creado_en
+        ))
+    session.add_all(resultados)
+    registrar_resultados(session, [(r.benchmark_id, r.creado_en, r.afinidad) for r in resultados])
+    session.commit()
+
+
+def _agregacion_por_filas(session: Session, desde: datetime) -> dict:
+    """Referencia: lee cada resultado de la ventana y agrega en Python."""
+    tendencias = {}
+    for r in session.exec(select(AnalisisResultado).where(AnalisisResultado.creado_en >= desde)).all():
+        t = tendencias.setdefault(r.benchmark_id, {"total": 0, "suma": 0.0, "niveles": dict.fromkeys(NIVELES, 0)})
+        t["total"] += 1
+        t["suma"] += r.afinidad
+        t["niveles"][nivel_tendencia(r.afinidad)] += 1
+    return tendencias
+
+
+def _contar_consultas(session: Session, funcion, *args):
+    consultas = []
+
+    def registrar(conn, cursor, sentencia, *resto):
+        consultas.append(sentencia)
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", registrar)
+    try:
+        return funcion(*args), consultas
+    finally:
+        event.remove(engine, "before_cursor_execute", registrar)
+
+
+@pytest.mark.parametrize("desde", [
+    datetime(2024, 3, 4),              # medianoche: solo resúmenes diarios
+    datetime(2024, 3, 4, 13, 17, 45),  # mediodía: día parcial desde AnalisisResultado
+    datetime(2024, 3, 10, 9, 0),       # ventana dentro del día en curso
+    datetime(2024, 2, 1),              # antes del primer resultado
+])
+def test_tendencias_desde_una_consulta_y_mismos_totales(session, desde):
+    esperado = _agregacion_por_filas(session, desde)
+    session.expire_all()
+
+    tendencias, consultas = _contar_consultas(session, tendencias_desde, session, desde)
+
+    assert len(consultas) == 1
+    assert [t["benchmark_id"] for t in tendencias] == sorted(esperado)
+    for t in tendencias:
+        referencia = esperado[t["benchmark_id"]]
+        assert t["total"] == referencia["total"]
+        assert t["afinidad_promedio"] == pytest.approx(referencia["suma"] / referencia["total"])
+        assert t["niveles"] == referencia["niveles"]
+
+
+def test_tendencias_desde_trae_datos_del_benchmark(session):
+    tendencias = {t["benchmark_id"]: t for t in tendencias_desde(session, datetime(2024, 3, 1))}
+
+    assert (tendencias[1]["genero"], tendencias[1]["pais"]) == ("pop", "CO")
+    assert (tendencias[2]["genero"], tendencias[2]["pais"]) == ("rock", "MX")
+
+
+def test_tendencias_desde_ventana_vacia(session):
+    tendencias, consultas = _contar_consultas(session, tendencias_desde, session, AHORA + timedelta(days=1))
+
+    assert tendencias == []
+    assert len(consultas) == 1